@@ -1,13 +1,14 @@
+import hmac
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+from app.core.config import settings
 from app.core.security import verify_token
 
 # Optional: Redis dependency
 try:
     import redis
-    from app.core.config import settings
     
     def get_redis() -> Optional[redis.Redis]:
         """Get Redis connection (optional)"""
@@ -62,4 +63,20 @@ def require_auth(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def require_admin(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> None:
+    """Require the ADMIN_API_KEY bearer key; endpoints using this are off while it is unset"""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.ADMIN_API_KEY.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
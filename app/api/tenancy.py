@@ -0,0 +1,60 @@
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from app.middleware.tenant import TENANT_HEADER
+from app.services.chatbot_service import ChatbotService
+from app.services.startup import ServiceNotReady, ensure_started
+from app.services.tenant_registry import TenantNotFound, TenantRegistry
+
+# Created on first use (the lifespan) rather than at import, to keep cold starts short
+_chatbot_service: Optional[ChatbotService] = None
+_tenant_registry: Optional[TenantRegistry] = None
+
+
+def get_default_chatbot_service() -> ChatbotService:
+    """Single-tenant service (data.json in the working directory), used when no tenant is given"""
+    global _chatbot_service
+    if _chatbot_service is None:
+        _chatbot_service = ChatbotService()
+    return _chatbot_service
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """Multi-tenant hosting: one directory per tenant under TENANTS_DIR (disabled when empty)"""
+    global _tenant_registry
+    if _tenant_registry is None:
+        default = get_default_chatbot_service()
+        _tenant_registry = TenantRegistry(
+            settings.TENANTS_DIR,
+            memory_budget=settings.TENANT_MEMORY_BUDGET_MB * 1024 * 1024,
+            max_loaded=settings.TENANT_MAX_LOADED,
+            llm_service=default.llm_service,
+            embedding_service=default.embedding_service,
+        )
+    return _tenant_registry
+
+
+async def resolve_chatbot_service(tenant_id: Optional[str]) -> ChatbotService:
+    """
+    Service of ``tenant_id``, or the default one without a tenant; raises
+    TenantNotFound, or ServiceNotReady when startup failed
+    """
+    await ensure_started(get_default_chatbot_service())
+    if not tenant_id:
+        return get_default_chatbot_service()
+    return await get_tenant_registry().get(tenant_id)
+
+
+async def get_chatbot_service(request: Request) -> ChatbotService:
+    """
+    Chatbot service of the request's tenant, from the X-Tenant-ID header
+    (or a ``/t/{tenant}/`` path prefix); the default service without one.
+    """
+    try:
+        return await resolve_chatbot_service(request.headers.get(TENANT_HEADER))
+    except TenantNotFound:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    except ServiceNotReady:
+        raise HTTPException(status_code=503, detail="Service is not ready", headers={"Retry-After": "1"})
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any
 import json
-import os
-from datetime import datetime
+import time
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from typing import Dict, Any, Optional
 
 from app.models.chat import BotConfig, CompanyData
 from app.schemas.common import DataResponse
+from app.core.tracing import tracer
+from app.middleware.rate_limiting import rate_limiter
+from app.services.analytics_service import get_analytics_service
+from app.services.cache_service import cache_service
+from app.services.data_store import data_store
+from app.services.diagnostics import (
+    GROUP_BY, ProfilerBusy, container_size, cpu_profiler, estimate_size, memory_tracer, rss_bytes
+)
+from app.services.stream_store import stream_store
+from app.api.deps import require_admin
+from app.api.tenancy import get_default_chatbot_service, get_tenant_registry
 
 router = APIRouter()
 
@@ -13,8 +24,7 @@ router = APIRouter()
 async def get_current_data():
     """Get current data.json content"""
     try:
-        with open("data.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = await data_store.read()
         return DataResponse(
             success=True,
             message="Data retrieved successfully",
@@ -31,26 +41,11 @@ async def update_data(data: Dict[str, Any]):
         BotConfig(**data.get("bot_config", {}))
         CompanyData(**data.get("company_data", {}))
         
-        # Backup current data
-        backup_filename = f"data_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open("data.json", "r", encoding="utf-8") as f:
-            backup_data = json.load(f)
-        
-        # Pastikan direktori 'backups' ada
-        if not os.path.exists("backups"):
-            os.makedirs("backups")
-            
-        with open(f"backups/{backup_filename}", "w", encoding="utf-8") as f:
-            json.dump(backup_data, f, indent=2, ensure_ascii=False)
-        
-        # Update data.json
-        with open("data.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Backup current data, then replace data.json atomically
+        await data_store.write(data)
         
         # Trigger reload
-        from app.api.v1.endpoints.chat import chatbot_service
-        chatbot_service._load_data()
-        await chatbot_service.initialize_embeddings()
+        await get_default_chatbot_service().reload()
         
         return DataResponse(
             success=True,
@@ -64,17 +59,10 @@ async def update_data(data: Dict[str, Any]):
 async def update_bot_config(config: BotConfig):
     """Update bot configuration only"""
     try:
-        with open("data.json", "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        data["bot_config"] = config.dict()
-        
-        with open("data.json", "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        await data_store.update_section("bot_config", config.dict())
         
         # Trigger reload
-        from app.api.v1.endpoints.chat import chatbot_service
-        chatbot_service._load_data()
+        await get_default_chatbot_service().reload()
         
         return DataResponse(
             success=True,
@@ -88,22 +76,8 @@ async def update_bot_config(config: BotConfig):
 async def list_backups():
     """List available backups"""
     try:
-        backup_dir = "backups"
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
-            
-        backups = []
-        for filename in os.listdir(backup_dir):
-            if filename.startswith("data_backup_") and filename.endswith(".json"):
-                file_path = os.path.join(backup_dir, filename)
-                stat = os.stat(file_path)
-                backups.append({
-                    "filename": filename,
-                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    "size": stat.st_size
-                })
-        
-        backups.sort(key=lambda x: x["created"], reverse=True)
+        # Answered from the backup manifest (newest first), without touching the files
+        backups = await data_store.list_backups()
         
         return DataResponse(
             success=True,
@@ -111,4 +85,131 @@ async def list_backups():
             data=backups
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/traces", response_model=DataResponse[list])
+async def list_slowest_traces(limit: int = 20, name: Optional[str] = None):
+    """List the slowest recent request traces with a per-stage breakdown"""
+    traces = tracer.slowest(limit=max(1, min(limit, 200)), name=name)
+    return DataResponse(
+        success=True,
+        message="Traces retrieved successfully",
+        data=traces
+    )
+
+@router.get("/tenants", response_model=DataResponse[Dict[str, Any]])
+async def list_tenants():
+    """Loaded tenants, memory use against the budget and per-tenant usage stats"""
+    return DataResponse(
+        success=True,
+        message="Tenants retrieved successfully",
+        data=get_tenant_registry().summary()
+    )
+
+def _download(content: str, filename: str, media_type: str) -> Response:
+    """Response saved as ``filename`` by browsers and ``curl -OJ``"""
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _timestamp() -> str:
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+def _structure_sizes() -> Dict[str, Any]:
+    """Entry counts and estimated memory of the large in-process structures"""
+    services = {"default": get_default_chatbot_service(), **get_tenant_registry().loaded_services()}
+    analytics = get_analytics_service()
+    analytics_buffers = (
+        analytics.user_feedback, analytics.daily_stats,
+        analytics.popular_queries, analytics.trending_queries, analytics.latency
+    )
+    return {
+        "sessions": {
+            "entries": sum(len(service.sessions) for service in services.values()),
+            "messages": sum(len(history) for service in services.values() for history in service.sessions.values()),
+            "estimated_bytes": sum(container_size(service.sessions) for service in services.values()),
+        },
+        "cache_service.cache": {
+            "entries": len(cache_service.cache),
+            "estimated_bytes": container_size(cache_service.cache),
+        },
+        "rate_limiter": {
+            "entries": rate_limiter.tracked_keys(),
+            "estimated_bytes": sum(
+                container_size(policy.limiter.tat)
+                for policy in rate_limiter.all_policies() if policy.limiter is not None
+            ),
+        },
+        "analytics": {
+            "queued_events": analytics.get_stats()["pipeline"]["queued"],
+            "feedback": len(analytics.user_feedback),
+            "popular_queries": len(analytics.popular_queries),
+            "trending_queries": len(analytics.trending_queries),
+            "estimated_bytes": sum(estimate_size(buffer) for buffer in analytics_buffers),
+        },
+        "stream_store": stream_store.stats(),
+        "traces": {
+            "entries": len(tracer.recent),
+            "estimated_bytes": container_size(tracer.recent),
+        },
+        "tenants": {
+            "loaded": len(services) - 1,
+            "memory_bytes": get_tenant_registry().summary()["memory_bytes"],
+        },
+    }
+
+@router.post("/diagnostics/profile", dependencies=[Depends(require_admin)])
+async def profile_cpu(seconds: float = 10.0, format: str = "json", limit: int = 30):
+    """
+    Sample the event loop for ``seconds`` while it keeps serving, then
+    download the profile: a JSON summary of the hottest functions, or
+    collapsed stacks (``format=folded``) for flamegraph.pl or speedscope
+    """
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="Format must be one of: json, folded")
+    try:
+        profile = await cpu_profiler.profile(seconds)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    if format == "folded":
+        return _download(profile.folded(), f"profile-{_timestamp()}.folded", "text/plain")
+    report = json.dumps(profile.summary(limit=max(1, min(limit, 500))), indent=2)
+    return _download(report, f"profile-{_timestamp()}.json", "application/json")
+
+@router.post("/diagnostics/memory/start", response_model=DataResponse[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def start_memory_tracing():
+    """Start tracing allocations and take the baseline later reports are diffed against (again: new baseline)"""
+    return DataResponse(
+        success=True,
+        message="Memory tracing started",
+        data=await memory_tracer.start()
+    )
+
+@router.post("/diagnostics/memory/stop", response_model=DataResponse[Dict[str, Any]], dependencies=[Depends(require_admin)])
+async def stop_memory_tracing():
+    """Stop tracing allocations"""
+    return DataResponse(
+        success=True,
+        message="Memory tracing stopped",
+        data=memory_tracer.stop()
+    )
+
+@router.get("/diagnostics/memory", dependencies=[Depends(require_admin)])
+async def memory_report(limit: int = 30, group_by: str = "lineno"):
+    """
+    Download a memory report: process RSS, sizes of sessions, caches, rate
+    limiter keys and analytics buffers, and while tracing, the largest
+    allocation sites and their growth since the baseline
+    """
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY)}")
+    report = {
+        "created_at": time.time(),
+        "rss_bytes": rss_bytes(),
+        "structures": _structure_sizes(),
+        "tracemalloc": await memory_tracer.report(limit=max(1, min(limit, 500)), group_by=group_by),
+    }
+    return _download(json.dumps(report, indent=2), f"memory-{_timestamp()}.json", "application/json")
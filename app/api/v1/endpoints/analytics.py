@@ -1,13 +1,47 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 from fastapi import APIRouter, HTTPException
 from app.schemas.common import DataResponse
-from app.services.analytics_service import analytics_service
+from app.services.analytics_service import get_analytics_service
+from app.services.timeseries_store import RESOLUTIONS
 
 router = APIRouter()
 
 @router.get("/stats", response_model=DataResponse[dict])
 async def get_analytics_stats():
     """Get analytics statistics"""
-    stats = analytics_service.get_stats()
+    await get_analytics_service().flush()
+    stats = get_analytics_service().get_stats()
+    return DataResponse(
+        success=True,
+        message="Analytics retrieved successfully",
+        data=stats
+    )
+
+@router.get("/stats/range", response_model=DataResponse[dict])
+async def get_analytics_stats_range(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[str] = None,
+    series: Optional[str] = None
+):
+    """Get aggregated statistics for a time range from the persisted rollups"""
+    if resolution is not None and resolution not in RESOLUTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Resolution must be one of: {', '.join(RESOLUTIONS)}"
+        )
+    
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    stats = await get_analytics_service().query_range(start.timestamp(), end.timestamp(), resolution, series)
     return DataResponse(
         success=True,
         message="Analytics retrieved successfully",
@@ -24,7 +58,7 @@ async def submit_feedback(
     if not 1 <= rating <= 5:
         raise HTTPException(status_code=400, detail="Rating must be between 1-5")
     
-    await analytics_service.add_user_feedback(session_id, rating, feedback)
+    await get_analytics_service().add_user_feedback(session_id, rating, feedback)
     
     return DataResponse(
         success=True,
@@ -1,84 +1,197 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from typing import List, AsyncGenerator
+from contextlib import aclosing
 import json
+import logging
+import time
 
-from app.models.chat import ChatRequest, ChatResponse, ChatMessage
+from app.models.chat import BatchChatRequest, ChatRequest, ChatResponse, ChatMessage
 from app.services.chatbot_service import ChatbotService
+from app.api.tenancy import get_chatbot_service
 from app.schemas.common import DataResponse
+from app.core.tracing import Trace, tracer, TRACE_ID_HEADER
+from app.core.deadline import Deadline, DeadlineExceeded, ClientDisconnected, run_until_disconnected
+from app.core.sse import SSEEncoder, number_frames, record_frames
+from app.core.performance_config import performance_settings
+from app.services.stream_store import STREAM_ID_HEADER, StreamBuffer, stream_store
 
-router = APIRouter()
-
-# Initialize chatbot service
-chatbot_service = ChatbotService()
+logger = logging.getLogger(__name__)
 
-async def initialize_chatbot_embeddings():
-    """Initialize embeddings on startup"""
-    await chatbot_service.initialize_embeddings()
+router = APIRouter()
 
 @router.post("/message", response_model=DataResponse[ChatResponse])
-async def send_message(request: ChatRequest):
+async def send_message(
+    request: ChatRequest,
+    http_request: Request,
+    http_response: Response,
+    service: ChatbotService = Depends(get_chatbot_service)
+):
     """Send message to chatbot and get response"""
+    trace = tracer.start_trace("chat.send_message", http_request.headers)
+    http_response.headers[TRACE_ID_HEADER] = trace.trace_id
     try:
         # Ensure session_id is provided or generated
         if not request.session_id:
             import uuid
             request.session_id = str(uuid.uuid4())
         
-        response = await chatbot_service.process_message(request)
+        # Stop generating as soon as the client goes away or the deadline passes
+        deadline = Deadline.from_headers(http_request.headers, performance_settings.CHAT_DEADLINE)
+        response = await run_until_disconnected(
+            http_request.receive,
+            service.process_message(request, deadline=deadline),
+            deadline
+        )
         
         return DataResponse(
             success=True,
             message="Message processed successfully",
             data=response
         )
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+    except ClientDisconnected:
+        logger.info(f"Client disconnected, cancelled message for session {request.session_id}")
+        # Nobody is listening; 499 (client closed request) only shows up in access logs
+        return Response(status_code=499)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        trace.finish()
 
 @router.post("/message/stream")
-async def send_message_stream(request: ChatRequest):
+async def send_message_stream(
+    request: ChatRequest,
+    http_request: Request,
+    service: ChatbotService = Depends(get_chatbot_service)
+):
     """Send message to chatbot and get streaming response"""
+    trace = tracer.start_trace("chat.send_message_stream", http_request.headers)
     try:
         # Ensure session_id is provided or generated
         if not request.session_id:
             import uuid
             request.session_id = str(uuid.uuid4())
         
-        async def generate() -> AsyncGenerator[str, None]:
-            # Process message with streaming
-            async for chunk in chatbot_service.process_message_stream(request):
-                # Format as Server-Sent Event
-                data = json.dumps({
-                    "type": chunk.get("type", "content"),
-                    "content": chunk.get("content", ""),
-                    "session_id": chunk.get("session_id", request.session_id),
-                    "done": chunk.get("done", False)
-                })
-                yield f"data: {data}\n\n"
-                
-            # Send final message
-            yield f"data: {json.dumps({'type': 'done', 'done': True})}\n\n"
+        deadline = Deadline.from_headers(http_request.headers, performance_settings.CHAT_STREAM_DEADLINE)
         
-        return StreamingResponse(
-            generate(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"  # Disable proxy buffering
-            }
+        # Generation runs in the stream store, decoupled from this connection, so a
+        # client that loses it can resume from the buffered frames; tokens are
+        # coalesced into frames and the stream ends with the service's done frame
+        buffer = stream_store.start(
+            service,
+            service.process_message_stream(request, deadline=deadline),
+            SSEEncoder(request.session_id)
         )
+        return _stream_response(buffer, 0, trace)
     except Exception as e:
+        trace.finish()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/message/stream/{stream_id}")
+async def resume_message_stream(
+    stream_id: str,
+    http_request: Request,
+    service: ChatbotService = Depends(get_chatbot_service)
+):
+    """Resume a dropped chat stream after the frame named by the Last-Event-ID header"""
+    buffer = stream_store.get(stream_id, service)
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired stream")
+    last_event_id = http_request.headers.get("Last-Event-ID", "0")
+    if not last_event_id.isdigit() or int(last_event_id) > len(buffer.frames):
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    
+    trace = tracer.start_trace("chat.resume_message_stream", http_request.headers)
+    return _stream_response(buffer, int(last_event_id), trace)
+
+def _stream_response(buffer: StreamBuffer, offset: int, trace: Trace) -> StreamingResponse:
+    """SSE response following ``buffer`` from frame ``offset`` on"""
+    async def generate() -> AsyncGenerator[bytes, None]:
+        # Time spent suspended in yield is time the server waited on SSE delivery
+        sse_span = trace.span("sse")
+        frames = 0
+        writes = 0
+        size = 0
+        send_time = 0.0
+        try:
+            # A client disconnect only detaches this reader; generation goes on for
+            # STREAM_RESUME_GRACE seconds in case the client comes back
+            async with aclosing(stream_store.follow(buffer, offset)) as batches:
+                async for first_id, batch in batches:
+                    data = number_frames(first_id, batch)
+                    send_start = time.perf_counter()
+                    yield data
+                    send_time += time.perf_counter() - send_start
+                    frames += len(batch)
+                    writes += 1
+                    size += len(data)
+        finally:
+            record_frames(frames, size)
+            sse_span.set("frames", frames)
+            sse_span.set("writes", writes)
+            sse_span.set("bytes", size)
+            sse_span.set("send_ms", round(send_time * 1000, 3))
+            sse_span.end()
+            trace.finish()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering
+            TRACE_ID_HEADER: trace.trace_id,
+            STREAM_ID_HEADER: buffer.stream_id
+        }
+    )
+
+@router.post("/batch")
+async def send_message_batch(
+    request: BatchChatRequest,
+    http_request: Request,
+    service: ChatbotService = Depends(get_chatbot_service)
+):
+    """
+    Send many independent messages at once (offline evaluation, bulk jobs).
+    Results stream back as NDJSON, one line per message as it completes,
+    with ``index`` pointing into ``messages``.
+    """
+    trace = tracer.start_trace("chat.send_message_batch", http_request.headers)
+    concurrency = min(
+        request.concurrency or performance_settings.CHAT_BATCH_CONCURRENCY,
+        performance_settings.CHAT_BATCH_MAX_CONCURRENCY
+    )
+    
+    async def generate() -> AsyncGenerator[bytes, None]:
+        try:
+            # A client disconnect closes this generator and aclosing stops the pending LLM calls
+            async with aclosing(service.process_batch(request.messages, concurrency)) as results:
+                async for result in results:
+                    yield json.dumps(result).encode("ascii") + b"\n"
+        finally:
+            trace.finish()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            TRACE_ID_HEADER: trace.trace_id
+        }
+    )
+
 @router.get("/session/create", response_model=DataResponse[dict])
-async def create_session():
+async def create_session(service: ChatbotService = Depends(get_chatbot_service)):
     """Create a new chat session"""
     import uuid
     session_id = str(uuid.uuid4())
     
     # Initialize session in service
-    chatbot_service.create_session(session_id)
+    service.create_session(session_id)
     
     return DataResponse(
         success=True,
@@ -87,9 +200,9 @@ async def create_session():
     )
 
 @router.get("/history/{session_id}", response_model=DataResponse[List[ChatMessage]])
-async def get_chat_history(session_id: str):
+async def get_chat_history(session_id: str, service: ChatbotService = Depends(get_chatbot_service)):
     """Get chat history for a session"""
-    history = chatbot_service.get_session_history(session_id)
+    history = service.get_session_history(session_id)
     
     return DataResponse(
         success=True,
@@ -98,9 +211,9 @@ async def get_chat_history(session_id: str):
     )
 
 @router.delete("/session/{session_id}", response_model=DataResponse[None])
-async def clear_session(session_id: str):
+async def clear_session(session_id: str, service: ChatbotService = Depends(get_chatbot_service)):
     """Clear a chat session"""
-    chatbot_service.clear_session(session_id)
+    service.clear_session(session_id)
     
     return DataResponse(
         success=True,
@@ -109,11 +222,11 @@ async def clear_session(session_id: str):
     )
 
 @router.post("/reload", response_model=DataResponse[None])
-async def reload_data():
+async def reload_data(service: ChatbotService = Depends(get_chatbot_service)):
     """Reload chatbot configuration and data"""
     try:
-        chatbot_service._load_data()
-        await chatbot_service.initialize_embeddings()
+        # Builds a new snapshot and swaps it in; in-flight requests finish on the old one
+        await service.reload()
         
         return DataResponse(
             success=True,
@@ -0,0 +1,234 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional
+from contextlib import aclosing
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from app.api.tenancy import resolve_chatbot_service
+from app.core.config import settings
+from app.core.deadline import Deadline, DeadlineExceeded
+from app.core.metrics import metrics
+from app.core.performance_config import performance_settings
+from app.core.sse import WebSocketEncoder, coalesce_chat_stream, record_frames
+from app.core.tracing import tracer
+from app.middleware.performance_middleware import REQUESTS_SHED, concurrency_lanes
+from app.middleware.rate_limiting import rate_limiter
+from app.middleware.tenant import TENANT_HEADER
+from app.models.chat import ChatRequest
+from app.services.chatbot_service import ChatbotService
+from app.services.startup import ServiceNotReady
+from app.services.tenant_registry import TenantNotFound
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+WS_CONNECTIONS = metrics.gauge("atabot_websocket_connections", "Open chat WebSocket connections")
+WS_MESSAGES = metrics.counter("atabot_websocket_messages_total", "Chat WebSocket client messages", ["type"])
+
+CLIENT_MESSAGE_TYPES = ("message", "cancel", "ping")
+
+# Every turn goes through the same admission and rate limit as the HTTP chat routes
+_CHAT_LANE = concurrency_lanes.lane_for("/api/v1/chat/message")
+_RATE_LIMIT = rate_limiter.policy_for("/api/v1/chat/message/stream")
+_SHED_CONNECTIONS = REQUESTS_SHED.labels(_CHAT_LANE.name, "websocket_connections")
+
+# Open chat WebSockets of this worker, capped at WEBSOCKET_MAX_CONNECTIONS
+_open_connections = 0
+WS_CONNECTIONS.set_function(lambda: _open_connections)
+
+# Close codes (RFC 6455)
+NORMAL_CLOSURE = 1000
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+MAX_SESSION_ID_LENGTH = 128
+
+class ChatConnection:
+    """
+    One chat WebSocket: the session bound to it, the generation in progress
+    and the sends to the client.
+    
+    Client messages are JSON: ``{"type": "message", "message": "..."}``,
+    ``{"type": "cancel"}`` and ``{"type": "ping"}``. The server answers with
+    the frames of the SSE stream (``session``, ``content``, ``done``,
+    ``error``) as one JSON message each, plus ``cancelled`` and ``pong``.
+    One generation runs at a time; it runs in its own task so cancel and
+    ping are handled while it streams.
+    
+    Backpressure: sends wait for the transport, and tokens that arrive
+    meanwhile are coalesced into the next content frame, so a slow client
+    gets fewer, larger frames instead of an unbounded queue.
+    """
+    
+    def __init__(self, websocket: WebSocket, service: ChatbotService, session_id: str):
+        self.websocket = websocket
+        self.service = service
+        self.session_id = session_id
+        self.encoder = WebSocketEncoder(session_id)
+        self.client_ip = websocket.client.host if websocket.client else "unknown"
+        self.generation: Optional[asyncio.Task] = None
+        self.closed = False
+        self.bytes_sent = 0
+        self._send_lock = asyncio.Lock()
+    
+    async def send(self, frames: List[bytes]) -> None:
+        async with self._send_lock:
+            for frame in frames:
+                await self.websocket.send({"type": "websocket.send", "text": frame.decode("ascii")})
+                self.bytes_sent += len(frame)
+    
+    async def send_event(self, type: str, content: str = "", done: bool = False) -> None:
+        await self.send([self.encoder.event(type, content, done=done)])
+    
+    async def run(self) -> None:
+        await self.send_event("session")
+        while True:
+            try:
+                raw = await asyncio.wait_for(self.websocket.receive_text(), performance_settings.WEBSOCKET_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self.generation is not None and not self.generation.done():
+                    # The client is waiting for a response, not idle
+                    continue
+                await self.websocket.close(code=NORMAL_CLOSURE, reason="Idle timeout")
+                return
+            await self.handle(raw)
+    
+    async def handle(self, raw: str) -> None:
+        if len(raw) > settings.MAX_CHAT_BODY_BYTES:
+            WS_MESSAGES.labels("invalid").inc()
+            await self.send_event("error", "Message too large")
+            return
+        try:
+            data: Dict[str, Any] = json.loads(raw)
+            kind = data.get("type", "message")
+        except (ValueError, AttributeError):
+            kind = None
+        if kind not in CLIENT_MESSAGE_TYPES:
+            WS_MESSAGES.labels("invalid").inc()
+            await self.send_event("error", "Invalid message")
+            return
+        
+        WS_MESSAGES.labels(kind).inc()
+        if kind == "message":
+            await self.start(data)
+        elif kind == "cancel":
+            if self.generation is not None and not self.generation.done():
+                self.generation.cancel()
+        else:
+            await self.send_event("pong")
+    
+    async def start(self, data: Dict[str, Any]) -> None:
+        if self.generation is not None and not self.generation.done():
+            await self.send_event("error", "A response is still being generated")
+            return
+        try:
+            request = ChatRequest(message=data.get("message", ""), session_id=self.session_id)
+        except ValidationError as e:
+            await self.send_event("error", e.errors()[0]["msg"])
+            return
+        
+        allowed, _ = await _RATE_LIMIT.check(self.client_ip)
+        if not allowed:
+            await self.send_event("error", "Rate limit exceeded")
+            return
+        self.generation = asyncio.create_task(self.generate(request))
+    
+    async def generate(self, request: ChatRequest) -> None:
+        limiter = _CHAT_LANE.limiter
+        if limiter is not None:
+            shed_reason = await limiter.acquire()
+            if shed_reason is not None:
+                _CHAT_LANE.shed[shed_reason].inc()
+                await self.send_event("error", "Server busy, please retry later", done=True)
+                return
+        
+        trace = tracer.start_trace("chat.websocket_message", self.websocket.headers)
+        ws_span = trace.span("websocket")
+        start = time.perf_counter()
+        frames_before, bytes_before = self.encoder.frames, self.bytes_sent
+        failed = True
+        try:
+            deadline = Deadline(performance_settings.CHAT_STREAM_DEADLINE)
+            async with aclosing(self.service.process_message_stream(request, deadline=deadline)) as stream:
+                async with aclosing(coalesce_chat_stream(
+                    stream,
+                    self.encoder,
+                    performance_settings.SSE_FLUSH_INTERVAL,
+                    performance_settings.SSE_FLUSH_BYTES
+                )) as batches:
+                    async for batch in batches:
+                        await self.send(batch)
+            failed = False
+        except asyncio.CancelledError:
+            failed = False
+            if self.closed:
+                raise
+            # Cancelled by the client; the upstream stream has been closed above
+            await self.send_event("cancelled", done=True)
+        except DeadlineExceeded:
+            ws_span.set("error", "deadline exceeded")
+            await self.send_event("error", "Request deadline exceeded", done=True)
+        except Exception as e:
+            logger.error(f"WebSocket generation failed for session {self.session_id}: {str(e)}")
+            if not self.closed:
+                await self.send_event("error", "Maaf, terjadi kesalahan. Silakan coba lagi.", done=True)
+        finally:
+            if limiter is not None:
+                limiter.release(time.perf_counter() - start, dropped=failed)
+            frames = self.encoder.frames - frames_before
+            size = self.bytes_sent - bytes_before
+            record_frames(frames, size)
+            ws_span.set("frames", frames)
+            ws_span.set("bytes", size)
+            ws_span.end()
+            trace.finish()
+    
+    async def close(self) -> None:
+        """Stop the generation in progress (the client is gone)"""
+        self.closed = True
+        if self.generation is not None and not self.generation.done():
+            self.generation.cancel()
+            try:
+                await self.generation
+            except (asyncio.CancelledError, Exception):
+                pass
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """Chat over one WebSocket; the session stays bound to the connection"""
+    global _open_connections
+    try:
+        service = await resolve_chatbot_service(websocket.headers.get(TENANT_HEADER))
+    except TenantNotFound:
+        await websocket.close(code=POLICY_VIOLATION, reason="Unknown tenant")
+        return
+    except ServiceNotReady:
+        await websocket.close(code=TRY_AGAIN_LATER, reason="Service is not ready")
+        return
+    if session_id is not None and len(session_id) > MAX_SESSION_ID_LENGTH:
+        await websocket.close(code=POLICY_VIOLATION, reason="Invalid session_id")
+        return
+    if _open_connections >= performance_settings.WEBSOCKET_MAX_CONNECTIONS:
+        _SHED_CONNECTIONS.inc()
+        await websocket.close(code=TRY_AGAIN_LATER, reason="Too many connections")
+        return
+    
+    _open_connections += 1
+    try:
+        await websocket.accept()
+        session_id = session_id or str(uuid.uuid4())
+        service.create_session(session_id)
+        connection = ChatConnection(websocket, service, session_id)
+        try:
+            await connection.run()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await connection.close()
+    finally:
+        _open_connections -= 1
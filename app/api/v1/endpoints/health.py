@@ -1,5 +1,7 @@
-from fastapi import APIRouter
-from app.schemas.common import ResponseBase
+from fastapi import APIRouter, Response
+from typing import Any, Dict
+from app.schemas.common import DataResponse, ResponseBase
+from app.services.startup import readiness
 
 router = APIRouter()
 
@@ -9,4 +11,15 @@ async def health_check():
     return ResponseBase(
         success=True,
         message="Atabot-Lite is running"
-    )
\ No newline at end of file
+    )
+
+@router.get("/ready", response_model=DataResponse[Dict[str, Any]])
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the startup pipeline has finished, with its phase timings"""
+    if not readiness.ready:
+        response.status_code = 503
+    return DataResponse(
+        success=readiness.ready,
+        message=f"Atabot-Lite is {readiness.state}",
+        data=readiness.summary()
+    )
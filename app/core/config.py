@@ -19,6 +19,39 @@ class Settings(BaseSettings):
     MAX_CONTEXT_LENGTH: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
     
+    # Request validation
+    MAX_MESSAGE_LENGTH: int = 1000
+    MAX_CHAT_BODY_BYTES: int = 65536
+    MAX_REQUEST_BODY_BYTES: int = 1048576
+    
+    # Batch chat (POST /api/v1/chat/batch)
+    MAX_CHAT_BATCH_MESSAGES: int = 1000
+    MAX_CHAT_BATCH_BODY_BYTES: int = 4194304
+    
+    # Knowledge base hot reload (watch data.json and reload on change)
+    KB_WATCH_ENABLED: bool = False
+    KB_WATCH_DEBOUNCE: float = 1.0
+    KB_WATCH_POLL_INTERVAL: float = 2.0
+    
+    # Compiled knowledge base (python -m app.services.kb_artifact), used while it matches data.json
+    KB_ARTIFACT_DIR: str = "kb_artifact"
+    
+    # FAQ embeddings published once and memory-mapped by every worker (e.g. /dev/shm/atabot), off when empty
+    KB_SHARED_EMBEDDINGS_DIR: str = ""
+    
+    # Multi-tenant hosting: TENANTS_DIR/<tenant id>/data.json, loaded on demand and LRU-evicted
+    TENANTS_DIR: str = ""
+    TENANT_MEMORY_BUDGET_MB: int = 1024
+    TENANT_MAX_LOADED: int = 500
+    
+    # data.json backups (compressed, deduplicated, pruned beyond these limits)
+    BACKUP_DIR: str = "backups"
+    BACKUP_MAX_COUNT: int = 50
+    BACKUP_MAX_AGE_DAYS: float = 30
+    
+    # Bearer key of the diagnostics endpoints (/api/v1/admin/diagnostics), disabled when unset
+    ADMIN_API_KEY: Optional[str] = None
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from typing import Awaitable, Mapping, Optional, TypeVar
+
+from starlette.types import Receive
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+# Clients may ask for a shorter deadline (in seconds) than the server default
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# Cancellation reasons, also passed as the CancelledError message
+CANCEL_DISCONNECT = "disconnect"
+CANCEL_DEADLINE = "deadline"
+
+GENERATIONS_CANCELLED = metrics.counter(
+    "atabot_llm_generations_cancelled_total",
+    "LLM generations stopped before completing",
+    ["reason"],
+)
+GENERATION_WASTED = metrics.counter(
+    "atabot_llm_generation_wasted_seconds_total",
+    "Upstream LLM time spent on generations that were stopped before completing",
+    ["reason"],
+)
+
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time"""
+
+
+class ClientDisconnected(Exception):
+    """The client went away before the response was ready"""
+
+
+class Deadline:
+    """Absolute point in time by which a request must be answered"""
+    
+    __slots__ = ("expires_at",)
+    
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+    
+    @classmethod
+    def from_headers(cls, headers: Mapping[str, str], default: float) -> "Deadline":
+        """Server default, shortened by a client ``X-Request-Timeout`` header"""
+        seconds = default
+        value = headers.get(DEADLINE_HEADER)
+        if value:
+            try:
+                requested = float(value)
+                if requested > 0:
+                    seconds = min(seconds, requested)
+            except ValueError:
+                pass
+        return cls(seconds)
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+    
+    def check(self) -> None:
+        if self.expired:
+            raise DeadlineExceeded()
+    
+    def timeout(self, cap: float) -> float:
+        """Timeout for a single upstream call: the remaining time, at most ``cap``"""
+        return min(cap, self.remaining())
+
+
+def cancel_reason(error: BaseException) -> str:
+    """Reason label for a cancelled generation"""
+    if isinstance(error, asyncio.CancelledError) and error.args and error.args[0] == CANCEL_DEADLINE:
+        return CANCEL_DEADLINE
+    # Streams are closed or cancelled when the client goes away
+    return CANCEL_DISCONNECT
+
+
+def record_cancelled(reason: str, seconds: float) -> None:
+    GENERATIONS_CANCELLED.labels(reason).inc()
+    GENERATION_WASTED.labels(reason).inc(seconds)
+
+
+async def _wait_for_disconnect(receive: Receive) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def run_until_disconnected(
+    receive: Receive,
+    awaitable: Awaitable[T],
+    deadline: Optional[Deadline] = None,
+    grace: float = 1.0,
+) -> T:
+    """
+    Await ``awaitable`` but cancel it when the client disconnects.
+    
+    Use after the request body has been read, so the only message left on
+    ``receive`` is the disconnect. ``deadline`` (plus ``grace``, giving the
+    services a chance to enforce it themselves) is a backstop that cancels
+    the work and raises DeadlineExceeded.
+    """
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        timeout = deadline.remaining() + grace if deadline is not None else None
+        done, _ = await asyncio.wait({work, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if work in done:
+            return work.result()
+        if watcher in done:
+            work.cancel(CANCEL_DISCONNECT)
+            raise ClientDisconnected()
+        work.cancel(CANCEL_DEADLINE)
+        raise DeadlineExceeded()
+    finally:
+        # Also reached when the caller itself is cancelled (e.g. REQUEST_TIMEOUT)
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
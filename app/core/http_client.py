@@ -0,0 +1,44 @@
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+from app.core.performance_config import performance_settings
+
+if TYPE_CHECKING:
+    import httpx
+
+_client: Optional["httpx.AsyncClient"] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """
+    Shared connection pool for upstream APIs (Poe, Voyage).
+    
+    Reusing one client keeps connections alive between requests and bounds
+    the number of upstream connections. It is created lazily because the
+    pool is bound to the event loop it first runs on; httpx itself is only
+    imported then, as it is one of the slowest imports of the application.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        import httpx
+        
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=performance_settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=performance_settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=performance_settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=30.0,
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    """Close the shared pool (on application shutdown)"""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client, _client_loop = None, None
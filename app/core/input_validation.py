@@ -1,30 +1,142 @@
 import re
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple, Union
+
+from app.core.config import settings
+
+# Where a rule applies: raw query string, raw JSON request body, decoded chat message
+SCOPE_QUERY = "query"
+SCOPE_BODY = "body"
+SCOPE_MESSAGE = "message"
+
+# Longest match a body rule may produce; bodies are scanned chunk by chunk
+# with this much of the previous chunk carried over, so no match is split
+BODY_SCAN_OVERLAP = 64
+
+
+class ValidationRule:
+    """
+    A named suspicious-content pattern and the scopes it is checked in.
+    
+    Patterns are matched against lowercased input and must be written in
+    lowercase. ``literal`` is a lowercase substring every match contains;
+    when all rules of a scope have one, clean input is cleared by cheap
+    substring checks without running the regex.
+    """
+    
+    __slots__ = ("name", "pattern", "scopes", "literal")
+    
+    def __init__(self, name: str, pattern: str, scopes: Iterable[str], literal: Optional[str] = None):
+        self.name = name
+        self.pattern = pattern
+        self.scopes = frozenset(scopes)
+        self.literal = literal
+
+
+RULES: List[ValidationRule] = [
+    ValidationRule("script_tag", r"<script\b", (SCOPE_QUERY, SCOPE_BODY, SCOPE_MESSAGE), "<script"),
+    # Query only: chat text legitimately mentions "javascript:" (e.g. questions about code)
+    ValidationRule("javascript_uri", r"javascript\s{0,8}:", (SCOPE_QUERY,), "javascript"),
+    ValidationRule("data_html", r"data:text/html", (SCOPE_QUERY, SCOPE_BODY, SCOPE_MESSAGE), "data:text/html"),
+    # Attribute-style handlers only ("x onload=", "'onerror="), so names like session_id= pass
+    ValidationRule("event_handler", r"(?:^|[\s\"'/<>])on[a-z]{3,20}\s{0,8}=", (SCOPE_QUERY,)),
+    ValidationRule("eval_call", r"eval\s{0,8}\(", (SCOPE_QUERY,), "eval"),
+    ValidationRule("document_cookie", r"document\.cookie", (SCOPE_QUERY,), "document.cookie"),
+]
+
+
+def _combine(rules: Iterable[ValidationRule], scope: str) -> str:
+    """One alternation of named groups; ``match.lastgroup`` names the rule that hit"""
+    return "|".join(f"(?P<{rule.name}>{rule.pattern})" for rule in rules if scope in rule.scopes)
+
+
+def _literals(rules: Iterable[ValidationRule], scope: str) -> Optional[Tuple[str, ...]]:
+    """Prefilter literals of a scope, or None if some rule has none"""
+    literals = [rule.literal for rule in rules if scope in rule.scopes]
+    if any(literal is None for literal in literals):
+        return None
+    return tuple(literals)
+
+
+class ValidationEngine:
+    """
+    All request validation rules, compiled once into a single matcher per scope.
+    
+    Input is lowercased once and checked for the rules' literals; only when
+    one is present does the combined regex run, in one pass instead of one
+    ``re.search`` per pattern. The body matcher works on bytes, so request
+    bodies are scanned as they arrive without decoding.
+    """
+    
+    def __init__(self, rules: List[ValidationRule]):
+        self.rules = rules
+        self._matchers: Dict[str, Pattern[str]] = {
+            scope: re.compile(_combine(rules, scope)) for scope in (SCOPE_QUERY, SCOPE_MESSAGE)
+        }
+        self._literals: Dict[str, Optional[Tuple[str, ...]]] = {
+            scope: _literals(rules, scope) for scope in (SCOPE_QUERY, SCOPE_MESSAGE)
+        }
+        self._body_matcher: Pattern[bytes] = re.compile(_combine(rules, SCOPE_BODY).encode())
+        body_literals = _literals(rules, SCOPE_BODY)
+        self._body_literals = tuple(literal.encode() for literal in body_literals) if body_literals else None
+    
+    def find(self, scope: str, text: str) -> Optional[str]:
+        """Name of the first rule matching ``text``, or None"""
+        text = text.lower()
+        literals = self._literals[scope]
+        if literals is not None and not any(literal in text for literal in literals):
+            return None
+        match = self._matchers[scope].search(text)
+        return match.lastgroup if match else None
+    
+    def scanner(self, max_bytes: int, scan: bool = True) -> "BodyScanner":
+        """Scanner of one body; with ``scan`` off it only enforces the size cap"""
+        if not scan:
+            return BodyScanner(None, None, max_bytes)
+        return BodyScanner(self._body_matcher, self._body_literals, max_bytes)
+
+
+class BodyScanner:
+    """Incremental scan of one request body with a size cap"""
+    
+    __slots__ = ("matcher", "literals", "max_bytes", "size", "_tail")
+    
+    TOO_LARGE = "too_large"
+    
+    def __init__(self, matcher: Optional[Pattern[bytes]], literals: Optional[Tuple[bytes, ...]], max_bytes: int):
+        self.matcher = matcher
+        self.literals = literals
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._tail = b""
+    
+    def feed(self, chunk: Union[bytes, bytearray, memoryview]) -> Optional[str]:
+        """Scan the next chunk; returns the violated rule name (or TOO_LARGE) if any"""
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            return self.TOO_LARGE
+        if self.matcher is None:
+            return None
+        window = self._tail + bytes(chunk).lower()
+        if self.literals is None or any(literal in window for literal in self.literals):
+            match = self.matcher.search(window)
+            if match:
+                return match.lastgroup
+        self._tail = window[-BODY_SCAN_OVERLAP:]
+        return None
+
+
+validation_engine = ValidationEngine(RULES)
+
 
 class InputValidator:
     @staticmethod
-    def validate_message(message: str) -> tuple[bool, Optional[str]]:
+    def validate_message(message: str) -> Tuple[bool, Optional[str]]:
         # Length check
-        if len(message) > 1000:
-            return False, "Message too long (max 1000 characters)"
+        if len(message) > settings.MAX_MESSAGE_LENGTH:
+            return False, f"Message too long (max {settings.MAX_MESSAGE_LENGTH} characters)"
         
         # Check for suspicious content
-        suspicious_patterns = [
-            r'<script[^>]*>.*?</script>',
-            r'javascript:',
-            r'data:text/html',
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, message, re.IGNORECASE):
-                return False, "Suspicious content detected"
+        if validation_engine.find(SCOPE_MESSAGE, message):
+            return False, "Suspicious content detected"
         
         return True, None
-    
-    @staticmethod
-    def sanitize_message(message: str) -> str:
-        # Remove potential HTML/JS
-        message = re.sub(r'<[^>]+>', '', message)
-        # Remove excessive whitespace
-        message = re.sub(r'\s+', ' ', message.strip())
-        return message
\ No newline at end of file
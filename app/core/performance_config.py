@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class PerformanceSettings(BaseSettings):
@@ -7,9 +8,94 @@ class PerformanceSettings(BaseSettings):
     RESPONSE_CACHE_TTL: int = 1800
     
     # Performance settings
-    MAX_CONCURRENT_REQUESTS: int = 100
+    MAX_CONCURRENT_REQUESTS: int = 100  # Upper bound for the adaptive chat limit
     REQUEST_TIMEOUT: int = 30
     
+    # Concurrency lanes: adaptive (AIMD) limit for chat, fixed limit for other API routes
+    CONCURRENCY_CHAT_INITIAL_LIMIT: int = 100  # Start at the full limit; rising latency backs it off
+    CONCURRENCY_CHAT_MIN_LIMIT: int = 4
+    CONCURRENCY_LATENCY_TOLERANCE: float = 2.0  # Back off when latency exceeds this multiple of its average
+    CONCURRENCY_BACKOFF: float = 0.9
+    CONCURRENCY_INTERACTIVE_LIMIT: int = 20
+    CONCURRENCY_BATCH_LIMIT: int = 2  # Batch chat requests running at once
+    CONCURRENCY_QUEUE_SIZE: int = 50  # Waiting requests per lane before shedding with 503
+    CONCURRENCY_QUEUE_TIMEOUT: float = 5.0
+    
+    # Request deadlines in seconds (clients may ask for less with X-Request-Timeout)
+    CHAT_DEADLINE: float = 30.0
+    CHAT_STREAM_DEADLINE: float = 120.0
+    
+    # Batch chat: LLM calls in flight per batch (clients may ask for up to the max)
+    CHAT_BATCH_CONCURRENCY: int = 8
+    CHAT_BATCH_MAX_CONCURRENCY: int = 32
+    
+    # SSE chat streams: tokens arriving within this window share one frame (0 = frame per token)
+    SSE_FLUSH_INTERVAL: float = 0.02
+    SSE_FLUSH_BYTES: int = 512
+    
+    # Resumable chat streams (reconnect with Last-Event-ID to GET /chat/message/stream/{stream_id})
+    STREAM_BUFFER_MAX_STREAMS: int = 1000
+    STREAM_BUFFER_MAX_MB: int = 64
+    STREAM_BUFFER_TTL: float = 300.0  # Seconds a finished stream stays resumable
+    STREAM_RESUME_GRACE: float = 30.0  # Seconds generation continues with no client attached
+    STREAM_MAX_DETACHED: int = 20  # Generations kept running with no client attached; beyond that they stop at once
+    
+    # Chat WebSockets (per worker); each turn also takes a slot of the chat lane
+    WEBSOCKET_MAX_CONNECTIONS: int = 500
+    WEBSOCKET_IDLE_TIMEOUT: float = 300.0  # Seconds without a client message (and no response running) before closing
+    
+    # Startup warm-up, done before the worker reports ready
+    STARTUP_WARM_HTTP_CONNECTIONS: int = 2  # Keep-alive connections opened per upstream API, 0 = off
+    STARTUP_WARM_FAQ_QUESTIONS: int = 200  # FAQ questions pre-embedded into the query cache, 0 = off
+    STARTUP_WARM_TIMEOUT: float = 5.0
+    
+    # Shared upstream HTTP connection pool
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    
+    # Rate limits per route: "requests/seconds" or "requests/seconds/burst", empty = unlimited
+    RATE_LIMIT_DEFAULT: str = "20/60"
+    RATE_LIMIT_CHAT: str = "20/60"
+    RATE_LIMIT_CHAT_STREAM: str = "20/60"
+    RATE_LIMIT_CHAT_BATCH: str = "5/60"
+    RATE_LIMIT_ADMIN: str = "30/60"
+    RATE_LIMIT_HEALTH: str = ""
+    RATE_LIMIT_METRICS: str = ""
+    RATE_LIMIT_REDIS_URL: Optional[str] = None  # Share limits across workers
+    
+    # Analytics event pipeline
+    ANALYTICS_QUEUE_SIZE: int = 10000
+    ANALYTICS_BATCH_SIZE: int = 500
+    ANALYTICS_FLUSH_INTERVAL: float = 0.25
+    ANALYTICS_SAMPLE_WATERMARK: float = 0.5  # Start sampling when the queue is this full
+    ANALYTICS_SAMPLE_RATE: int = 4  # Keep 1 of N events while sampling
+    
+    # Popular query tracking (Space-Saving top-k)
+    POPULAR_QUERIES_CAPACITY: int = 500
+    TRENDING_QUERIES_WINDOW: int = 3600  # Decay time constant in seconds
+    
+    # Analytics time-series store (empty path keeps rollups in memory only)
+    ANALYTICS_DB_PATH: str = "analytics.db"
+    ANALYTICS_PERSIST_INTERVAL: float = 15.0
+    ANALYTICS_COMPACT_INTERVAL: float = 3600.0
+    ANALYTICS_MINUTE_RETENTION_HOURS: int = 48
+    ANALYTICS_HOURLY_RETENTION_DAYS: int = 90
+    ANALYTICS_DAILY_RETENTION_DAYS: int = 730
+    ANALYTICS_DAILY_STATS_DAYS: int = 30
+    
+    # Request tracing (empty export path disables the JSON lines exporter)
+    TRACE_SAMPLE_RATE: float = 0.1
+    TRACE_EXPORT_PATH: str = "traces.jsonl"
+    TRACE_BUFFER_SIZE: int = 200
+    # Honour the sampled flag of an incoming traceparent; only behind a proxy that sets or strips it
+    TRACE_TRUST_UPSTREAM_SAMPLED: bool = False
+    
+    # On-demand diagnostics (admin CPU profiles and memory snapshots)
+    PROFILE_MAX_SECONDS: float = 60.0
+    PROFILE_SAMPLE_INTERVAL: float = 0.005
+    TRACEMALLOC_FRAMES: int = 10  # Traceback depth recorded per allocation
+    
     # Memory management
     MAX_CACHE_SIZE_MB: int = 100
     MAX_SESSION_HISTORY: int = 50
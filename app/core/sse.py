@@ -0,0 +1,240 @@
+import asyncio
+import json
+from json.encoder import encode_basestring_ascii
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional
+
+from app.core.metrics import metrics
+
+SSE_FRAMES = metrics.counter("atabot_sse_frames_total", "Server-sent event frames written to chat streams")
+SSE_BYTES = metrics.counter("atabot_sse_bytes_total", "Server-sent event bytes written to chat streams")
+
+def _json_string(value: str) -> bytes:
+    # Same escaping as json.dumps (ensure_ascii), without building a dict per token
+    return encode_basestring_ascii(value).encode("ascii")
+
+
+class SSEEncoder:
+    """
+    Chat stream frames for one session, from pre-encoded byte templates.
+    
+    Every frame is ``data: {"type", "content", "session_id", "done"}``, the
+    same JSON ``json.dumps`` produced before; the session part is encoded
+    once per stream, so a content frame costs one string escape and two
+    concatenations. ``frames`` counts the frames encoded.
+    """
+    
+    __slots__ = ("session_id", "frames", "_content_prefix", "_content_suffix")
+    
+    FRAME_PREFIX = b"data: "
+    FRAME_SUFFIX = b"\n\n"
+    
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.frames = 0
+        self._content_prefix = self.FRAME_PREFIX + b'{"type": "content", "content": '
+        self._content_suffix = (
+            b', "session_id": ' + _json_string(session_id) + b', "done": false}' + self.FRAME_SUFFIX
+        )
+    
+    def content(self, text: str) -> bytes:
+        self.frames += 1
+        return self._content_prefix + _json_string(text) + self._content_suffix
+    
+    def event(self, type: str, content: str = "", session_id: Optional[str] = None, done: bool = False) -> bytes:
+        """Any other (rare) frame: session, done, error"""
+        self.frames += 1
+        data = json.dumps({
+            "type": type,
+            "content": content,
+            "session_id": session_id or self.session_id,
+            "done": done
+        })
+        return self.FRAME_PREFIX + data.encode("ascii") + self.FRAME_SUFFIX
+    
+    def chunk(self, chunk: Dict[str, Any]) -> bytes:
+        """Frame for one chunk of ``ChatbotService.process_message_stream``"""
+        if chunk.get("type", "content") == "content":
+            return self.content(chunk.get("content", ""))
+        return self.event(chunk["type"], chunk.get("content", ""), chunk.get("session_id"), chunk.get("done", False))
+
+
+class WebSocketEncoder(SSEEncoder):
+    """The same frames as bare JSON, one WebSocket message each"""
+    
+    __slots__ = ()
+    
+    FRAME_PREFIX = b""
+    FRAME_SUFFIX = b""
+
+
+async def coalesce_chat_stream(
+    chunks: AsyncIterator[Dict[str, Any]],
+    encoder: SSEEncoder,
+    flush_interval: float,
+    flush_bytes: int,
+) -> AsyncGenerator[List[bytes], None]:
+    """
+    Batches of frames for the chunks of ``ChatbotService.process_message_stream``.
+    
+    The first content token goes out right away (time to first byte is not
+    delayed). Later tokens are coalesced into one content frame until
+    ``flush_interval`` seconds have passed since the oldest of them or
+    ``flush_bytes`` of text are buffered; frames that are ready together
+    come as one batch. Other chunk types end the current content frame and
+    keep their order. ``flush_interval=0`` gives every token its own frame.
+    
+    With coalescing, one task per stream reads ``chunks`` while this
+    generator sleeps until the next flush or waits for its consumer, so the
+    cost is a timer per batch rather than per token, and tokens arriving
+    while the consumer is blocked on a slow client join the next batch
+    (backpressure never stalls the upstream read). Close this generator
+    (``aclosing``); closing it cancels the reading task.
+    """
+    if flush_interval <= 0:
+        async for chunk in chunks:
+            yield [encoder.chunk(chunk)]
+        return
+    
+    loop = asyncio.get_running_loop()
+    ready: List[bytes] = []    # Encoded frames, in order
+    pending: List[str] = []    # Content tokens not framed yet
+    pending_size = 0
+    pending_since = 0.0
+    content_seen = False
+    finished = False
+    error: Optional[Exception] = None
+    wake = asyncio.Event()
+    
+    def cut() -> None:
+        nonlocal pending_size
+        ready.append(encoder.content("".join(pending)))
+        pending.clear()
+        pending_size = 0
+    
+    async def pump() -> None:
+        nonlocal pending_size, pending_since, content_seen, finished, error
+        try:
+            async for chunk in chunks:
+                if chunk.get("type", "content") == "content":
+                    text = chunk.get("content", "")
+                    if not pending:
+                        pending_since = loop.time()
+                        wake.set()
+                    pending.append(text)
+                    pending_size += len(text)
+                    content_seen = True
+                    if pending_size >= flush_bytes:
+                        cut()
+                        wake.set()
+                else:
+                    if pending:
+                        cut()
+                    ready.append(encoder.chunk(chunk))
+                    wake.set()
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            wake.set()
+    
+    reader = asyncio.ensure_future(pump())
+    content_sent = False
+    try:
+        while not (finished and not pending and not ready):
+            await wake.wait()
+            wake.clear()
+            if pending and content_sent and not ready and not finished:
+                # Give following tokens until the flush deadline to join this frame;
+                # a size flush, another chunk or the end of the stream ends the wait early
+                delay = pending_since + flush_interval - loop.time()
+                if delay > 0:
+                    timer = loop.call_later(delay, wake.set)
+                    try:
+                        await wake.wait()
+                    finally:
+                        timer.cancel()
+                    wake.clear()
+            if pending:
+                cut()
+            content_sent = content_seen
+            if ready:
+                batch, ready = ready, []
+                yield batch
+        if error is not None:
+            raise error
+    finally:
+        if not reader.done():
+            reader.cancel()
+            try:
+                await reader
+            except asyncio.CancelledError:
+                pass
+
+
+class FrameCoalescer:
+    """
+    Push-style ``coalesce_chat_stream``, for a producer that never waits on
+    its consumer (the resumable stream buffer). ``feed`` it the chunks; the
+    frames go to ``emit`` in batches, from ``feed`` or from a flush timer,
+    with the same rules: first token at once, later tokens coalesced for up
+    to ``flush_interval`` seconds or ``flush_bytes``, other chunks in order.
+    ``flush`` at the end of the stream.
+    """
+    
+    __slots__ = ("encoder", "flush_interval", "flush_bytes", "emit", "_pending", "_pending_size", "_content_sent", "_timer")
+    
+    def __init__(self, encoder: SSEEncoder, flush_interval: float, flush_bytes: int, emit: Callable[[List[bytes]], Any]):
+        self.encoder = encoder
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.emit = emit
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._content_sent = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+    
+    def feed(self, chunk: Dict[str, Any]) -> None:
+        if chunk.get("type", "content") != "content":
+            frames = self._cut()
+            frames.append(self.encoder.chunk(chunk))
+            self.emit(frames)
+            return
+        
+        text = chunk.get("content", "")
+        if self.flush_interval <= 0 or not self._content_sent:
+            self._content_sent = True
+            self.emit([self.encoder.content(text)])
+            return
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size >= self.flush_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+    
+    def flush(self) -> None:
+        frames = self._cut()
+        if frames:
+            self.emit(frames)
+    
+    def _cut(self) -> List[bytes]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return []
+        frame = self.encoder.content("".join(self._pending))
+        self._pending.clear()
+        self._pending_size = 0
+        return [frame]
+
+
+def number_frames(first_id: int, frames: List[bytes]) -> bytes:
+    """SSE frames with consecutive event ids (``id:`` lines, for ``Last-Event-ID``), as one write"""
+    return b"".join(b"id: %d\n" % event_id + frame for event_id, frame in enumerate(frames, first_id))
+
+
+def record_frames(frames: int, size: int) -> None:
+    """Count one finished stream's frames and bytes"""
+    SSE_FRAMES.inc(frames)
+    SSE_BYTES.inc(size)
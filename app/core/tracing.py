@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Mapping, Optional
+
+from app.core.performance_config import performance_settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_ID_HEADER = "X-Trace-Id"
+
+
+class Span:
+    """A timed stage inside a trace"""
+
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "end_time", "attributes")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str]):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self.attributes: Dict[str, Any] = {}
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+            self.trace._close(self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.end()
+
+    @property
+    def duration(self) -> float:
+        return (self.end_time or time.perf_counter()) - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start - self.trace.root.start) * 1000, 3),
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Shared stand-in used when a request is not sampled"""
+
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """
+    All spans of one request.
+
+    The active trace lives in a ContextVar so services can open spans without
+    it being passed around; the span stack lives on the trace itself, so a
+    span may stay open across ``yield`` in a streaming generator.
+    """
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._stack: List[Span] = []
+        self.root = Span(self, name, parent_id) if sampled else None
+        if self.root is not None:
+            self.spans.append(self.root)
+            self._stack.append(self.root)
+
+    def span(self, name: str):
+        """Open a child span of the innermost open span"""
+        if not self.sampled or not self._stack:
+            return NOOP_SPAN
+        span = Span(self, name, self._stack[-1].span_id)
+        self.spans.append(span)
+        self._stack.append(span)
+        return span
+
+    def _close(self, span: Span) -> None:
+        if span in self._stack:
+            self._stack.remove(span)
+        if span is self.root:
+            self.tracer._finish(self)
+
+    def finish(self) -> None:
+        """End the root span (and any span left open) and export the trace"""
+        if self.root is None:
+            return
+        for span in reversed(self._stack[1:]):
+            span.end()
+        self.root.end()
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages: Dict[str, float] = {}
+        for span in self.spans[1:]:
+            stages[span.name] = round(stages.get(span.name, 0.0) + span.duration * 1000, 3)
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.root.duration * 1000, 3),
+            "attributes": self.root.attributes,
+            "stages": stages,
+            "spans": [span.to_dict() for span in self.spans],
+        }
+
+
+class JsonLinesExporter:
+    """Append finished traces to a local JSON lines file in batches, off the event loop"""
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def export(self, trace: Dict[str, Any]) -> None:
+        self._buffer.append(json.dumps(trace, ensure_ascii=False))
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            lines, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            try:
+                asyncio.get_running_loop().run_in_executor(None, self._write, lines)
+            except RuntimeError:
+                self._write(lines)
+
+    def _write(self, lines: List[str]) -> None:
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.error(f"Error writing traces to {self.path}: {str(e)}")
+
+    def flush(self) -> None:
+        lines, self._buffer = self._buffer, []
+        if lines:
+            self._write(lines)
+
+
+class Tracer:
+    def __init__(
+        self,
+        sample_rate: float = 0.1,
+        exporter: Optional[JsonLinesExporter] = None,
+        buffer_size: int = 200,
+        trust_upstream_sampled: bool = False,
+    ):
+        self.sample_rate = sample_rate
+        self.trust_upstream_sampled = trust_upstream_sampled
+        self.exporter = exporter
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+
+    def start_trace(self, name: str, headers: Optional[Mapping[str, str]] = None) -> Trace:
+        """
+        Start a trace for a request and make it current.
+
+        Accepts a W3C ``traceparent`` or ``X-Trace-Id`` header so the trace ID
+        of an upstream proxy or client is kept. A sampled ``traceparent`` flag
+        forces sampling only with ``trust_upstream_sampled``, as any client
+        could otherwise bypass the sample rate.
+        """
+        trace_id, parent_id, sampled = None, None, None
+        if headers is not None:
+            traceparent = headers.get("traceparent")
+            if traceparent:
+                parts = traceparent.split("-")
+                if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                    trace_id, parent_id = parts[1], parts[2]
+                    if self.trust_upstream_sampled:
+                        sampled = parts[3] == "01" or None
+            if trace_id is None:
+                trace_id = headers.get(TRACE_ID_HEADER) or None
+
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        trace = Trace(self, name, trace_id or os.urandom(16).hex(), parent_id, sampled)
+        _current_trace.set(trace)
+        return trace
+
+    def _finish(self, trace: Trace) -> None:
+        data = trace.to_dict()
+        self.recent.append(data)
+        if self.exporter is not None:
+            self.exporter.export(data)
+
+    def slowest(self, limit: int = 20, name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Slowest recently finished traces, with per-stage durations"""
+        traces = [t for t in self.recent if name is None or t["name"] == name]
+        traces.sort(key=lambda t: t["duration_ms"], reverse=True)
+        return traces[:limit]
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("atabot_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def span(name: str):
+    """Open a span in the current trace (no-op when there is none or it is not sampled)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    return trace.span(name)
+
+
+tracer = Tracer(
+    sample_rate=performance_settings.TRACE_SAMPLE_RATE,
+    exporter=JsonLinesExporter(performance_settings.TRACE_EXPORT_PATH) if performance_settings.TRACE_EXPORT_PATH else None,
+    buffer_size=performance_settings.TRACE_BUFFER_SIZE,
+    trust_upstream_sampled=performance_settings.TRACE_TRUST_UPSTREAM_SAMPLED,
+)
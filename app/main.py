@@ -7,33 +7,58 @@ import os
 
 from app.core.config import settings
 from app.api.v1.api import api_router
-from app.api.v1.endpoints.chat import initialize_chatbot_embeddings
-from app.middleware.security import security_middleware
-from app.middleware.rate_limiting import rate_limit_middleware
-from app.middleware.performance_middleware import performance_middleware
-
-app = FastAPI(
-    title=settings.APP_NAME,
-    version=settings.APP_VERSION,
-    openapi_url=f"/openapi.json" if settings.DEBUG else None
-)
-
-# Middlewares
-app.middleware("http")(security_middleware)
-app.middleware("http")(rate_limit_middleware) 
-app.middleware("http")(performance_middleware)
+from app.api.v1.endpoints import metrics
+from app.api.tenancy import get_default_chatbot_service
+from app.core.http_client import close_http_client
+from app.middleware.security import SecurityMiddleware
+from app.middleware.rate_limiting import RateLimitMiddleware
+from app.middleware.performance_middleware import PerformanceMiddleware
+from app.middleware.tenant import TenantPathMiddleware
+from app.services.analytics_service import get_analytics_service
+from app.services.kb_watcher import KnowledgeBaseWatcher
+from app.services.knowledge_base import DATA_PATH
+from app.services.startup import ensure_started
+from app.services.stream_store import STREAM_ID_HEADER
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Code to run on startup
-    await initialize_chatbot_embeddings()
+    # Code to run on startup; the server accepts requests only after this
+    # (knowledge base, embeddings, warm connection pool and caches)
+    chatbot_service = get_default_chatbot_service()
+    await ensure_started(chatbot_service)
     
     # BARU: Create backup directory if not exists
-    backup_dir = "backups"
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
-        
+    os.makedirs(settings.BACKUP_DIR, exist_ok=True)
+    
+    watcher = None
+    if settings.KB_WATCH_ENABLED:
+        watcher = KnowledgeBaseWatcher(
+            DATA_PATH,
+            chatbot_service.reload,
+            debounce=settings.KB_WATCH_DEBOUNCE,
+            poll_interval=settings.KB_WATCH_POLL_INTERVAL,
+        )
+        watcher.start()
+    
     yield
+    
+    if watcher is not None:
+        await watcher.stop()
+    # Writes the open minute and the closed ones not persisted yet
+    await get_analytics_service().stop()
+    await close_http_client()
+
+app = FastAPI(
+    title=settings.APP_NAME,
+    version=settings.APP_VERSION,
+    openapi_url=f"/openapi.json" if settings.DEBUG else None,
+    lifespan=lifespan
+)
+
+# Middlewares (pure ASGI; the last one added runs first)
+app.add_middleware(SecurityMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(PerformanceMiddleware)
 
 # CORS middleware untuk widget
 app.add_middleware(
@@ -42,8 +67,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[STREAM_ID_HEADER],  # The widget resumes dropped streams by this id
 )
 
+# Routes /t/{tenant}/... to the canonical paths; added last so it runs before everything else
+app.add_middleware(TenantPathMiddleware)
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     """Simple chat widget demo"""
@@ -86,4 +115,5 @@ async def get_widget():
     return FileResponse(widget_path)
 
 # Include routers
-app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
+app.include_router(api_router, prefix="/api/v1")
+app.include_router(metrics.router)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import time
 from fastapi import Request
-from app.services.analytics_service import analytics_service
+from app.services.analytics_service import get_analytics_service
 
 async def analytics_middleware(request: Request, call_next):
     start_time = time.time()
@@ -12,6 +12,6 @@ async def analytics_middleware(request: Request, call_next):
         response_time = time.time() - start_time
         # Extract session_id and message from request (simplified)
         # In real implementation, you'd need proper extraction logic
-        await analytics_service.track_message("session", "message", response_time)
+        await get_analytics_service().track_message("session", "message", response_time)
     
     return response
\ No newline at end of file
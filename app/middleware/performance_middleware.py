@@ -1,20 +1,287 @@
 import asyncio
-from fastapi import Request, HTTPException
+import math
+import time
+from collections import deque
+from typing import Deque, List, Optional
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from app.core.performance_config import performance_settings
+from app.core.metrics import metrics
 
-# Simple semaphore for concurrent request limiting
-request_semaphore = asyncio.Semaphore(performance_settings.MAX_CONCURRENT_REQUESTS)
+REQUESTS_IN_FLIGHT = metrics.gauge("atabot_requests_in_flight", "Requests holding a concurrency slot", ["lane"])
+REQUESTS_WAITING = metrics.gauge("atabot_requests_waiting", "Requests waiting for a concurrency slot", ["lane"])
+CONCURRENCY_LIMIT = metrics.gauge("atabot_concurrency_limit", "Current concurrency limit", ["lane"])
+SEMAPHORE_WAIT = metrics.histogram(
+    "atabot_concurrency_wait_seconds",
+    "Time spent waiting for a concurrency slot",
+    ["lane"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+REQUESTS_SHED = metrics.counter(
+    "atabot_requests_shed_total", "Requests rejected with 503 by the concurrency limiter", ["lane", "reason"]
+)
+REQUEST_TIMEOUTS = metrics.counter("atabot_request_timeouts_total", "Requests that hit REQUEST_TIMEOUT")
 
-async def performance_middleware(request: Request, call_next):
-    async with request_semaphore:
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD on observed latency.
+    
+    Each completed request feeds a short and a long latency average. While
+    the short average stays within ``tolerance`` times the long one, the
+    limit grows by about one per round trip (additive increase); when it
+    rises above that, or a request fails or times out, the limit is
+    multiplied by ``backoff`` (at most once per round trip). With
+    ``min_limit == max_limit`` it behaves as a fixed semaphore.
+    
+    Waiters queue FIFO up to ``max_queue`` for at most ``queue_timeout``
+    seconds; beyond that ``acquire`` returns False so the caller can shed
+    the request early instead of letting it time out.
+    """
+    
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        max_queue: int = 50,
+        queue_timeout: float = 5.0,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+    
+    @property
+    def adaptive(self) -> bool:
+        return self.min_limit != self.max_limit
+    
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+    
+    async def acquire(self) -> Optional[str]:
+        """Take a slot; returns None when admitted, else the reason for shedding"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+        
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
         try:
-            response = await asyncio.wait_for(
-                call_next(request),
-                timeout=performance_settings.REQUEST_TIMEOUT
-            )
-            return response
+            await asyncio.wait_for(future, self.queue_timeout)
+            return None
         except asyncio.TimeoutError:
-            raise HTTPException(status_code=408, detail="Request timeout")
-        except Exception as e:
-            # Log error for monitoring
-            raise
\ No newline at end of file
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before cancellation
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+    
+    def release(self, latency: float, dropped: bool = False) -> None:
+        """Return a slot and adjust the limit from the request's outcome"""
+        if self.adaptive:
+            self._update_limit(latency, dropped)
+        self._release_slot()
+    
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        # Hand freed slots straight to waiters, in arrival order
+        while self._waiters and self.in_flight < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+    
+    def _update_limit(self, latency: float, dropped: bool) -> None:
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+        else:
+            self.short_latency += 0.2 * (latency - self.short_latency)
+            self.long_latency += 0.02 * (latency - self.long_latency)
+        
+        congested = dropped or self.short_latency > self.long_latency * self.tolerance
+        now = time.monotonic()
+        if congested:
+            if now - self._last_decrease >= self.short_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif self.in_flight * 2 >= self.limit:
+            # Only grow while the limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+    
+    def retry_after(self) -> int:
+        """Rough seconds until a queued slot frees up, for the Retry-After header"""
+        latency = self.long_latency or 1.0
+        return max(1, math.ceil(latency * (len(self._waiters) + 1) / max(self.limit, 1.0)))
+
+
+class ConcurrencyLane:
+    """Requests under ``prefix`` share one limiter; ``limiter=None`` means never limited"""
+    
+    def __init__(self, name: str, prefix: str, limiter: Optional[AdaptiveLimiter]):
+        self.name = name
+        self.prefix = prefix
+        self.limiter = limiter
+        self.wait = SEMAPHORE_WAIT.labels(name)
+        self.shed = {
+            reason: REQUESTS_SHED.labels(name, reason) for reason in ("queue_full", "queue_timeout")
+        }
+        if limiter is not None:
+            REQUESTS_IN_FLIGHT.labels(name).set_function(lambda: limiter.in_flight)
+            REQUESTS_WAITING.labels(name).set_function(lambda: limiter.waiting)
+            CONCURRENCY_LIMIT.labels(name).set_function(lambda: int(limiter.limit))
+
+
+class ConcurrencyLanes:
+    """
+    Priority lanes: picks the lane with the longest matching path prefix.
+    
+    Separate limiters keep health checks, history and admin responsive
+    while chat traffic saturates its own lane.
+    """
+    
+    def __init__(self, lanes: List[ConcurrencyLane], default: ConcurrencyLane):
+        self.lanes = sorted(lanes, key=lambda lane: len(lane.prefix), reverse=True)
+        self.default = default
+    
+    def lane_for(self, path: str) -> ConcurrencyLane:
+        for lane in self.lanes:
+            if path.startswith(lane.prefix):
+                return lane
+        return self.default
+
+
+def _fixed_limiter(limit: int) -> AdaptiveLimiter:
+    return AdaptiveLimiter(
+        limit, limit, limit,
+        max_queue=performance_settings.CONCURRENCY_QUEUE_SIZE,
+        queue_timeout=performance_settings.CONCURRENCY_QUEUE_TIMEOUT,
+    )
+
+
+concurrency_lanes = ConcurrencyLanes(
+    lanes=[
+        ConcurrencyLane("health", "/api/v1/health", None),
+        ConcurrencyLane("metrics", "/metrics", None),
+        ConcurrencyLane("chat", "/api/v1/chat/message", AdaptiveLimiter(
+            initial_limit=performance_settings.CONCURRENCY_CHAT_INITIAL_LIMIT,
+            min_limit=performance_settings.CONCURRENCY_CHAT_MIN_LIMIT,
+            max_limit=performance_settings.MAX_CONCURRENT_REQUESTS,
+            max_queue=performance_settings.CONCURRENCY_QUEUE_SIZE,
+            queue_timeout=performance_settings.CONCURRENCY_QUEUE_TIMEOUT,
+            tolerance=performance_settings.CONCURRENCY_LATENCY_TOLERANCE,
+            backoff=performance_settings.CONCURRENCY_BACKOFF,
+        )),
+        # Long-running bulk requests never take slots from interactive traffic
+        ConcurrencyLane("batch", "/api/v1/chat/batch", _fixed_limiter(performance_settings.CONCURRENCY_BATCH_LIMIT)),
+    ],
+    # History, sessions, admin, analytics and everything else
+    default=ConcurrencyLane("interactive", "/", _fixed_limiter(performance_settings.CONCURRENCY_INTERACTIVE_LIMIT)),
+)
+
+class PerformanceMiddleware:
+    """
+    Concurrency limit, load shedding and response timeout (pure ASGI).
+    
+    Requests are admitted through their lane's limiter and rejected with 503
+    and Retry-After when its wait queue is full or the wait times out. The
+    slot is held until the response completes; its duration, and whether it
+    failed, drive the adaptive limit.
+    
+    REQUEST_TIMEOUT bounds the time until the response starts, as the old
+    ``wait_for(call_next(...))`` did; a streaming body may run longer. The
+    timeout is a ``call_later`` cancel on the request task, so no extra task
+    is created per request.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        timeout: float = performance_settings.REQUEST_TIMEOUT,
+        lanes: ConcurrencyLanes = concurrency_lanes,
+    ):
+        self.app = app
+        self.timeout = timeout
+        self.lanes = lanes
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        lane = self.lanes.lane_for(scope["path"])
+        limiter = lane.limiter
+        if limiter is None:
+            await self._call_with_timeout(scope, receive, send)
+            return
+        
+        wait_start = time.perf_counter()
+        shed_reason = await limiter.acquire()
+        if shed_reason is not None:
+            lane.shed[shed_reason].inc()
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, please retry later"},
+                headers={"Retry-After": str(limiter.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        lane.wait.observe(start - wait_start)
+        failed = True
+        try:
+            failed = await self._call_with_timeout(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start, dropped=failed)
+    
+    async def _call_with_timeout(self, scope: Scope, receive: Receive, send: Send) -> bool:
+        """Run the app; returns True when the request timed out or answered 5xx"""
+        task = asyncio.current_task()
+        state = {"started": False, "timed_out": False, "status": 0}
+        
+        def on_timeout() -> None:
+            if not state["started"]:
+                state["timed_out"] = True
+                task.cancel()
+        
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["started"] = True
+                state["status"] = message["status"]
+            await send(message)
+        
+        timeout_handle = asyncio.get_running_loop().call_later(self.timeout, on_timeout)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except asyncio.CancelledError:
+            if not state["timed_out"]:
+                raise
+            task.uncancel()
+            REQUEST_TIMEOUTS.inc()
+            response = JSONResponse(status_code=408, content={"detail": "Request timeout"})
+            await response(scope, receive, send)
+            return True
+        finally:
+            timeout_handle.cancel()
+        return state["status"] >= 500
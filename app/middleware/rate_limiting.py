@@ -1,35 +1,241 @@
-from fastapi import Request, HTTPException
-from typing import Dict
+from collections import OrderedDict
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import List, Optional, Tuple
+import logging
+import math
 import time
-from collections import defaultdict, deque
+
+from app.core.metrics import metrics
+from app.core.performance_config import performance_settings
+
+logger = logging.getLogger(__name__)
+
+# Optional: shared limits across workers through Redis
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+RATE_LIMIT_DECISIONS = metrics.counter(
+    "atabot_rate_limit_decisions_total", "Rate limiter decisions", ["policy", "decision"]
+)
+RATE_LIMIT_KEYS = metrics.gauge("atabot_rate_limit_tracked_keys", "Client keys tracked by the rate limiter")
 
 class RateLimiter:
-    def __init__(self, max_requests: int = 10, window_seconds: int = 60):
+    """
+    GCRA (generic cell rate algorithm) limiter, equivalent to a token bucket.
+    
+    Each key stores a single float, its theoretical arrival time (TAT), so
+    memory and work per request are O(1). A key whose TAT is in the past has
+    a full bucket and carries no information; keys are kept in the order
+    they were last allowed, and every few checks evict a bounded number of
+    idle ones from the front.
+    """
+    
+    def __init__(
+        self,
+        max_requests: int = 10,
+        window_seconds: int = 60,
+        burst: Optional[int] = None,
+        evict_every: int = 8,
+        evict_batch: int = 16,
+    ):
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests: Dict[str, deque] = defaultdict(deque)
+        self.burst = burst or max_requests
+        self.emission_interval = window_seconds / max_requests
+        # How far ahead of "now" the TAT may run before requests are rejected
+        self.tolerance = self.emission_interval * (self.burst - 1)
+        # More than one key per check on average, so eviction keeps up with new keys
+        self.evict_every = evict_every
+        self.evict_batch = evict_batch
+        self._checks = 0
+        self.tat: "OrderedDict[str, float]" = OrderedDict()
     
-    def is_allowed(self, key: str) -> bool:
-        now = time.time()
+    def is_allowed(self, key: str, now: Optional[float] = None) -> bool:
+        return self.check(key, now)[0]
+    
+    def check(self, key: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Return (allowed, retry_after_seconds)"""
+        now = time.monotonic() if now is None else now
+        self._checks += 1
+        if self._checks >= self.evict_every:
+            self._checks = 0
+            self._evict_idle(now)
+        
+        tat = self.tat.get(key, now)
+        if tat < now:
+            tat = now
+        if tat - now > self.tolerance:
+            return False, tat - now - self.tolerance
         
-        # Clean old requests
-        while self.requests[key] and self.requests[key][0] < now - self.window_seconds:
-            self.requests[key].popleft()
+        self.tat[key] = tat + self.emission_interval
+        self.tat.move_to_end(key)
+        return True, 0.0
+    
+    def _evict_idle(self, now: float) -> None:
+        """
+        Drop up to ``evict_batch`` of the least recently allowed keys whose
+        bucket has fully refilled. A busier key at the front holds back the
+        ones behind it for at most one burst's worth of time.
+        """
+        tat = self.tat
+        for _ in range(self.evict_batch):
+            key = next(iter(tat), None)
+            if key is None or tat[key] > now:
+                return
+            del tat[key]
+
+
+# GCRA as a Redis script: one key per client holding the TAT, expiring when idle
+_GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local tolerance = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+if tat - now > tolerance then
+    return tostring(tat - now - tolerance)
+end
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+class RedisRateLimiter:
+    """GCRA limiter whose state lives in Redis, so limits hold across workers"""
+    
+    def __init__(self, client, limiter: RateLimiter, prefix: str):
+        self.client = client
+        self.limiter = limiter
+        self.prefix = prefix
+        self._script = client.register_script(_GCRA_SCRIPT)
+    
+    async def check(self, key: str) -> Tuple[bool, float]:
+        retry_after = float(await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[time.time(), self.limiter.emission_interval, self.limiter.tolerance],
+        ))
+        return retry_after <= 0, retry_after
+
+
+class RateLimitPolicy:
+    """A named limit applied to every path under ``prefix``"""
+    
+    def __init__(self, name: str, prefix: str, spec: str):
+        self.name = name
+        self.prefix = prefix
+        self.limiter = self._parse(spec)
+        self.shared: Optional[RedisRateLimiter] = None
+        self._allowed = RATE_LIMIT_DECISIONS.labels(name, "allowed")
+        self._rejected = RATE_LIMIT_DECISIONS.labels(name, "rejected")
+    
+    @staticmethod
+    def _parse(spec: str) -> Optional[RateLimiter]:
+        """Parse "requests/seconds" or "requests/seconds/burst"; empty or 0 means unlimited"""
+        if not spec or spec.strip() in ("0", "none"):
+            return None
+        try:
+            parts = [int(part) for part in spec.split("/")]
+        except ValueError:
+            parts = []
+        if len(parts) not in (2, 3) or min(parts) <= 0:
+            raise ValueError(
+                f"Invalid rate limit {spec!r}: expected positive integers as "
+                f"\"requests/seconds\" or \"requests/seconds/burst\", or empty for no limit"
+            )
+        max_requests, window_seconds = parts[0], parts[1]
+        burst = parts[2] if len(parts) > 2 else None
+        return RateLimiter(max_requests=max_requests, window_seconds=window_seconds, burst=burst)
+    
+    async def check(self, key: str) -> Tuple[bool, float]:
+        if self.limiter is None:
+            return True, 0.0
         
-        # Check if under limit
-        if len(self.requests[key]) < self.max_requests:
-            self.requests[key].append(now)
-            return True
+        if self.shared is not None:
+            try:
+                allowed, retry_after = await self.shared.check(key)
+            except Exception as e:
+                # Fall back to per-worker limits while Redis is unavailable
+                logger.error(f"Shared rate limiter error: {str(e)}")
+                allowed, retry_after = self.limiter.check(key)
+        else:
+            allowed, retry_after = self.limiter.check(key)
         
-        return False
+        (self._allowed if allowed else self._rejected).inc()
+        return allowed, retry_after
 
-rate_limiter = RateLimiter(max_requests=20, window_seconds=60)
 
-async def rate_limit_middleware(request: Request, call_next):
-    client_ip = request.client.host
+class RouteRateLimiter:
+    """Picks the policy with the longest matching path prefix"""
     
-    if not rate_limiter.is_allowed(client_ip):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    def __init__(self, policies: List[RateLimitPolicy], default: RateLimitPolicy):
+        self.policies = sorted(policies, key=lambda p: len(p.prefix), reverse=True)
+        self.default = default
     
-    response = await call_next(request)
-    return response
+    def policy_for(self, path: str) -> RateLimitPolicy:
+        for policy in self.policies:
+            if path.startswith(policy.prefix):
+                return policy
+        return self.default
+    
+    def all_policies(self) -> List[RateLimitPolicy]:
+        return self.policies + [self.default]
+    
+    def tracked_keys(self) -> int:
+        return sum(len(p.limiter.tat) for p in self.all_policies() if p.limiter is not None)
+    
+    def enable_shared_backend(self, redis_url: str) -> None:
+        """Keep limiter state in Redis (requires the optional redis package)"""
+        if aioredis is None:
+            logger.error("RATE_LIMIT_REDIS_URL is set but the redis package is not installed")
+            return
+        client = aioredis.from_url(redis_url)
+        for policy in self.all_policies():
+            if policy.limiter is not None:
+                policy.shared = RedisRateLimiter(client, policy.limiter, f"atabot:ratelimit:{policy.name}")
+
+
+rate_limiter = RouteRateLimiter(
+    policies=[
+        RateLimitPolicy("chat_stream", "/api/v1/chat/message/stream", performance_settings.RATE_LIMIT_CHAT_STREAM),
+        RateLimitPolicy("chat_batch", "/api/v1/chat/batch", performance_settings.RATE_LIMIT_CHAT_BATCH),
+        RateLimitPolicy("chat", "/api/v1/chat", performance_settings.RATE_LIMIT_CHAT),
+        RateLimitPolicy("admin", "/api/v1/admin", performance_settings.RATE_LIMIT_ADMIN),
+        RateLimitPolicy("health", "/api/v1/health", performance_settings.RATE_LIMIT_HEALTH),
+        RateLimitPolicy("metrics", "/metrics", performance_settings.RATE_LIMIT_METRICS),
+    ],
+    default=RateLimitPolicy("default", "/", performance_settings.RATE_LIMIT_DEFAULT),
+)
+if performance_settings.RATE_LIMIT_REDIS_URL:
+    rate_limiter.enable_shared_backend(performance_settings.RATE_LIMIT_REDIS_URL)
+RATE_LIMIT_KEYS.set_function(rate_limiter.tracked_keys)
+
+class RateLimitMiddleware:
+    """Applies the per-route rate limit policy to every HTTP request (pure ASGI)"""
+    
+    def __init__(self, app: ASGIApp, limiter: RouteRateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        policy = self.limiter.policy_for(scope["path"])
+        
+        allowed, retry_after = await policy.check(client_ip)
+        if not allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+        
+        await self.app(scope, receive, send)
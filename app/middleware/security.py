@@ -1,29 +1,139 @@
-from fastapi import Request
-from fastapi.responses import Response
-import re
+from starlette.datastructures import MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+from urllib.parse import unquote_plus
 
-SUSPICIOUS_PATTERNS = [
-    r'<script[^>]*>.*?</script>',
-    r'javascript:',
-    r'on\w+\s*=',
-    r'eval\s*\(',
-    r'document\.cookie',
+from app.core.config import settings
+from app.core.input_validation import SCOPE_QUERY, BodyScanner, ValidationEngine, validation_engine
+from app.core.metrics import metrics
+
+REQUESTS_REJECTED = metrics.counter(
+    "atabot_requests_rejected_total", "Requests rejected by input validation", ["rule"]
+)
+
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+]
+
+# Per-route request body caps (first matching prefix wins, else MAX_REQUEST_BODY_BYTES)
+BODY_LIMITS = [
+    ("/api/v1/chat/batch", settings.MAX_CHAT_BATCH_BODY_BYTES),
+    ("/api/v1/chat", settings.MAX_CHAT_BODY_BYTES),
 ]
 
-async def security_middleware(request: Request, call_next):
-    # Check for XSS attempts in query params and body
-    if request.query_params:
-        query_string = str(request.query_params)
-        for pattern in SUSPICIOUS_PATTERNS:
-            if re.search(pattern, query_string, re.IGNORECASE):
-                return Response("Suspicious request detected", status_code=400)
-    
-    response = await call_next(request)
-    
-    # Add security headers
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-    
-    return response
+class SecurityMiddleware:
+    """
+    Input validation and security headers (pure ASGI).
+    
+    Query strings are checked against the validation engine's query rules.
+    Request bodies are read here chunk by chunk and size capped, and those
+    FastAPI will decode as JSON are scanned as they arrive, so oversized or
+    suspicious bodies are rejected before the rest is received; accepted
+    bodies are then replayed to the application.
+    """
+    
+    def __init__(self, app: ASGIApp, engine: ValidationEngine = validation_engine):
+        self.app = app
+        self.engine = engine
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        send = self._with_headers(send)
+        
+        # Check for XSS attempts in query params
+        query_string = scope.get("query_string", b"")
+        if query_string:
+            rule = self.engine.find(SCOPE_QUERY, unquote_plus(query_string.decode("latin-1")))
+            if rule:
+                await self._reject(scope, receive, send, rule)
+                return
+        
+        if scope["method"] in ("POST", "PUT", "PATCH"):
+            max_bytes = self._body_limit(scope["path"])
+            content_length = self._header(scope, b"content-length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                await self._reject(scope, receive, send, BodyScanner.TOO_LARGE)
+                return
+            
+            # Every body is capped (chunked bodies have no content-length); only JSON ones are scanned
+            scanner = self.engine.scanner(max_bytes, scan=self._decoded_as_json(self._header(scope, b"content-type")))
+            body = bytearray()
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] != "http.request":
+                    # Client went away while sending the body
+                    return
+                chunk = message.get("body", b"")
+                rule = scanner.feed(chunk)
+                if rule:
+                    await self._reject(scope, receive, send, rule)
+                    return
+                body += chunk
+                more_body = message.get("more_body", False)
+            receive = self._replay(bytes(body), receive)
+        
+        await self.app(scope, receive, send)
+    
+    @staticmethod
+    def _body_limit(path: str) -> int:
+        for prefix, limit in BODY_LIMITS:
+            if path.startswith(prefix):
+                return limit
+        return settings.MAX_REQUEST_BODY_BYTES
+    
+    @staticmethod
+    def _decoded_as_json(content_type: Optional[str]) -> bool:
+        """Whether FastAPI parses a body with this content-type as JSON: none, application/json or +json"""
+        if not content_type:
+            return True
+        media_type = content_type.split(";", 1)[0].strip().lower()
+        maintype, _, subtype = media_type.partition("/")
+        return maintype == "application" and (subtype == "json" or subtype.endswith("+json"))
+    
+    @staticmethod
+    def _header(scope: Scope, name: bytes) -> Optional[str]:
+        for key, value in scope["headers"]:
+            if key == name:
+                return value.decode("latin-1")
+        return None
+    
+    @staticmethod
+    def _replay(body: bytes, receive: Receive) -> Receive:
+        """Hand the already-read body to the app, then pass later messages (disconnect) through"""
+        pending = True
+        
+        async def replay_receive() -> Message:
+            nonlocal pending
+            if pending:
+                pending = False
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+        return replay_receive
+    
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send, rule: str) -> None:
+        REQUESTS_REJECTED.labels(rule).inc()
+        if rule == BodyScanner.TOO_LARGE:
+            response = Response("Request body too large", status_code=413)
+        else:
+            response = Response("Suspicious request detected", status_code=400)
+        await response(scope, receive, send)
+    
+    @staticmethod
+    def _with_headers(send: Send) -> Send:
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Add security headers
+                headers = MutableHeaders(scope=message)
+                for name, value in SECURITY_HEADERS:
+                    headers.raw.append((name, value))
+            await send(message)
+        return send_wrapper
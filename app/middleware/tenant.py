@@ -0,0 +1,34 @@
+import re
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+TENANT_HEADER = "X-Tenant-ID"
+
+_TENANT_HEADER_KEY = TENANT_HEADER.lower().encode("latin-1")
+_TENANT_PATH_RE = re.compile(r"^/t/([^/]+)(/.*)$")
+
+class TenantPathMiddleware:
+    """
+    Path-based tenant selection (pure ASGI).
+    
+    ``/t/{tenant}/api/v1/...`` is routed as ``/api/v1/...`` with the tenant
+    passed on in the X-Tenant-ID header (replacing any sent by the client),
+    so routes, rate limits and concurrency lanes see the same paths for
+    every tenant. Must run before the other middleware.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket"):
+            match = _TENANT_PATH_RE.match(scope["path"])
+            if match:
+                tenant_id, path = match.groups()
+                headers = [(key, value) for key, value in scope["headers"] if key != _TENANT_HEADER_KEY]
+                headers.append((_TENANT_HEADER_KEY, tenant_id.encode("latin-1")))
+                scope = dict(scope, path=path, headers=headers)
+                raw_path = scope.get("raw_path")
+                if raw_path and raw_path.startswith(b"/t/"):
+                    scope["raw_path"] = raw_path[raw_path.index(b"/", 3):]
+        await self.app(scope, receive, send)
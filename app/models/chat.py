@@ -1,7 +1,10 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+from app.core.config import settings
+from app.core.input_validation import InputValidator
+
 class ChatMessage(BaseModel):
     role: str  # "user" or "assistant"
     content: str
@@ -16,6 +19,30 @@ class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
     context: Optional[List[ChatMessage]] = []
+    
+    @field_validator("message")
+    @classmethod
+    def validate_message(cls, value: str) -> str:
+        is_valid, error = InputValidator.validate_message(value)
+        if not is_valid:
+            raise ValueError(error)
+        # Validated, not rewritten: markup and line breaks reach the LLM and the history as sent
+        if not value.strip():
+            raise ValueError("Message is empty")
+        return value
+
+class BatchChatRequest(BaseModel):
+    messages: List[ChatRequest]
+    concurrency: Optional[int] = Field(None, ge=1)
+    
+    @field_validator("messages")
+    @classmethod
+    def validate_messages(cls, value: List[ChatRequest]) -> List[ChatRequest]:
+        if not value:
+            raise ValueError("No messages")
+        if len(value) > settings.MAX_CHAT_BATCH_MESSAGES:
+            raise ValueError(f"At most {settings.MAX_CHAT_BATCH_MESSAGES} messages per batch")
+        return value
 
 class ChatResponse(BaseModel):
     response: str
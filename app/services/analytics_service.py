@@ -1,39 +1,326 @@
-from datetime import datetime
-from typing import Dict, List
-from collections import defaultdict, Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from collections import defaultdict
+import asyncio
 import logging
+import time
+
+from app.core.performance_config import performance_settings
+from app.services.heavy_hitters import SpaceSaving
+from app.services.latency_histogram import LatencyTracker
+from app.services.timeseries_store import TimeSeriesStore
 
 logger = logging.getLogger(__name__)
 
+# Event kinds pushed onto the analytics queue. Events are plain tuples of
+# (kind, weight, *payload) so producing one costs a single allocation.
+EVENT_MESSAGE = "message"
+EVENT_LATENCY = "latency"
+EVENT_SESSION = "session"
+EVENT_ERROR = "error"
+EVENT_CACHE = "cache"
+
 class AnalyticsService:
-    def __init__(self):
+    def __init__(
+        self,
+        queue_size: int = performance_settings.ANALYTICS_QUEUE_SIZE,
+        batch_size: int = performance_settings.ANALYTICS_BATCH_SIZE,
+        flush_interval: float = performance_settings.ANALYTICS_FLUSH_INTERVAL,
+        sample_watermark: float = performance_settings.ANALYTICS_SAMPLE_WATERMARK,
+        sample_rate: int = performance_settings.ANALYTICS_SAMPLE_RATE,
+    ):
         self.message_count = 0
         self.session_count = 0
         self.daily_stats = defaultdict(int)
-        self.popular_queries = Counter()
-        self.response_times = []
+        # Fixed-memory top-k keyword counters: all-time and exponentially decayed
+        self.popular_queries = SpaceSaving(performance_settings.POPULAR_QUERIES_CAPACITY)
+        self.trending_queries = SpaceSaving(
+            performance_settings.POPULAR_QUERIES_CAPACITY,
+            decay_seconds=performance_settings.TRENDING_QUERIES_WINDOW,
+        )
+        self.latency = LatencyTracker()
+        self.response_time_total = 0.0
+        self.response_time_count = 0
         self.error_count = 0
         self.user_feedback = []
+        self.started_at = time.time()
+        
+        # Persisted per-minute rollups
+        self.timeseries = TimeSeriesStore(
+            path=performance_settings.ANALYTICS_DB_PATH,
+            minute_retention=performance_settings.ANALYTICS_MINUTE_RETENTION_HOURS * 3600,
+            hour_retention=performance_settings.ANALYTICS_HOURLY_RETENTION_DAYS * 86400,
+            day_retention=performance_settings.ANALYTICS_DAILY_RETENTION_DAYS * 86400,
+        )
+        self.persist_interval = performance_settings.ANALYTICS_PERSIST_INTERVAL
+        self.compact_interval = performance_settings.ANALYTICS_COMPACT_INTERVAL
+        self.daily_stats_days = performance_settings.ANALYTICS_DAILY_STATS_DAYS
+        self._last_persist = time.monotonic()
+        self._last_compact = 0.0
+        self._restored = False
+        
+        # Event pipeline
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_threshold = int(queue_size * sample_watermark)
+        self.sample_rate = max(1, sample_rate)
+        self.events_processed = 0
+        self.events_dropped = 0
+        self.events_sampled_out = 0
+        self._sample_counter = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
     
-    async def track_message(self, session_id: str, message: str, response_time: float):
-        """Track message analytics"""
-        self.message_count += 1
-        today = datetime.now().strftime('%Y-%m-%d')
-        self.daily_stats[today] += 1
+    # ------------------------------------------------------------------
+    # Producer side: called from request handlers, never awaits
+    # ------------------------------------------------------------------
+    
+    def _ensure_worker(self) -> Optional[asyncio.Queue]:
+        """Return the event queue, starting the aggregator on the running loop"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
         
-        # Track popular keywords
-        keywords = self._extract_keywords(message.lower())
-        self.popular_queries.update(keywords)
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            # New event loop (or crashed worker): keep whatever is still queued
+            self._drain()
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._worker = loop.create_task(self._run())
+        return self._queue
+    
+    def emit(self, event: Tuple, sampleable: bool = True) -> None:
+        """Push an event onto the bounded queue; samples or drops under pressure"""
+        queue = self._ensure_worker()
+        if queue is None:
+            # No event loop (scripts, shutdown): aggregate inline
+            self._apply_batch([event])
+            return
+        
+        if sampleable and queue.qsize() >= self.sample_threshold:
+            # Keep 1 of every N events and weight it by N so totals stay unbiased
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.events_sampled_out += 1
+                return
+            event = (event[0], event[1] * self.sample_rate) + event[2:]
         
-        # Track response time
-        self.response_times.append(response_time)
-        if len(self.response_times) > 1000:  # Keep last 1000
-            self.response_times = self.response_times[-1000:]
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.events_dropped += 1
+    
+    def record_message(self, query: str, response_time: float, endpoint: str = "chat"):
+        """Record a processed user message (query is the raw user text, not the prompt)"""
+        self.emit((EVENT_MESSAGE, 1, endpoint, query, response_time))
+    
+    def record_latency(self, stage: str, seconds: float, endpoint: str = "chat"):
+        """Record latency of a pipeline stage (retrieval, llm_ttfb, total, ...)"""
+        self.emit((EVENT_LATENCY, 1, endpoint, stage, seconds))
+    
+    def record_cache_lookup(self, cache: str, hit: bool):
+        """Record a cache lookup (cache is e.g. "embeddings" or "llm_response")"""
+        self.emit((EVENT_CACHE, 1, cache, hit))
+    
+    def record_session_created(self):
+        """Record a new session"""
+        self.emit((EVENT_SESSION, 1), sampleable=False)
+    
+    def record_error(self, error_type: str, error_msg: str):
+        """Record an error"""
+        self.emit((EVENT_ERROR, 1, error_type, error_msg), sampleable=False)
+    
+    # Async wrappers kept for existing callers
+    
+    async def track_message(self, session_id: str, message: str, response_time: float, endpoint: str = "chat"):
+        """Track message analytics"""
+        self.record_message(message, response_time, endpoint)
+    
+    async def track_latency(self, stage: str, seconds: float, endpoint: str = "chat"):
+        """Track latency of a pipeline stage (retrieval, llm_ttfb, total, ...)"""
+        self.record_latency(stage, seconds, endpoint)
+    
+    async def track_session_created(self):
+        """Track new session creation"""
+        self.record_session_created()
+    
+    async def track_error(self, error_type: str, error_msg: str):
+        """Track errors"""
+        self.record_error(error_type, error_msg)
+    
+    # ------------------------------------------------------------------
+    # Consumer side: background aggregation in batches
+    # ------------------------------------------------------------------
+    
+    async def _run(self):
+        """Aggregate queued events in batches until cancelled"""
+        queue = self._queue
+        if not self._restored:
+            self._restored = True
+            try:
+                since = datetime.now(timezone.utc) - timedelta(days=self.daily_stats_days)
+                totals = await asyncio.to_thread(self.timeseries.totals, since.timestamp())
+                self._restore(*totals)
+            except Exception as e:
+                logger.error(f"Error restoring analytics totals: {str(e)}")
+        
+        getter: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(queue.get())
+                # Also wakes up without events, so closed minutes are written while idle.
+                # Not wait_for: it loses a cancellation that arrives together with an event
+                done, _ = await asyncio.wait({getter}, timeout=self.persist_interval)
+                if not done:
+                    await self._maybe_persist()
+                    continue
+                batch = [getter.result()]
+                getter = None
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+                
+                try:
+                    self._apply_batch(batch)
+                except Exception as e:
+                    logger.error(f"Error aggregating analytics events: {str(e)}")
+                
+                await self._maybe_persist()
+            
+                if len(batch) < self.batch_size:
+                    # Let events accumulate so aggregation runs in fewer, larger batches
+                    await asyncio.sleep(self.flush_interval)
+        finally:
+            if getter is not None:
+                getter.cancel()
+                if getter.done() and not getter.cancelled():
+                    # Taken off the queue just before the worker was stopped
+                    self._apply_batch([getter.result()])
+    
+    def _apply_batch(self, batch: List[Tuple]):
+        """Fold a batch of events into the aggregates"""
+        now = time.time()
+        today = datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m-%d')
+        if today not in self.daily_stats:
+            self._trim_daily_stats(today)
+        timeseries = self.timeseries
+        for event in batch:
+            kind, weight = event[0], event[1]
+            if kind == EVENT_MESSAGE:
+                _, _, endpoint, query, response_time = event
+                self.message_count += weight
+                self.daily_stats[today] += weight
+                
+                # Track popular keywords
+                for keyword in self._extract_keywords(query.lower()):
+                    self.popular_queries.add(keyword, weight, now)
+                    self.trending_queries.add(keyword, weight, now)
+                
+                # Track response time
+                self.response_time_total += response_time * weight
+                self.response_time_count += weight
+                self.latency.record(endpoint, "total", response_time, count=weight)
+                timeseries.add_message(endpoint, response_time, weight, now)
+            elif kind == EVENT_LATENCY:
+                _, _, endpoint, stage, seconds = event
+                self.latency.record(endpoint, stage, seconds, count=weight)
+            elif kind == EVENT_SESSION:
+                self.session_count += weight
+            elif kind == EVENT_ERROR:
+                _, _, error_type, error_msg = event
+                self.error_count += weight
+                timeseries.add_error(error_type, weight, now)
+                logger.error(f"Analytics tracked error: {error_type} - {error_msg}")
+            elif kind == EVENT_CACHE:
+                _, _, cache, hit = event
+                timeseries.add_cache_lookup(cache, hit, weight, now)
+        self.events_processed += len(batch)
+    
+    def _drain(self):
+        """Aggregate everything currently queued, synchronously"""
+        queue = self._queue
+        if queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        if batch:
+            self._apply_batch(batch)
+    
+    async def flush(self):
+        """Aggregate everything currently queued"""
+        self._drain()
+    
+    async def _maybe_persist(self, force: bool = False):
+        """Write closed minute rollups to the store and compact periodically"""
+        now = time.monotonic()
+        if not force and now - self._last_persist < self.persist_interval:
+            return
+        self._last_persist = now
+        try:
+            rows = self.timeseries.take_pending(include_open=force)
+            try:
+                await asyncio.to_thread(self.timeseries.write, rows)
+            except Exception:
+                # Keep them for the next attempt instead of losing those minutes
+                self.timeseries.requeue(rows)
+                raise
+            if now - self._last_compact >= self.compact_interval:
+                self._last_compact = now
+                await asyncio.to_thread(self.timeseries.compact)
+        except Exception as e:
+            logger.error(f"Error persisting analytics rollups: {str(e)}")
+    
+    def _restore(self, messages: int, errors: int, daily: Dict[str, int]):
+        """Seed in-memory totals from rollups persisted by previous runs"""
+        self.message_count += messages
+        self.error_count += errors
+        for day, count in daily.items():
+            self.daily_stats[day] += count
+    
+    def _trim_daily_stats(self, today: str):
+        """Keep only the last ``daily_stats_days`` days in memory"""
+        cutoff = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=self.daily_stats_days)).strftime('%Y-%m-%d')
+        for day in [day for day in self.daily_stats if day <= cutoff]:
+            del self.daily_stats[day]
+    
+    async def stop(self):
+        """Stop the aggregator after draining and persisting pending events"""
+        self._drain()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._worker = None
+        await self._maybe_persist(force=True)
+    
+    async def query_range(
+        self,
+        start: float,
+        end: float,
+        resolution: Optional[str] = None,
+        series: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Aggregated stats for a time range, answered from the rollups"""
+        self._drain()
+        pending = self.timeseries.snapshot_pending()
+        return await asyncio.to_thread(self.timeseries.query, start, end, resolution, series, pending)
     
     def _extract_keywords(self, message: str) -> List[str]:
         """Extract meaningful keywords from message"""
         # Remove common words
-        stop_words = {'apa', 'bagaimana', 'dimana', 'kapan', 'siapa', 'kenapa', 
+        stop_words = {'apa', 'bagaimana', 'dimana', 'kapan', 'siapa', 'kenapa',
                       'adalah', 'dan', 'atau', 'dengan', 'untuk', 'dari', 'ke',
                       'what', 'how', 'where', 'when', 'who', 'why', 'is', 'are'}
         
@@ -41,15 +328,6 @@ class AnalyticsService:
         keywords = [word for word in words if len(word) > 3 and word not in stop_words]
         return keywords[:5]  # Top 5 keywords
     
-    async def track_session_created(self):
-        """Track new session creation"""
-        self.session_count += 1
-    
-    async def track_error(self, error_type: str, error_msg: str):
-        """Track errors"""
-        self.error_count += 1
-        logger.error(f"Analytics tracked error: {error_type} - {error_msg}")
-    
     async def add_user_feedback(self, session_id: str, rating: int, feedback: str = ""):
         """Add user feedback"""
         self.user_feedback.append({
@@ -65,19 +343,48 @@ class AnalyticsService:
     
     def get_stats(self) -> Dict:
         """Get analytics summary"""
-        avg_response_time = sum(self.response_times) / len(self.response_times) if self.response_times else 0
+        avg_response_time = self.response_time_total / self.response_time_count if self.response_time_count else 0
         
         return {
             "total_messages": self.message_count,
             "total_sessions": self.session_count,
             "daily_stats": dict(self.daily_stats),
-            "popular_queries": dict(self.popular_queries.most_common(10)),
+            "popular_queries": {
+                keyword: round(count) for keyword, count, _ in self.popular_queries.top(10)
+            },
+            "trending_queries": {
+                keyword: round(count, 2) for keyword, count, _ in self.trending_queries.top(10)
+            },
+            "popular_queries_error_bound": round(self.popular_queries.error_bound(), 2),
             "avg_response_time_ms": round(avg_response_time * 1000, 2),
+            "latency": self.latency.summary(),
             "error_count": self.error_count,
             "user_satisfaction": self._calculate_satisfaction(),
-            "uptime": "99.9%"  # Placeholder - implement real uptime tracking
+            "pipeline": {
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "processed": self.events_processed,
+                "sampled_out": self.events_sampled_out,
+                "dropped": self.events_dropped,
+            },
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            "uptime": self._format_uptime(time.time() - self.started_at)
         }
     
+    @staticmethod
+    def _format_uptime(seconds: float) -> str:
+        """Human readable process uptime, e.g. 2d 3h 4m 5s"""
+        seconds = int(seconds)
+        days, seconds = divmod(seconds, 86400)
+        hours, seconds = divmod(seconds, 3600)
+        minutes, seconds = divmod(seconds, 60)
+        parts = [f"{days}d"] if days else []
+        if days or hours:
+            parts.append(f"{hours}h")
+        if days or hours or minutes:
+            parts.append(f"{minutes}m")
+        parts.append(f"{seconds}s")
+        return " ".join(parts)
+    
     def _calculate_satisfaction(self) -> float:
         """Calculate average user satisfaction from feedback"""
         if not self.user_feedback:
@@ -86,5 +393,12 @@ class AnalyticsService:
         total_rating = sum(feedback["rating"] for feedback in self.user_feedback)
         return round(total_rating / len(self.user_feedback), 2)
 
-# Singleton instance
-analytics_service = AnalyticsService()
+_analytics_service: Optional[AnalyticsService] = None
+
+
+def get_analytics_service() -> AnalyticsService:
+    """Shared analytics service, created on first use rather than at import"""
+    global _analytics_service
+    if _analytics_service is None:
+        _analytics_service = AnalyticsService()
+    return _analytics_service
@@ -3,6 +3,17 @@ import json
 import time
 from typing import Optional, Any, Dict
 
+from app.core.metrics import metrics
+
+CACHE_REQUESTS = metrics.counter(
+    "atabot_cache_requests_total", "MemoryCache lookups by result", ["result"]
+)
+CACHE_SETS = metrics.counter("atabot_cache_sets_total", "MemoryCache writes")
+CACHE_ENTRIES = metrics.gauge("atabot_cache_entries", "Entries currently held by MemoryCache")
+_CACHE_HIT = CACHE_REQUESTS.labels("hit")
+_CACHE_MISS = CACHE_REQUESTS.labels("miss")
+_CACHE_EXPIRED = CACHE_REQUESTS.labels("expired")
+
 class MemoryCache:
     def __init__(self, default_ttl: int = 3600):  # 1 hour default
         self.cache: Dict[str, dict] = {}
@@ -20,14 +31,19 @@ class MemoryCache:
             if time.time() < entry['expires_at']:
                 entry['access_count'] += 1
                 entry['last_accessed'] = time.time()
+                _CACHE_HIT.inc()
                 return entry['value']
             else:
                 del self.cache[key]
+                _CACHE_EXPIRED.inc()
+                return None
+        _CACHE_MISS.inc()
         return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache"""
         ttl = ttl or self.default_ttl
+        CACHE_SETS.inc()
         self.cache[key] = {
             'value': value,
             'expires_at': time.time() + ttl,
@@ -58,3 +74,4 @@ class MemoryCache:
 
 # Global cache instance
 cache_service = MemoryCache()
+CACHE_ENTRIES.set_function(lambda: len(cache_service.cache))
@@ -1,70 +1,252 @@
-import json
+import asyncio
+import time
 import uuid
-from typing import Dict, List, Optional, Any, AsyncGenerator
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Dict, List, Optional, Any, AsyncGenerator, Tuple
 from datetime import datetime
 import logging
-import numpy as np
 
 from app.models.chat import ChatMessage, ChatRequest, ChatResponse, BotConfig, CompanyData
+from app.services.knowledge_base import (
+    DATA_PATH, KnowledgeBase, KnowledgeBaseDiff, parse_knowledge_base, read_source
+)
+from app.services.kb_artifact import load_artifact
+from app.services.shared_embeddings import get_shared_embedding_store
 from app.services.enhanced_llm_service import EnhancedLLMService
 from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.analytics_service import get_analytics_service
 from app.core.config import settings
+from app.core.performance_config import performance_settings
+from app.core.deadline import Deadline, DeadlineExceeded
+from app.core.metrics import metrics
+from app.core import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
 
+CHAT_MESSAGES = metrics.counter("atabot_chat_messages_total", "Chat messages processed", ["endpoint"])
+CHAT_STAGE_LATENCY = metrics.histogram(
+    "atabot_chat_stage_duration_seconds", "Chat pipeline stage duration", ["endpoint", "stage"]
+)
+CHAT_STREAM_CHUNKS = metrics.counter("atabot_chat_stream_chunks_total", "Content chunks streamed to clients")
+_MESSAGE_RETRIEVAL = CHAT_STAGE_LATENCY.labels("message", "retrieval")
+_MESSAGE_LLM = CHAT_STAGE_LATENCY.labels("message", "llm")
+_MESSAGE_TOTAL = CHAT_STAGE_LATENCY.labels("message", "total")
+_STREAM_RETRIEVAL = CHAT_STAGE_LATENCY.labels("message_stream", "retrieval")
+_STREAM_TTFB = CHAT_STAGE_LATENCY.labels("message_stream", "llm_ttfb")
+_STREAM_TOTAL = CHAT_STAGE_LATENCY.labels("message_stream", "total")
+_BATCH_RETRIEVAL = CHAT_STAGE_LATENCY.labels("batch", "retrieval")
+_BATCH_LLM = CHAT_STAGE_LATENCY.labels("batch", "llm")
+
 class ChatbotService:
-    def __init__(self):
-        self.llm_service = EnhancedLLMService()
-        self.embedding_service = EnhancedEmbeddingService()
-        self.bot_config: Optional[BotConfig] = None
-        self.company_data: Optional[CompanyData] = None
+    def __init__(
+        self,
+        data_path: str = DATA_PATH,
+        artifact_dir: Optional[str] = None,
+        llm_service: Optional[EnhancedLLMService] = None,
+        embedding_service: Optional[EnhancedEmbeddingService] = None,
+    ):
+        self.data_path = data_path
+        self.artifact_dir = settings.KB_ARTIFACT_DIR if artifact_dir is None else artifact_dir
+        # Tenants share the (stateless) upstream clients and their caches
+        self.llm_service = llm_service or EnhancedLLMService()
+        self.embedding_service = embedding_service or EnhancedEmbeddingService()
         self.sessions: Dict[str, List[ChatMessage]] = {}
-        self.faq_embeddings: Optional[np.ndarray] = None
+        self.shared_embeddings = get_shared_embedding_store()
+        self._reload_lock = asyncio.Lock()
         
-        # Load configuration and data
-        self._load_data()
-        
-    def _load_data(self):
-        """Load bot configuration and company data from JSON file"""
+        # Placeholder until load(); nothing is read at construction (module import time)
+        self.kb: KnowledgeBase = KnowledgeBase.default()
+        self.loaded = False
+    
+    # Views of the current snapshot; request handlers take self.kb once instead
+    @property
+    def bot_config(self) -> BotConfig:
+        return self.kb.bot_config
+    
+    @property
+    def company_data(self) -> CompanyData:
+        return self.kb.company_data
+    
+    @property
+    def faq_embeddings(self) -> Optional["np.ndarray"]:
+        return self.kb.faq_embeddings
+    
+    async def load(self) -> KnowledgeBase:
+        """Load the knowledge base (artifact or data.json) in a thread; embeddings come from initialize_embeddings"""
+        async with self._reload_lock:
+            self.kb = await asyncio.to_thread(self._load_data)
+            self.loaded = True
+        return self.kb
+    
+    def _load_data(self) -> KnowledgeBase:
+        """
+        Load bot configuration and company data, from the compiled artifact
+        when it matches data.json, else from the JSON file itself
+        """
+        start_time = time.perf_counter()
         try:
-            with open("data.json", "r", encoding="utf-8") as f:
-                data = json.load(f)
-                
-            self.bot_config = BotConfig(**data.get("bot_config", {}))
-            self.company_data = CompanyData(**data.get("company_data", {}))
-            
-            logger.info("Data loaded successfully")
-            
+            raw, source_hash = read_source(self.data_path)
+            kb = self._load_artifact(source_hash)
+            if kb is None:
+                kb = parse_knowledge_base(raw, source_hash)
+                source = self.data_path
+            else:
+                source = self.artifact_dir
+            logger.info(f"Data loaded successfully from {source} in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+            return kb
         except FileNotFoundError:
-            logger.error("data.json not found")
+            logger.error(f"{self.data_path} not found")
             # Use default configurations
-            self.bot_config = BotConfig()
-            self.company_data = CompanyData(
-                company_name="Company",
-                description="Welcome to our service",
-                services=[],
-                faq=[],
-                contacts={}
-            )
+            return KnowledgeBase.default()
         except Exception as e:
             logger.error(f"Error loading data: {str(e)}")
+            return KnowledgeBase.default()
+    
+    def _load_artifact(self, source_hash: str) -> Optional[KnowledgeBase]:
+        embedding_model = self.embedding_service.model if self.embedding_service.use_embeddings else None
+        try:
+            return load_artifact(self.artifact_dir, source_hash, embedding_model)
+        except Exception as e:
+            logger.error(f"Error loading knowledge base artifact: {str(e)}")
+            return None
+    
+    async def reload(self) -> KnowledgeBase:
+        """
+        Build a new knowledge base snapshot from data.json and swap it in.
+        
+        Parsing runs in a thread and embeddings are computed before the swap,
+        so requests keep being served from the old snapshot until the new one
+        is complete; requests already running finish on the old one. Raises
+        (and keeps the current snapshot) if data.json is missing or invalid.
+        
+        Only what changed is rebuilt: an identical file is skipped, unchanged
+        sections are shared with the current snapshot and only new or edited
+        FAQ rows are embedded.
+        """
+        async with self._reload_lock:
+            start_time = time.perf_counter()
+            current = self.kb
+            raw, source_hash = await asyncio.to_thread(read_source, self.data_path)
+            if source_hash == current.source_hash and not self._needs_embeddings(current):
+                logger.info("Knowledge base unchanged, reload skipped")
+                return current
+            
+            kb = await asyncio.to_thread(parse_knowledge_base, raw, source_hash, current)
+            kb, embedded = await self._embed(kb)
+            self.kb = kb
+            
+            diff = KnowledgeBaseDiff(current, kb)
+            logger.info(
+                f"Knowledge base v{kb.version} loaded in {(time.perf_counter() - start_time) * 1000:.1f} ms: "
+                f"{diff.summary()} ({diff.size} changes, {embedded} FAQ rows embedded)"
+            )
+            return kb
+    
+    def _needs_embeddings(self, kb: KnowledgeBase) -> bool:
+        if not self.embedding_service.use_embeddings or not kb.faq_texts:
+            return False
+        # Rows left as zeros by a failed embedding call are retried too
+        return kb.faq_embeddings is None or not kb.faq_embeddings.any(axis=1).all()
+    
+    async def _embed(self, kb: KnowledgeBase) -> Tuple[KnowledgeBase, int]:
+        """
+        Snapshot with FAQ embeddings, and how many rows had to be embedded.
+        
+        With KB_SHARED_EMBEDDINGS_DIR, the embeddings are mapped from the
+        segment another worker published for the same FAQ, or computed and
+        published for the others.
+        """
+        if not self.embedding_service.use_embeddings or not kb.faq_texts or kb.faq_embeddings is not None:
+            return kb, 0
+        store = self.shared_embeddings
+        if store is None:
+            return await self._compute_embeddings(kb)
+        
+        key = store.key(self.embedding_service.model, kb.faq_texts)
+        shared = await store.attach(key)
+        if shared is None:
+            async with store.publishing(key):
+                # Another worker may have published it while this one waited
+                shared = await store.attach(key)
+                if shared is None:
+                    kb, embedded = await self._compute_embeddings(kb)
+                    if kb.faq_embeddings is None or not kb.faq_embeddings.any(axis=1).all():
+                        # Other workers would map the rows that failed to embed too
+                        return kb, embedded
+                    shared = await store.publish(key, kb.faq_embeddings, kb.faq_unit_embeddings)
+                    if shared is None:
+                        return kb, embedded
+                    return kb.with_mapped_embeddings(*shared), embedded
+        return kb.with_mapped_embeddings(*shared), 0
+    
+    async def _compute_embeddings(self, kb: KnowledgeBase) -> Tuple[KnowledgeBase, int]:
+        """
+        Rows whose text is already embedded in the current snapshot are
+        reused; only new or edited FAQ items go to the embedding API. If
+        that call fails, their rows are left as zeros, which the vector
+        search never matches, and the next reload embeds them again.
+        """
+        current = self.kb
+        known: Dict[str, int] = {}
+        if current.faq_embeddings is not None:
+            embedded_rows = current.faq_embeddings.any(axis=1)
+            known = {text: i for i, text in enumerate(current.faq_texts) if embedded_rows[i]}
+        missing = list(dict.fromkeys(text for text in kb.faq_texts if text not in known))
+        if not missing:
+            rows = [known[text] for text in kb.faq_texts]
+            return kb.with_embeddings(current.faq_embeddings[rows]), 0
+        
+        embeddings = await self.embedding_service.get_embeddings(missing)
+        embedded = len(missing)
+        
+        import numpy as np
+        
+        if embeddings is None:
+            if not known:
+                return kb, 0
+            logger.warning(f"Embedding {len(missing)} FAQ items failed, keeping the embeddings of the others")
+            embeddings = np.zeros((len(missing), current.faq_embeddings.shape[1]), dtype=np.float32)
+            embedded = 0
+        elif known and embeddings.shape[1] != current.faq_embeddings.shape[1]:
+            # Embedding model changed: old rows cannot be mixed with new ones
+            embeddings = await self.embedding_service.get_embeddings(list(kb.faq_texts))
+            return kb.with_embeddings(embeddings), len(kb.faq_texts)
+        
+        fresh = dict(zip(missing, embeddings))
+        matrix = np.stack([
+            fresh[text] if text in fresh else current.faq_embeddings[known[text]]
+            for text in kb.faq_texts
+        ])
+        return kb.with_embeddings(matrix), embedded
+    
+    def _discard_turn(self, session_id: str, user_message: ChatMessage) -> None:
+        """Remove a user turn that got no answer from the session history"""
+        history = self.sessions.get(session_id, [])
+        for i in range(len(history) - 1, -1, -1):
+            if history[i] is user_message:
+                del history[i]
+                return
     
     def create_session(self, session_id: str) -> str:
         """Create a new session"""
         if session_id not in self.sessions:
             self.sessions[session_id] = []
+            get_analytics_service().record_session_created()
         return session_id
-            
+    
     async def initialize_embeddings(self):
         """Initialize FAQ embeddings for similarity search"""
-        if not self.embedding_service.use_embeddings or not self.company_data.faq:
-            return
-            
-        faq_texts = [f"{item['question']} {item['answer']}" for item in self.company_data.faq]
-        self.faq_embeddings = await self.embedding_service.get_embeddings(faq_texts)
-        
-    async def process_message(self, request: ChatRequest) -> ChatResponse:
+        async with self._reload_lock:
+            self.kb, _ = await self._embed(self.kb)
+    
+    async def process_message(self, request: ChatRequest, deadline: Optional[Deadline] = None) -> ChatResponse:
         """Process incoming chat message"""
+        start_time = time.perf_counter()
+        kb = self.kb  # One snapshot for the whole request, even if a reload swaps it
+        
         # Use provided session_id or generate new one
         session_id = request.session_id
         if not session_id:
@@ -73,20 +255,33 @@ class ChatbotService:
         # Get or create session context
         if session_id not in self.sessions:
             self.sessions[session_id] = []
+            get_analytics_service().record_session_created()
         
         # Add user message to context
         user_message = ChatMessage(role="user", content=request.message)
         self.sessions[session_id].append(user_message)
         
-        # Find relevant information
-        relevant_info = await self._find_relevant_info(request.message)
-        
-        # Generate response
-        response_text = await self._generate_response(
-            request.message,
-            relevant_info,
-            self.sessions[session_id]
-        )
+        try:
+            # Find relevant information
+            relevant_info = await self._find_relevant_info(request.message, kb)
+            retrieval_done = time.perf_counter()
+            _MESSAGE_RETRIEVAL.observe(retrieval_done - start_time)
+            get_analytics_service().record_latency("retrieval", retrieval_done - start_time, endpoint="message")
+            
+            # Generate response
+            response_text = await self._generate_response(
+                request.message,
+                relevant_info,
+                self.sessions[session_id],
+                kb,
+                deadline
+            )
+        except BaseException:
+            self._discard_turn(session_id, user_message)
+            raise
+        llm_done = time.perf_counter()
+        _MESSAGE_LLM.observe(llm_done - retrieval_done)
+        get_analytics_service().record_latency("llm", llm_done - retrieval_done, endpoint="message")
         
         # Add assistant response to context
         assistant_message = ChatMessage(role="assistant", content=response_text)
@@ -96,14 +291,26 @@ class ChatbotService:
         if len(self.sessions[session_id]) > settings.MAX_CONTEXT_LENGTH * 2:
             self.sessions[session_id] = self.sessions[session_id][-settings.MAX_CONTEXT_LENGTH * 2:]
         
+        total_time = time.perf_counter() - start_time
+        _MESSAGE_TOTAL.observe(total_time)
+        CHAT_MESSAGES.labels("message").inc()
+        get_analytics_service().record_message(request.message, total_time, endpoint="message")
+        
         return ChatResponse(
             response=response_text,
             session_id=session_id,
             timestamp=datetime.now()
         )
     
-    async def process_message_stream(self, request: ChatRequest) -> AsyncGenerator[Dict[str, Any], None]:
+    async def process_message_stream(
+        self,
+        request: ChatRequest,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         """Process incoming chat message with streaming response"""
+        start_time = time.perf_counter()
+        kb = self.kb  # One snapshot for the whole request, even if a reload swaps it
+        
         # Use provided session_id or generate new one
         session_id = request.session_id
         if not session_id:
@@ -112,6 +319,7 @@ class ChatbotService:
         # Get or create session context
         if session_id not in self.sessions:
             self.sessions[session_id] = []
+            get_analytics_service().record_session_created()
         
         # Yield session_id first
         yield {"type": "session", "session_id": session_id}
@@ -120,22 +328,41 @@ class ChatbotService:
         user_message = ChatMessage(role="user", content=request.message)
         self.sessions[session_id].append(user_message)
         
-        # Find relevant information
-        relevant_info = await self._find_relevant_info(request.message)
-        
-        # Build prompt
-        prompt = self._build_prompt(request.message, relevant_info)
-        
-        # Generate response with streaming
-        full_response = ""
-        async for chunk in self.llm_service.generate_response_stream(
-            prompt=prompt,
-            context=self.sessions[session_id][:-1],  # Exclude the current message
-            temperature=self.bot_config.temperature,
-            max_tokens=self.bot_config.max_response_length
-        ):
-            full_response += chunk
-            yield {"type": "content", "content": chunk, "session_id": session_id}
+        try:
+            # Find relevant information
+            relevant_info = await self._find_relevant_info(request.message, kb)
+            retrieval_done = time.perf_counter()
+            _STREAM_RETRIEVAL.observe(retrieval_done - start_time)
+            get_analytics_service().record_latency("retrieval", retrieval_done - start_time, endpoint="message_stream")
+            
+            # Build prompt
+            prompt = self._build_prompt(request.message, relevant_info, kb)
+            
+            # Generate response with streaming
+            full_response = ""
+            first_token = True
+            # aclosing: if this generator is closed (client gone), close the upstream stream right away
+            async with aclosing(self.llm_service.generate_response_stream(
+                prompt=prompt,
+                context=self.sessions[session_id][:-1],  # Exclude the current message
+                temperature=kb.bot_config.temperature,
+                max_tokens=kb.bot_config.max_response_length,
+                deadline=deadline
+            )) as stream:
+                async for chunk in stream:
+                    if first_token:
+                        first_token = False
+                        ttfb = time.perf_counter() - retrieval_done
+                        _STREAM_TTFB.observe(ttfb)
+                        get_analytics_service().record_latency("llm_ttfb", ttfb, endpoint="message_stream")
+                    CHAT_STREAM_CHUNKS.inc()
+                    full_response += chunk
+                    yield {"type": "content", "content": chunk, "session_id": session_id}
+            
+        except BaseException:
+            # Deadline, upstream error or client gone: no answer, so no dangling user turn
+            self._discard_turn(session_id, user_message)
+            raise
         
         # Add assistant response to context
         assistant_message = ChatMessage(role="assistant", content=full_response)
@@ -145,113 +372,233 @@ class ChatbotService:
         if len(self.sessions[session_id]) > settings.MAX_CONTEXT_LENGTH * 2:
             self.sessions[session_id] = self.sessions[session_id][-settings.MAX_CONTEXT_LENGTH * 2:]
         
+        total_time = time.perf_counter() - start_time
+        _STREAM_TOTAL.observe(total_time)
+        CHAT_MESSAGES.labels("message_stream").inc()
+        get_analytics_service().record_message(request.message, total_time, endpoint="message_stream")
+        
         # Yield completion signal
         yield {"type": "done", "done": True, "session_id": session_id}
     
-    async def _find_relevant_info(self, query: str) -> Dict[str, Any]:
+    async def process_batch(
+        self,
+        requests: List[ChatRequest],
+        concurrency: int
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Answer many independent messages, yielding each result as soon as it
+        is ready (completion order, not input order).
+        
+        Retrieval runs once for the whole batch (one embedding call, one
+        similarity matrix), then up to ``concurrency`` LLM calls run at a
+        time, each with its own CHAT_DEADLINE. Batch messages are stateless:
+        they neither read nor extend chat sessions; ``request.context`` is
+        the conversation history. Results are ``{"index", "session_id",
+        "response", "latency_ms"}`` or ``{"index", "session_id", "error"}``.
+        """
+        start_time = time.perf_counter()
+        kb = self.kb  # One snapshot for the whole batch
+        queries = [request.message for request in requests]
+        relevant = await self._find_relevant_info_batch(queries, kb)
+        _BATCH_RETRIEVAL.observe(time.perf_counter() - start_time)
+        
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(range(len(requests)))
+        
+        async def worker() -> None:
+            # Workers share one iterator, so each message is taken exactly once
+            for index in pending:
+                request = requests[index]
+                result: Dict[str, Any] = {"index": index, "session_id": request.session_id}
+                item_start = time.perf_counter()
+                try:
+                    response = await self.llm_service.generate_response(
+                        prompt=self._build_prompt(request.message, relevant[index], kb),
+                        context=request.context or [],
+                        temperature=kb.bot_config.temperature,
+                        max_tokens=kb.bot_config.max_response_length,
+                        deadline=Deadline(performance_settings.CHAT_DEADLINE)
+                    )
+                    latency = time.perf_counter() - item_start
+                    _BATCH_LLM.observe(latency)
+                    CHAT_MESSAGES.labels("batch").inc()
+                    get_analytics_service().record_message(request.message, latency, endpoint="batch")
+                    result["response"] = response
+                    result["latency_ms"] = round(latency * 1000, 1)
+                except DeadlineExceeded:
+                    result["error"] = "Request deadline exceeded"
+                except Exception as e:
+                    logger.error(f"Batch message {index} failed: {str(e)}")
+                    # Same generic message as the streaming routes; details stay in the log
+                    result["error"] = "Maaf, terjadi kesalahan. Silakan coba lagi."
+                await results.put(result)
+        
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(requests)))]
+        try:
+            for _ in range(len(requests)):
+                yield await results.get()
+        finally:
+            # Closed early (client gone): stop the LLM calls still running
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    async def _find_relevant_info(self, query: str, kb: KnowledgeBase) -> Dict[str, Any]:
         """Find relevant information from company data"""
-        relevant_info = {
-            "company_info": self._extract_company_info(query),
-            "services": self._find_relevant_services(query),
-            "faq": await self._find_similar_faq(query),
-            "contacts": self._should_include_contacts(query)
-        }
+        with tracing.span("retrieval") as span:
+            span.set("kb_version", kb.version)
+            relevant_info = {
+                "company_info": self._extract_company_info(query, kb),
+                "services": self._find_relevant_services(query, kb),
+                "faq": await self._find_similar_faq(query, kb),
+                "contacts": self._should_include_contacts(query, kb)
+            }
+            span.set("services", len(relevant_info["services"]))
+            span.set("faq", len(relevant_info["faq"]))
         
         return relevant_info
     
-    def _extract_company_info(self, query: str) -> Optional[str]:
+    async def _find_relevant_info_batch(self, queries: List[str], kb: KnowledgeBase) -> List[Dict[str, Any]]:
+        """
+        ``_find_relevant_info`` for many queries, with one embedding call for
+        all of them. Matching runs in a worker thread: for a large batch on a
+        large knowledge base it takes seconds, which would stall every other
+        request on the event loop.
+        """
+        with tracing.span("retrieval") as span:
+            span.set("kb_version", kb.version)
+            span.set("queries", len(queries))
+            query_embeddings = None
+            if self.embedding_service.use_embeddings and kb.faq_unit_embeddings is not None:
+                # Not cached: a bulk lookup is unlikely to repeat as a whole
+                query_embeddings = await self.embedding_service.get_embeddings(queries, cache=False)
+            return await asyncio.to_thread(self._match_batch, queries, kb, query_embeddings)
+            
+    def _match_batch(
+        self, queries: List[str], kb: KnowledgeBase, query_embeddings: Optional["np.ndarray"]
+    ) -> List[Dict[str, Any]]:
+        """Retrieval for each query of a batch; blocking, only reads the immutable snapshot"""
+        if query_embeddings is not None:
+            faq = [self._top_faq(row, kb) for row in kb.faq_similarities_batch(query_embeddings)]
+        else:
+            faq = [self._keyword_faq(query, kb) for query in queries]
+        
+        return [
+            {
+                "company_info": self._extract_company_info(query, kb),
+                "services": self._find_relevant_services(query, kb),
+                "faq": faq[i],
+                "contacts": self._should_include_contacts(query, kb)
+            }
+            for i, query in enumerate(queries)
+        ]
+    
+    def _extract_company_info(self, query: str, kb: KnowledgeBase) -> Optional[str]:
         """Extract relevant company information based on query"""
         query_lower = query.lower()
         
         company_keywords = ["perusahaan", "company", "tentang", "about", "apa itu", "what is"]
         if any(keyword in query_lower for keyword in company_keywords):
-            return self.company_data.description
-            
+            return kb.company_data.description
+        
         return None
     
-    def _find_relevant_services(self, query: str) -> List[Dict]:
+    def _find_relevant_services(self, query: str, kb: KnowledgeBase) -> List[Dict]:
         """Find services mentioned in the query"""
         query_lower = query.lower()
         relevant_services = []
         
-        for service in self.company_data.services:
-            service_name = service.get("name", "").lower()
-            service_desc = service.get("description", "").lower()
-            
+        for service_name, service_desc, service in kb.services:
             if service_name in query_lower or any(word in service_desc for word in query_lower.split()):
                 relevant_services.append(service)
-                
+        
         return relevant_services
     
-    async def _find_similar_faq(self, query: str) -> List[Dict]:
+    async def _find_similar_faq(self, query: str, kb: KnowledgeBase) -> List[Dict]:
         """Find similar FAQ items using embeddings or keyword matching"""
-        if self.embedding_service.use_embeddings and self.faq_embeddings is not None:
+        if self.embedding_service.use_embeddings and kb.faq_unit_embeddings is not None:
             # Use embeddings for similarity
             query_embedding = await self.embedding_service.get_embeddings([query])
             if query_embedding is not None:
-                similarities = []
-                for i, faq_emb in enumerate(self.faq_embeddings):
-                    sim = self.embedding_service.calculate_similarity(query_embedding[0], faq_emb)
-                    if sim > settings.SIMILARITY_THRESHOLD:
-                        similarities.append((i, sim))
-                
-                # Sort by similarity and get top 3
-                similarities.sort(key=lambda x: x[1], reverse=True)
-                return [self.company_data.faq[i] for i, _ in similarities[:3]]
+                return self._top_faq(kb.faq_similarities(query_embedding[0]), kb)
         
         # Fallback to keyword matching
-        query_lower = query.lower()
+        return self._keyword_faq(query, kb)
+    
+    def _top_faq(self, similarities: "np.ndarray", kb: KnowledgeBase) -> List[Dict]:
+        """The 3 most similar FAQ items above the similarity threshold"""
+        import numpy as np
+        
+        matches = np.flatnonzero(similarities > settings.SIMILARITY_THRESHOLD)
+        
+        # Sort by similarity and get top 3
+        top = matches[np.argsort(-similarities[matches], kind="stable")][:3]
+        return [kb.company_data.faq[i] for i in top]
+    
+    def _keyword_faq(self, query: str, kb: KnowledgeBase) -> List[Dict]:
+        """FAQ items whose question contains a word of the query"""
+        words = query.lower().split()
         relevant_faq = []
         
-        for faq_item in self.company_data.faq:
-            question_lower = faq_item["question"].lower()
-            if any(word in question_lower for word in query_lower.split()):
+        for faq_item, question_lower in zip(kb.company_data.faq, kb.faq_questions):
+            if any(word in question_lower for word in words):
                 relevant_faq.append(faq_item)
-                
+        
         return relevant_faq[:3]
     
-    def _should_include_contacts(self, query: str) -> Optional[Dict]:
+    def _should_include_contacts(self, query: str, kb: KnowledgeBase) -> Optional[Dict]:
         """Check if contact information should be included"""
         contact_keywords = ["kontak", "contact", "hubungi", "telp", "phone", "email", "alamat", "address"]
         query_lower = query.lower()
         
         if any(keyword in query_lower for keyword in contact_keywords):
-            return self.company_data.contacts
-            
+            return kb.company_data.contacts
+        
         return None
     
     async def _generate_response(
         self,
         query: str,
         relevant_info: Dict[str, Any],
-        context: List[ChatMessage]
+        context: List[ChatMessage],
+        kb: KnowledgeBase,
+        deadline: Optional[Deadline] = None
     ) -> str:
         """Generate response using LLM with relevant information"""
         # Build prompt
-        prompt = self._build_prompt(query, relevant_info)
+        prompt = self._build_prompt(query, relevant_info, kb)
         
         # Generate response
         response = await self.llm_service.generate_response(
             prompt=prompt,
             context=context[:-1],  # Exclude the current message
-            temperature=self.bot_config.temperature,
-            max_tokens=self.bot_config.max_response_length
+            temperature=kb.bot_config.temperature,
+            max_tokens=kb.bot_config.max_response_length,
+            deadline=deadline
         )
         
         return response
     
-    def _build_prompt(self, query: str, relevant_info: Dict[str, Any]) -> str:
+    def _build_prompt(self, query: str, relevant_info: Dict[str, Any], kb: KnowledgeBase) -> str:
         """Build prompt for LLM"""
+        with tracing.span("prompt") as span:
+            prompt = self._render_prompt(query, relevant_info, kb)
+            span.set("chars", len(prompt))
+        return prompt
+    
+    def _render_prompt(self, query: str, relevant_info: Dict[str, Any], kb: KnowledgeBase) -> str:
+        """Render the prompt text"""
+        bot_config = kb.bot_config
         prompt_parts = [
-            f"You are {self.bot_config.name}, a {self.bot_config.personality} assistant for {self.company_data.company_name}.",
-            f"Please respond in {self.bot_config.language}.",
+            f"You are {bot_config.name}, a {bot_config.personality} assistant for {kb.company_data.company_name}.",
+            f"Please respond in {bot_config.language}.",
             ""
         ]
         
         # Add rules
-        if self.bot_config.rules:
+        if bot_config.rules:
             prompt_parts.append("Follow these rules:")
-            for rule in self.bot_config.rules:
+            for rule in bot_config.rules:
                 prompt_parts.append(f"- {rule}")
             prompt_parts.append("")
         
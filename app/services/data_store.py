@@ -0,0 +1,224 @@
+import asyncio
+import errno
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.services.knowledge_base import DATA_PATH
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+OBJECTS_DIR = "objects"
+LEGACY_PREFIX = "data_backup_"
+
+
+def atomic_write(path: str, content: bytes) -> None:
+    """
+    Replace ``path`` with ``content`` so readers see either the old or the
+    new file, never a partial one (temp file in the same directory, fsync,
+    rename). The file mode of an existing ``path`` is kept.
+    
+    A ``path`` that is itself a mount point, like a single-file Docker bind
+    mount, cannot be renamed over; it is rewritten in place instead, which
+    is durable but not atomic.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, os.stat(path).st_mode)
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if e.errno not in (errno.EBUSY, errno.EXDEV):
+                raise
+            logger.warning(f"Cannot replace {path} ({os.strerror(e.errno)}), rewriting it in place")
+            with open(path, "r+b") as f:
+                f.write(content)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            os.unlink(tmp_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class BackupStore:
+    """
+    Compressed, deduplicated backups of data.json with retention.
+    
+    Backup contents are stored gzipped under ``objects/<sha256>.json.gz``,
+    so identical versions share one file. ``manifest.json`` indexes every
+    backup (newest first) and is kept in memory, so listing never touches
+    the backup files. Backups beyond ``max_count`` or older than
+    ``max_age_days`` are dropped, and objects no backup refers to are
+    deleted. All methods are blocking; call them from a thread.
+    """
+    
+    def __init__(self, directory: str, max_count: int = 50, max_age_days: float = 30):
+        self.directory = directory
+        self.max_count = max_count
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._entries: Optional[List[Dict[str, Any]]] = None
+    
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_NAME)
+    
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, OBJECTS_DIR, f"{sha256}.json.gz")
+    
+    def _load(self) -> List[Dict[str, Any]]:
+        if self._entries is None:
+            os.makedirs(os.path.join(self.directory, OBJECTS_DIR), exist_ok=True)
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)["backups"]
+            except FileNotFoundError:
+                self._entries = []
+                self._import_legacy()
+                self._save()
+        return self._entries
+    
+    def _save(self) -> None:
+        manifest = {"version": 1, "backups": self._entries}
+        atomic_write(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+    
+    def _import_legacy(self) -> None:
+        """One-time import of the old uncompressed data_backup_*.json files, which are left in place"""
+        legacy = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(LEGACY_PREFIX) and name.endswith(".json")
+        )
+        for name in legacy:
+            path = os.path.join(self.directory, name)
+            with open(path, "rb") as f:
+                content = f.read()
+            self._add(content, created=os.stat(path).st_mtime, backup_id=name[len(LEGACY_PREFIX):-len(".json")])
+        if legacy:
+            logger.info(
+                f"Imported {len(legacy)} legacy backups into {self.manifest_path}; "
+                f"the original files are kept and can be deleted once no longer needed"
+            )
+    
+    def _add(self, content: bytes, created: float, backup_id: str) -> Dict[str, Any]:
+        sha256 = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(sha256)
+        if not os.path.exists(object_path):
+            atomic_write(object_path, gzip.compress(content, mtime=0))
+        entry = {
+            "id": backup_id,
+            "filename": os.path.relpath(object_path, self.directory),
+            "created": datetime.fromtimestamp(created).isoformat(),
+            "sha256": sha256,
+            "size": len(content),
+            "compressed_size": os.path.getsize(object_path),
+        }
+        self._entries.insert(0, entry)
+        return entry
+    
+    def create(self, content: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Back up ``content``; returns the new manifest entry, or None when it
+        is identical to the newest backup.
+        """
+        with self._lock:
+            entries = self._load()
+            if entries and entries[0]["sha256"] == hashlib.sha256(content).hexdigest():
+                return None
+            now = time.time()
+            entry = self._add(content, created=now, backup_id=datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S_%f"))
+            self._prune(now)
+            self._save()
+            return entry
+    
+    def _prune(self, now: float) -> None:
+        keep, dropped = [], []
+        for i, entry in enumerate(self._entries):
+            age = now - datetime.fromisoformat(entry["created"]).timestamp()
+            (keep if i < self.max_count and age <= self.max_age else dropped).append(entry)
+        if not dropped:
+            return
+        referenced = {entry["sha256"] for entry in keep}
+        for sha256 in {entry["sha256"] for entry in dropped} - referenced:
+            try:
+                os.unlink(self._object_path(sha256))
+            except FileNotFoundError:
+                pass
+        self._entries = keep
+    
+    def list(self) -> List[Dict[str, Any]]:
+        """Manifest entries, newest first"""
+        with self._lock:
+            return list(self._load())
+
+
+class DataStore:
+    """
+    Reads and writes of data.json for the admin API, kept off the event loop.
+    
+    Writes are serialized, back up the current file first and replace
+    data.json atomically, so concurrent readers (and reloads) never see a
+    half-written file.
+    """
+    
+    def __init__(self, path: str, backups: BackupStore):
+        self.path = path
+        self.backups = backups
+        self._write_lock = asyncio.Lock()
+    
+    def _read(self) -> Dict[str, Any]:
+        with open(self.path, "rb") as f:
+            return json.loads(f.read())
+    
+    def _write(self, data: Dict[str, Any]) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                self.backups.create(f.read())
+        except FileNotFoundError:
+            pass
+        atomic_write(self.path, json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8"))
+    
+    async def read(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._read)
+    
+    async def write(self, data: Dict[str, Any]) -> None:
+        """Back up the current data.json, then replace it with ``data``"""
+        async with self._write_lock:
+            await asyncio.to_thread(self._write, data)
+    
+    async def update_section(self, key: str, value: Any) -> None:
+        """Replace one top-level section (read-modify-write under the write lock)"""
+        async with self._write_lock:
+            data = await asyncio.to_thread(self._read)
+            data[key] = value
+            await asyncio.to_thread(self._write, data)
+    
+    async def list_backups(self) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.backups.list)
+
+
+data_store = DataStore(
+    DATA_PATH,
+    BackupStore(settings.BACKUP_DIR, settings.BACKUP_MAX_COUNT, settings.BACKUP_MAX_AGE_DAYS),
+)
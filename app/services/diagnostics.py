@@ -0,0 +1,294 @@
+"""
+On-demand diagnostics of a live worker: a sampling CPU profile of the event
+loop thread, tracemalloc snapshots diffed against a baseline, and estimated
+sizes of in-process structures.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from itertools import islice
+from types import CodeType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.performance_config import performance_settings
+
+logger = logging.getLogger(__name__)
+
+# Allocation groupings accepted by MemoryTracer.report
+GROUP_BY = ("lineno", "filename", "traceback")
+
+
+class ProfilerBusy(Exception):
+    """Another CPU profile is already running"""
+
+
+def _short_path(filename: str) -> str:
+    """Path relative to the working directory or site-packages, to keep stack labels readable"""
+    cwd = os.getcwd() + os.sep
+    if filename.startswith(cwd):
+        return filename[len(cwd):]
+    for marker in ("site-packages" + os.sep, "lib" + os.sep):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    return filename
+
+
+class CpuProfile:
+    """Stacks of the event loop thread, root first, with the number of samples of each"""
+    
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = 0
+        # Samples where the loop was waiting in the selector for I/O or timers
+        self.idle = 0
+        self.stacks: Counter = Counter()
+    
+    def add(self, stack: Tuple[str, ...], idle: bool) -> None:
+        self.stacks[stack] += 1
+        self.samples += 1
+        self.idle += idle
+    
+    def folded(self) -> str:
+        """Collapsed stacks, one ``root;...;leaf count`` line each (flamegraph.pl, speedscope)"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+    
+    def summary(self, limit: int = 30) -> Dict[str, Any]:
+        """Sample counts and the functions with the most samples, on their own and including callees"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            # Recursive functions count once per sample
+            for frame in set(stack):
+                total[frame] += count
+        
+        def top(counter: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"frame": frame, "samples": count, "percent": round(100 * count / self.samples, 1)}
+                for frame, count in counter.most_common(limit)
+            ]
+        
+        return {
+            "started_at": self.started_at,
+            "duration_s": round(self.duration, 3),
+            "interval_s": self.interval,
+            "samples": self.samples,
+            "busy_percent": round(100 * (self.samples - self.idle) / self.samples, 1) if self.samples else None,
+            "top_self": top(own),
+            "top_total": top(total),
+        }
+
+
+def _sample(thread_id: int, duration: float, interval: float, stop: threading.Event) -> CpuProfile:
+    """Sample the stack of ``thread_id`` every ``interval`` seconds (runs in a worker thread)"""
+    profile = CpuProfile(interval)
+    labels: Dict[CodeType, str] = {}
+    start = time.monotonic()
+    deadline = start + duration
+    while not stop.is_set() and time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        idle = frame.f_code.co_filename.endswith("selectors.py")
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            stack.append(label)
+            frame = frame.f_back
+        stack.reverse()
+        profile.add(tuple(stack), idle)
+        stop.wait(interval)
+    profile.duration = time.monotonic() - start
+    return profile
+
+
+class CpuProfiler:
+    """
+    Time-boxed sampling profiler of the event loop. A worker thread reads the
+    loop thread's stack at a fixed interval, so the loop keeps serving and
+    nothing is instrumented; the cost is one stack walk per sample. Samples
+    land when the sampler gets the GIL, so code that holds it for long
+    stretches is somewhat under-counted.
+    """
+    
+    def __init__(self, max_seconds: float, interval: float):
+        self.max_seconds = max_seconds
+        self.interval = interval
+        self._stop: Optional[threading.Event] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._stop is not None
+    
+    async def profile(self, seconds: float) -> CpuProfile:
+        """Profile the running loop for ``seconds`` (capped at max_seconds); one profile at a time"""
+        if self._stop is not None:
+            raise ProfilerBusy()
+        seconds = min(max(seconds, self.interval), self.max_seconds)
+        self._stop = stop = threading.Event()
+        try:
+            profile = await asyncio.to_thread(_sample, threading.get_ident(), seconds, self.interval, stop)
+        finally:
+            # Also ends the sampler thread when the request is cancelled
+            stop.set()
+            self._stop = None
+        logger.info(f"CPU profile: {profile.samples} samples in {profile.duration:.1f} s")
+        return profile
+
+
+def _statistic(stat: Any) -> Dict[str, Any]:
+    # Tracebacks run from the oldest frame to the allocating one
+    site = stat.traceback[-1]
+    entry = {
+        "location": f"{_short_path(site.filename)}:{site.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if len(stat.traceback) > 1:
+        entry["traceback"] = [f"{_short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+    return entry
+
+
+class MemoryTracer:
+    """
+    tracemalloc tracing started on demand, with a baseline snapshot that later
+    snapshots are diffed against. Tracing slows allocations down and costs
+    memory of its own, so it only runs between start() and stop().
+    """
+    
+    def __init__(self, frames: int):
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+    
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+    
+    def status(self) -> Dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            return {"tracing": False}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "baseline_at": self.baseline_at,
+        }
+    
+    async def start(self) -> Dict[str, Any]:
+        """Start tracing (if needed) and take a new baseline"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.info(f"tracemalloc started ({self.frames} frames)")
+        self.baseline = await asyncio.to_thread(self._snapshot)
+        self.baseline_at = time.time()
+        return self.status()
+    
+    def stop(self) -> Dict[str, Any]:
+        """Stop tracing and free the traces and the baseline"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+        self.baseline = None
+        self.baseline_at = None
+        return self.status()
+    
+    def _report(self, limit: int, group_by: str) -> Dict[str, Any]:
+        snapshot = self._snapshot()
+        report: Dict[str, Any] = {
+            "top": [_statistic(stat) for stat in snapshot.statistics(group_by)[:limit]],
+        }
+        if self.baseline is not None:
+            report["growth"] = [
+                {**_statistic(stat), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in snapshot.compare_to(self.baseline, group_by)[:limit]
+            ]
+        return report
+    
+    async def report(self, limit: int = 30, group_by: str = "lineno") -> Dict[str, Any]:
+        """Largest allocation sites now and the largest growth since the baseline (empty when not tracing)"""
+        report = self.status()
+        if tracemalloc.is_tracing():
+            # Grouping and diffing a large snapshot takes a while; keep it off the event loop
+            report.update(await asyncio.to_thread(self._report, limit, group_by))
+        return report
+
+
+# Followed by estimate_size only through references, never into their attributes
+_OPAQUE = (type, ModuleType, FunctionType, MethodType, CodeType)
+_ATOMIC = (str, bytes, bytearray, int, float, complex, bool, type(None))
+
+
+def estimate_size(obj: Any, limit: int = 100000) -> int:
+    """
+    Approximate deep size in bytes, following containers and instance
+    attributes (at most ``limit`` objects); objects shared within ``obj``
+    are counted once.
+    """
+    seen = set()
+    pending = [obj]
+    size = 0
+    while pending and len(seen) < limit:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, _ATOMIC) or isinstance(item, _OPAQUE):
+            continue
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            pending.extend(item)
+        elif hasattr(item, "__dict__"):
+            pending.append(vars(item))
+    return size
+
+
+def container_size(container: Any, sample: int = 200) -> int:
+    """Estimated deep size of a large dict, list or deque, extrapolated from its first ``sample`` items"""
+    count = len(container)
+    size = sys.getsizeof(container)
+    if not count:
+        return size
+    if isinstance(container, dict):
+        sampled = [estimate_size(key) + estimate_size(value) for key, value in islice(container.items(), sample)]
+    else:
+        sampled = [estimate_size(item) for item in islice(container, sample)]
+    return int(size + sum(sampled) / len(sampled) * count)
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux only, else None)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+cpu_profiler = CpuProfiler(
+    max_seconds=performance_settings.PROFILE_MAX_SECONDS,
+    interval=performance_settings.PROFILE_SAMPLE_INTERVAL,
+)
+memory_tracer = MemoryTracer(frames=performance_settings.TRACEMALLOC_FRAMES)
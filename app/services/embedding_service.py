@@ -1,9 +1,14 @@
-import httpx
-import numpy as np
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 import logging
+import time
 
 from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.metrics import UPSTREAM_REQUESTS, UPSTREAM_LATENCY
+from app.core import tracing
+
+if TYPE_CHECKING:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
 
@@ -14,43 +19,55 @@ class EmbeddingService:
         self.base_url = "https://api.voyageai.com/v1"
         self.use_embeddings = bool(self.api_key)
         
-    async def get_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
+    async def get_embeddings(self, texts: List[str]) -> Optional["np.ndarray"]:
         """Get embeddings from Voyage API"""
         if not self.use_embeddings:
             return None
             
+        start_time = time.perf_counter()
+        span = tracing.span("embedding")
+        span.set("texts", len(texts))
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/embeddings",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "input": texts
-                    },
-                    timeout=30.0
-                )
+            response = await get_http_client().post(
+                f"{self.base_url}/embeddings",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": self.model,
+                    "input": texts
+                },
+                timeout=30.0
+            )
+            UPSTREAM_LATENCY.labels("voyage").observe(time.perf_counter() - start_time)
+            UPSTREAM_REQUESTS.labels("voyage", str(response.status_code)).inc()
+            
+            if response.status_code == 200:
+                import numpy as np
+                
+                result = response.json()
+                embeddings = [item["embedding"] for item in result["data"]]
+                return np.array(embeddings)
+            else:
+                logger.error(f"Embedding API error: {response.status_code}")
+                return None
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    embeddings = [item["embedding"] for item in result["data"]]
-                    return np.array(embeddings)
-                else:
-                    logger.error(f"Embedding API error: {response.status_code}")
-                    return None
-                    
         except Exception as e:
+            UPSTREAM_REQUESTS.labels("voyage", "error").inc()
+            span.set("error", str(e))
             logger.error(f"Error calling Embedding API: {str(e)}")
             return None
+        finally:
+            span.end()
     
-    def calculate_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
+    def calculate_similarity(self, embedding1: "np.ndarray", embedding2: "np.ndarray") -> float:
         """Calculate cosine similarity between two embeddings using numpy"""
         if embedding1 is None or embedding2 is None:
             return 0.0
         
+        import numpy as np
+        
         # Implementasi cosine similarity dengan NumPy
         dot_product = np.dot(embedding1, embedding2)
         norm_1 = np.linalg.norm(embedding1)
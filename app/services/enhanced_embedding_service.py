@@ -1,24 +1,32 @@
-import numpy as np
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from app.services.embedding_service import EmbeddingService
 from app.services.cache_service import cache_service
+from app.services.analytics_service import get_analytics_service
+
+if TYPE_CHECKING:
+    import numpy as np
 
 class EnhancedEmbeddingService(EmbeddingService):
     def __init__(self):
         super().__init__()
         self.embedding_cache_ttl = 86400  # 24 hours
     
-    async def get_embeddings(self, texts: List[str]) -> Optional[np.ndarray]:
-        """Get embeddings with caching"""
+    async def get_embeddings(self, texts: List[str], cache: bool = True) -> Optional["np.ndarray"]:
+        """Get embeddings with caching (``cache=False`` for one-off bulk lookups)"""
         if not self.use_embeddings:
             return None
+        if not cache:
+            return await super().get_embeddings(texts)
         
         # Create cache key
         cache_key = cache_service._generate_key("embeddings", texts)
         
         # Try to get from cache
         cached_result = cache_service.get(cache_key)
+        get_analytics_service().record_cache_lookup("embeddings", cached_result is not None)
         if cached_result is not None:
+            import numpy as np
+            
             return np.array(cached_result)
         
         # Get from API
@@ -29,3 +37,21 @@ class EnhancedEmbeddingService(EmbeddingService):
             cache_service.set(cache_key, result.tolist(), self.embedding_cache_ttl)
         
         return result
+    
+    async def warm_cache(self, texts: List[str]) -> int:
+        """
+        Embed ``texts`` in one call and cache each one the way a single user
+        query is looked up; returns how many were cached
+        """
+        if not self.use_embeddings:
+            return 0
+        keys = {text: cache_service._generate_key("embeddings", [text]) for text in texts}
+        missing = [text for text, key in keys.items() if key not in cache_service.cache]
+        if not missing:
+            return 0
+        result = await super().get_embeddings(missing)
+        if result is None:
+            return 0
+        for text, embedding in zip(missing, result):
+            cache_service.set(keys[text], [embedding.tolist()], self.embedding_cache_ttl)
+        return len(missing)
@@ -1,9 +1,10 @@
 import time
-from typing import List
+from typing import List, Optional
+from app.core.deadline import Deadline
 from app.services.llm_service import LLMService
 from app.models.chat import ChatMessage
 from app.services.cache_service import cache_service
-from app.services.analytics_service import analytics_service
+from app.services.analytics_service import get_analytics_service
 
 class EnhancedLLMService(LLMService):
     def __init__(self):
@@ -15,7 +16,8 @@ class EnhancedLLMService(LLMService):
         prompt: str,
         context: List[ChatMessage] = [],
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        deadline: Optional[Deadline] = None
     ) -> str:
         start_time = time.time()
         
@@ -29,24 +31,25 @@ class EnhancedLLMService(LLMService):
                 })
                 
                 cached_response = cache_service.get(cache_key)
+                get_analytics_service().record_cache_lookup("llm_response", bool(cached_response))
                 if cached_response:
                     response_time = time.time() - start_time
-                    await analytics_service.track_message("cached", prompt, response_time)
+                    get_analytics_service().record_latency("cached", response_time, endpoint="llm")
                     return cached_response
             
             # Generate response
-            response = await super().generate_response(prompt, context, temperature, max_tokens)
+            response = await super().generate_response(prompt, context, temperature, max_tokens, deadline)
             
             # Cache deterministic responses
             if temperature <= 0.1 and response:
                 cache_service.set(cache_key, response, self.response_cache_ttl)
             
-            # Track analytics
+            # Track analytics (message/keyword tracking happens in ChatbotService on the user query)
             response_time = time.time() - start_time
-            await analytics_service.track_message("generated", prompt, response_time)
+            get_analytics_service().record_latency("generated", response_time, endpoint="llm")
             
             return response
-            
+        
         except Exception as e:
-            await analytics_service.track_error("llm_service", str(e))
+            get_analytics_service().record_error("llm_service", str(e))
             raise
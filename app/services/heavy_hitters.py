@@ -0,0 +1,101 @@
+import heapq
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class SpaceSaving:
+    """
+    Streaming top-k counter (Space-Saving algorithm) with fixed memory.
+    
+    At most ``capacity`` items are tracked. When a new item arrives and the
+    table is full, it replaces the item with the smallest count and inherits
+    that count as its error. Every reported count overestimates the true
+    count by at most ``error`` and the error is bounded by total / capacity,
+    so any item with a true share above 1 / capacity is always present.
+    
+    With ``decay_seconds`` set, counts decay exponentially with that time
+    constant, so the table tracks what is trending over roughly that window
+    instead of all-time totals. Decay is applied lazily by growing the weight
+    of new observations instead of shrinking every stored count.
+    """
+    
+    def __init__(self, capacity: int = 500, decay_seconds: Optional[float] = None):
+        self.capacity = capacity
+        self.decay_seconds = decay_seconds
+        self.total = 0.0
+        # item -> [count, error], counts in scaled units when decaying
+        self._counts: Dict[str, List[float]] = {}
+        # Lazy min-heap of (count, item); stale entries are skipped on pop
+        self._heap: List[Tuple[float, str]] = []
+        self._epoch = time.time()
+    
+    def _scale(self, now: float) -> float:
+        """Weight of one observation made at ``now`` in stored units"""
+        if self.decay_seconds is None:
+            return 1.0
+        exponent = (now - self._epoch) / self.decay_seconds
+        if exponent > 50:
+            self._renormalize(now)
+            exponent = 0.0
+        return math.exp(exponent)
+    
+    def _renormalize(self, now: float) -> None:
+        """Move the epoch to ``now`` so scaled counts do not overflow"""
+        factor = math.exp(-(now - self._epoch) / self.decay_seconds)
+        for entry in self._counts.values():
+            entry[0] *= factor
+            entry[1] *= factor
+        self.total *= factor
+        self._epoch = now
+        self._rebuild_heap()
+    
+    def _rebuild_heap(self) -> None:
+        self._heap = [(entry[0], item) for item, entry in self._counts.items()]
+        heapq.heapify(self._heap)
+    
+    def _pop_min(self) -> float:
+        """Evict the tracked item with the smallest count and return that count"""
+        while True:
+            count, item = heapq.heappop(self._heap)
+            entry = self._counts.get(item)
+            if entry is not None and entry[0] == count:
+                del self._counts[item]
+                return count
+    
+    def add(self, item: str, weight: float = 1.0, now: Optional[float] = None) -> None:
+        """Count ``weight`` occurrences of ``item``"""
+        weight *= self._scale(now if now is not None else time.time())
+        self.total += weight
+        
+        entry = self._counts.get(item)
+        if entry is None:
+            if len(self._counts) < self.capacity:
+                entry = self._counts[item] = [0.0, 0.0]
+            else:
+                # The evicted count becomes the newcomer's error
+                min_count = self._pop_min()
+                entry = self._counts[item] = [min_count, min_count]
+        entry[0] += weight
+        heapq.heappush(self._heap, (entry[0], item))
+        
+        if len(self._heap) > 4 * self.capacity:
+            self._rebuild_heap()
+    
+    def top(self, n: int = 10, now: Optional[float] = None) -> List[Tuple[str, float, float]]:
+        """Top ``n`` items as (item, estimated count, max overestimate)"""
+        factor = 1.0
+        if self.decay_seconds is not None:
+            factor = math.exp(-((now if now is not None else time.time()) - self._epoch) / self.decay_seconds)
+        items = heapq.nlargest(n, self._counts.items(), key=lambda kv: kv[1][0])
+        return [(item, entry[0] * factor, entry[1] * factor) for item, entry in items]
+    
+    def error_bound(self, now: Optional[float] = None) -> float:
+        """Upper bound on the overestimate of any reported count"""
+        factor = 1.0
+        if self.decay_seconds is not None:
+            factor = math.exp(-((now if now is not None else time.time()) - self._epoch) / self.decay_seconds)
+        return self.total * factor / self.capacity
+    
+    def __len__(self) -> int:
+        return len(self._counts)
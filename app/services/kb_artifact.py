@@ -0,0 +1,205 @@
+"""
+Compiled knowledge base artifact.
+
+``python -m app.services.kb_artifact`` compiles data.json into a versioned
+directory under ``KB_ARTIFACT_DIR``:
+
+    kb_artifact/
+        CURRENT                     name of the active version
+        <source hash>/
+            manifest.json           format, source hash, embedding model
+            knowledge_base.pkl      validated config and lexical indexes
+            faq_embeddings.npy      float32 FAQ embedding matrix
+            faq_unit_embeddings.npy same rows, L2-normalized
+
+Workers load the artifact instead of parsing and validating data.json and
+fetching embeddings over the network. The embedding matrices are
+memory-mapped read-only, so every worker on the host shares one copy in
+the page cache. An artifact whose source hash does not match data.json is
+stale and ignored; the service then falls back to data.json.
+
+The pickle is only ever read from a directory the deployment itself
+writes; never point KB_ARTIFACT_DIR at untrusted files.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.http_client import close_http_client
+from app.services.data_store import atomic_write
+from app.services.knowledge_base import DATA_PATH, KnowledgeBase, load_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+CURRENT_NAME = "CURRENT"
+MANIFEST_NAME = "manifest.json"
+KB_NAME = "knowledge_base.pkl"
+EMBEDDINGS_NAME = "faq_embeddings.npy"
+UNIT_EMBEDDINGS_NAME = "faq_unit_embeddings.npy"
+
+# Versions kept besides the current one, so workers still mapping them are not disturbed
+KEEP_PREVIOUS = 1
+
+EMBEDDING_BATCH_SIZE = 128
+
+
+def current_version_dir(artifact_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(artifact_dir, CURRENT_NAME), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(artifact_dir, name) if name else None
+
+
+def write_artifact(kb: KnowledgeBase, artifact_dir: str, embedding_model: Optional[str]) -> str:
+    """Write ``kb`` as a new artifact version and make it current; returns its directory"""
+    name = kb.source_hash[:16]
+    version_dir = os.path.join(artifact_dir, name)
+    tmp_dir = os.path.join(artifact_dir, f".{name}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    parts = {
+        "bot_config": kb.bot_config,
+        "company_data": kb.company_data,
+        "faq_texts": kb.faq_texts,
+        "faq_questions": kb.faq_questions,
+        "services": kb.services,
+    }
+    with open(os.path.join(tmp_dir, KB_NAME), "wb") as f:
+        pickle.dump(parts, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    has_embeddings = kb.faq_embeddings is not None
+    if has_embeddings:
+        import numpy as np
+        
+        np.save(os.path.join(tmp_dir, EMBEDDINGS_NAME), np.ascontiguousarray(kb.faq_embeddings))
+        np.save(os.path.join(tmp_dir, UNIT_EMBEDDINGS_NAME), np.ascontiguousarray(kb.faq_unit_embeddings))
+    
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "source_hash": kb.source_hash,
+        "created": time.time(),
+        "faq_count": len(kb.faq_texts),
+        "embedding_model": embedding_model if has_embeddings else None,
+        "embedding_dim": int(kb.faq_embeddings.shape[1]) if has_embeddings else None,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    
+    # Version directories are immutable: a rebuild of the same source replaces it whole
+    if os.path.exists(version_dir):
+        shutil.rmtree(version_dir)
+    os.replace(tmp_dir, version_dir)
+    atomic_write(os.path.join(artifact_dir, CURRENT_NAME), name.encode("utf-8"))
+    _prune(artifact_dir, keep=name)
+    return version_dir
+
+
+def _prune(artifact_dir: str, keep: str) -> None:
+    versions = sorted(
+        (entry for entry in os.scandir(artifact_dir) if entry.is_dir() and not entry.name.startswith(".")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    old = [entry for entry in versions if entry.name != keep][KEEP_PREVIOUS:]
+    for entry in old:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def load_artifact(artifact_dir: str, source_hash: str, embedding_model: Optional[str]) -> Optional[KnowledgeBase]:
+    """
+    Current artifact as a snapshot, or None if there is none or it is stale
+    (built from different data.json content or by another format version).
+    Embeddings from a different model are left out, so they get recomputed.
+    """
+    version_dir = current_version_dir(artifact_dir)
+    if version_dir is None:
+        return None
+    try:
+        with open(os.path.join(version_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest: Dict[str, Any] = json.load(f)
+    except FileNotFoundError:
+        return None
+    
+    if manifest.get("format_version") != FORMAT_VERSION:
+        logger.warning(f"Ignoring knowledge base artifact {version_dir}: format {manifest.get('format_version')}")
+        return None
+    if manifest.get("source_hash") != source_hash:
+        logger.warning(f"Knowledge base artifact {version_dir} is stale, loading data.json instead")
+        return None
+    
+    with open(os.path.join(version_dir, KB_NAME), "rb") as f:
+        parts = pickle.load(f)
+    
+    embeddings = unit_embeddings = None
+    if manifest.get("embedding_model") is not None:
+        if manifest["embedding_model"] == embedding_model:
+            import numpy as np
+            
+            embeddings = np.load(os.path.join(version_dir, EMBEDDINGS_NAME), mmap_mode="r")
+            unit_embeddings = np.load(os.path.join(version_dir, UNIT_EMBEDDINGS_NAME), mmap_mode="r")
+        else:
+            logger.warning(
+                f"Knowledge base artifact embeddings are from {manifest['embedding_model']}, "
+                f"not {embedding_model}; they will be recomputed"
+            )
+    
+    return KnowledgeBase.from_parts(
+        faq_embeddings=embeddings,
+        faq_unit_embeddings=unit_embeddings,
+        source_hash=source_hash,
+        **parts,
+    )
+
+
+async def build_artifact(data_path: str = DATA_PATH, artifact_dir: Optional[str] = None) -> str:
+    """Compile ``data_path`` (embedding the FAQ when an embedding API key is set)"""
+    from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+    
+    artifact_dir = artifact_dir or settings.KB_ARTIFACT_DIR
+    os.makedirs(artifact_dir, exist_ok=True)
+    kb = load_knowledge_base(data_path)
+    
+    embedding_service = EnhancedEmbeddingService()
+    if embedding_service.use_embeddings and kb.faq_texts:
+        texts = list(kb.faq_texts)
+        batches = []
+        try:
+            for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                batch = await embedding_service.get_embeddings(texts[start:start + EMBEDDING_BATCH_SIZE])
+                if batch is None:
+                    raise RuntimeError("Embedding API request failed, artifact not written")
+                batches.append(batch)
+        finally:
+            await close_http_client()
+        import numpy as np
+        
+        kb = kb.with_embeddings(np.concatenate(batches))
+    
+    return await asyncio.to_thread(write_artifact, kb, artifact_dir, embedding_service.model)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile data.json into a knowledge base artifact")
+    parser.add_argument("--data", default=DATA_PATH, help="knowledge base JSON file")
+    parser.add_argument("--output", default=settings.KB_ARTIFACT_DIR, help="artifact directory")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO)
+    start_time = time.perf_counter()
+    version_dir = asyncio.run(build_artifact(args.data, args.output))
+    print(f"Wrote {version_dir} in {time.perf_counter() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
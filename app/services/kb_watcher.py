@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _load_awatch() -> Optional[Callable[..., Any]]:
+    """watchfiles' ``awatch``, imported only when a watcher starts"""
+    try:
+        from watchfiles import awatch
+    except ImportError:  # watchfiles ships with uvicorn[standard]; fall back to polling without it
+        return None
+    return awatch
+
+
+class KnowledgeBaseWatcher:
+    """
+    Watch data.json and call ``on_change`` once the file has settled.
+    
+    Uses OS file notifications (inotify and friends, via watchfiles) when
+    available and mtime polling otherwise. Bursts of writes (editors saving
+    in several steps, ``cp`` of a large file) are debounced into a single
+    call. The parent directory is watched, so files replaced by rename are
+    picked up as well.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        on_change: Callable[[], Awaitable[object]],
+        debounce: float = 1.0,
+        poll_interval: float = 2.0,
+    ):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._stop_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._awatch: Optional[Callable[..., Any]] = None
+    
+    def start(self) -> None:
+        if self._task is None:
+            self._stop_event.clear()
+            self._awatch = _load_awatch()
+            self._task = asyncio.create_task(self._run())
+            mode = "notifications" if self._awatch is not None else f"polling every {self.poll_interval}s"
+            logger.info(f"Watching {self.path} for changes ({mode})")
+    
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run(self) -> None:
+        if self._awatch is not None:
+            await self._watch_events()
+        else:
+            await self._watch_polling()
+    
+    async def _watch_events(self) -> None:
+        directory = os.path.dirname(self.path)
+        async for _ in self._awatch(
+            directory,
+            watch_filter=lambda _, changed_path: os.path.abspath(changed_path) == self.path,
+            debounce=int(self.debounce * 1000),
+            step=50,
+            stop_event=self._stop_event,
+            recursive=False,
+        ):
+            await self._notify()
+    
+    async def _watch_polling(self) -> None:
+        last = await asyncio.to_thread(self._stat)
+        while not self._stop_event.is_set():
+            await asyncio.sleep(self.poll_interval)
+            current = await asyncio.to_thread(self._stat)
+            if current == last:
+                continue
+            # Wait until the file stops changing before reloading
+            while True:
+                await asyncio.sleep(self.debounce)
+                settled = await asyncio.to_thread(self._stat)
+                if settled == current:
+                    break
+                current = settled
+            last = current
+            await self._notify()
+    
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    async def _notify(self) -> None:
+        if not os.path.exists(self.path):
+            logger.warning(f"{self.path} was removed, keeping the current knowledge base")
+            return
+        logger.info(f"{self.path} changed, reloading")
+        try:
+            await self.on_change()
+        except Exception as e:
+            logger.error(f"Reload after change to {self.path} failed: {e}")
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import time
+from itertools import count
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from app.models.chat import BotConfig, CompanyData
+
+# numpy is imported where embeddings are handled: keyword-only deployments never load it
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_PATH = "data.json"
+
+_versions = count(1)
+
+
+def _read_only(array: "np.ndarray") -> "np.ndarray":
+    array.setflags(write=False)
+    return array
+
+
+class KnowledgeBase:
+    """
+    Immutable snapshot of everything retrieval needs: bot config, company
+    data, lookup indexes derived from them and the FAQ embeddings.
+    
+    A snapshot is never modified after construction. Reloads build a new
+    one and swap the reference, so a request that took a snapshot keeps a
+    consistent view (FAQ rows and embedding rows always line up) even while
+    a reload is in progress.
+    """
+    
+    __slots__ = (
+        "version", "created_at", "source_hash", "bot_config", "company_data",
+        "faq_texts", "faq_questions", "services",
+        "faq_embeddings", "faq_unit_embeddings",
+    )
+    
+    def __init__(
+        self,
+        bot_config: BotConfig,
+        company_data: CompanyData,
+        faq_embeddings: Optional["np.ndarray"] = None,
+        source_hash: Optional[str] = None,
+        previous: Optional["KnowledgeBase"] = None,
+    ):
+        self.version = next(_versions)
+        self.created_at = time.time()
+        self.source_hash = source_hash
+        
+        # Sections equal to the previous snapshot's are shared instead of rebuilt
+        same_faq = previous is not None and previous.company_data.faq == company_data.faq
+        same_services = previous is not None and previous.company_data.services == company_data.services
+        self.bot_config = previous.bot_config if previous is not None and previous.bot_config == bot_config else bot_config
+        self.company_data = company_data
+        
+        # Lowercased lookup indexes, computed once per snapshot instead of per request
+        if same_faq:
+            self.faq_texts, self.faq_questions = previous.faq_texts, previous.faq_questions
+        else:
+            self.faq_texts: Tuple[str, ...] = tuple(
+                f"{item['question']} {item['answer']}" for item in company_data.faq
+            )
+            self.faq_questions: Tuple[str, ...] = tuple(item["question"].lower() for item in company_data.faq)
+        if same_services:
+            self.services = previous.services
+        else:
+            self.services: Tuple[Tuple[str, str, Dict[str, Any]], ...] = tuple(
+                (service.get("name", "").lower(), service.get("description", "").lower(), service)
+                for service in company_data.services
+            )
+        
+        self.faq_embeddings: Optional["np.ndarray"] = None
+        self.faq_unit_embeddings: Optional["np.ndarray"] = None
+        if faq_embeddings is not None:
+            if len(faq_embeddings) != len(self.faq_texts):
+                logger.error(
+                    f"Ignoring {len(faq_embeddings)} FAQ embeddings for {len(self.faq_texts)} FAQ items"
+                )
+            else:
+                import numpy as np
+                
+                embeddings = np.asarray(faq_embeddings, dtype=np.float32)
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                # Rows with zero norm stay zero, so their similarity is 0 as before
+                unit = np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms != 0)
+                self.faq_embeddings = _read_only(embeddings)
+                self.faq_unit_embeddings = _read_only(unit)
+    
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Any],
+        source_hash: Optional[str] = None,
+        previous: Optional["KnowledgeBase"] = None,
+    ) -> "KnowledgeBase":
+        """Validate raw data.json content"""
+        return cls(
+            bot_config=BotConfig(**data.get("bot_config", {})),
+            company_data=CompanyData(**data.get("company_data", {})),
+            source_hash=source_hash,
+            previous=previous,
+        )
+    
+    @classmethod
+    def from_parts(
+        cls,
+        bot_config: BotConfig,
+        company_data: CompanyData,
+        faq_texts: Tuple[str, ...],
+        faq_questions: Tuple[str, ...],
+        services: Tuple[Tuple[str, str, Dict[str, Any]], ...],
+        faq_embeddings: Optional["np.ndarray"] = None,
+        faq_unit_embeddings: Optional["np.ndarray"] = None,
+        source_hash: Optional[str] = None,
+    ) -> "KnowledgeBase":
+        """
+        Snapshot from precomputed parts (a compiled artifact). Nothing is
+        validated or recomputed and the arrays are used as given, so
+        memory-mapped embeddings stay memory-mapped.
+        """
+        kb = cls.__new__(cls)
+        kb.version = next(_versions)
+        kb.created_at = time.time()
+        kb.source_hash = source_hash
+        kb.bot_config = bot_config
+        kb.company_data = company_data
+        kb.faq_texts = faq_texts
+        kb.faq_questions = faq_questions
+        kb.services = services
+        kb.faq_embeddings = faq_embeddings
+        kb.faq_unit_embeddings = faq_unit_embeddings
+        return kb
+    
+    @classmethod
+    def default(cls) -> "KnowledgeBase":
+        return cls(
+            bot_config=BotConfig(),
+            company_data=CompanyData(
+                company_name="Company",
+                description="Welcome to our service",
+                services=[],
+                faq=[],
+                contacts={}
+            ),
+        )
+    
+    def with_embeddings(self, faq_embeddings: Optional["np.ndarray"]) -> "KnowledgeBase":
+        """New snapshot with the same content and the given FAQ embeddings"""
+        return KnowledgeBase(self.bot_config, self.company_data, faq_embeddings, self.source_hash, previous=self)
+    
+    def with_mapped_embeddings(
+        self, faq_embeddings: "np.ndarray", faq_unit_embeddings: "np.ndarray"
+    ) -> "KnowledgeBase":
+        """New snapshot with the same content and precomputed (memory-mapped) embeddings, used as given"""
+        return KnowledgeBase.from_parts(
+            self.bot_config, self.company_data, self.faq_texts, self.faq_questions, self.services,
+            faq_embeddings=faq_embeddings, faq_unit_embeddings=faq_unit_embeddings, source_hash=self.source_hash,
+        )
+    
+    def faq_similarities(self, query_embedding: "np.ndarray") -> "np.ndarray":
+        """Cosine similarity of the query against every FAQ item"""
+        import numpy as np
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.faq_texts), dtype=np.float32)
+        return self.faq_unit_embeddings @ (query / norm)
+    
+    def faq_similarities_batch(self, query_embeddings: "np.ndarray") -> "np.ndarray":
+        """Cosine similarities of many queries at once, one row per query"""
+        import numpy as np
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        unit = np.divide(queries, norms, out=np.zeros_like(queries), where=norms != 0)
+        return unit @ self.faq_unit_embeddings.T
+
+
+class KnowledgeBaseDiff:
+    """What changed between two snapshots, by section"""
+    
+    def __init__(self, old: KnowledgeBase, new: KnowledgeBase):
+        self.bot_config = old.bot_config != new.bot_config
+        self.company_info = (
+            old.company_data.model_dump(exclude={"services", "faq"})
+            != new.company_data.model_dump(exclude={"services", "faq"})
+        )
+        self.services = self._diff_items(old.company_data.services, new.company_data.services, "name")
+        self.faq = self._diff_items(old.company_data.faq, new.company_data.faq, "question")
+    
+    @staticmethod
+    def _diff_items(old: List[Dict[str, Any]], new: List[Dict[str, Any]], key: str) -> Dict[str, int]:
+        """Added, removed and changed items, matched by ``key``"""
+        old_items = {item.get(key): item for item in old}
+        new_items = {item.get(key): item for item in new}
+        return {
+            "added": len(new_items.keys() - old_items.keys()),
+            "removed": len(old_items.keys() - new_items.keys()),
+            "changed": sum(1 for k in new_items.keys() & old_items.keys() if new_items[k] != old_items[k]),
+        }
+    
+    @property
+    def size(self) -> int:
+        """Number of changed sections and items"""
+        return (
+            int(self.bot_config) + int(self.company_info)
+            + sum(self.services.values()) + sum(self.faq.values())
+        )
+    
+    def summary(self) -> str:
+        return (
+            f"faq +{self.faq['added']} -{self.faq['removed']} ~{self.faq['changed']}, "
+            f"services +{self.services['added']} -{self.services['removed']} ~{self.services['changed']}, "
+            f"bot_config {'changed' if self.bot_config else 'unchanged'}, "
+            f"company_info {'changed' if self.company_info else 'unchanged'}"
+        )
+
+
+def read_source(path: str = DATA_PATH) -> Tuple[bytes, str]:
+    """Raw data.json bytes and their content hash (blocking)"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, hashlib.sha256(raw).hexdigest()
+
+
+def parse_knowledge_base(raw: bytes, source_hash: str, previous: Optional[KnowledgeBase] = None) -> KnowledgeBase:
+    """Parse and validate data.json content (blocking; run it in a thread from async code)"""
+    return KnowledgeBase.from_dict(json.loads(raw), source_hash=source_hash, previous=previous)
+
+
+def load_knowledge_base(path: str = DATA_PATH) -> KnowledgeBase:
+    """Read and validate data.json (blocking; run it in a thread from async code)"""
+    raw, source_hash = read_source(path)
+    return parse_knowledge_base(raw, source_hash)
@@ -0,0 +1,214 @@
+import math
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Default sliding windows reported by get_stats, in seconds
+DEFAULT_WINDOWS: Dict[str, int] = {"1m": 60, "5m": 300, "15m": 900}
+
+
+class LogHistogram:
+    """
+    Fixed-memory histogram with logarithmic buckets (DDSketch-style).
+
+    Every value is mapped to bucket ``ceil(log_gamma(v))`` so quantiles are
+    returned with a bounded relative error (``relative_accuracy``). Memory is
+    a single counts array whose size only depends on the value range.
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.02,
+        min_value: float = 0.0005,
+        max_value: float = 300.0,
+    ):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self.num_buckets = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.counts = array("I", bytes(4 * self.num_buckets))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = math.ceil(math.log(value) / self._log_gamma) - self._offset
+        return index if index < self.num_buckets else self.num_buckets - 1
+
+    def _bucket_value(self, index: int) -> float:
+        """Representative value of a bucket (minimises relative error)"""
+        upper = self.gamma ** (index + self._offset)
+        return 2 * upper / (self.gamma + 1)
+
+    def record(self, value: float, count: int = 1) -> None:
+        """Record an observation (``count`` times, for sampled events)"""
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.total += value * count
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "LogHistogram") -> None:
+        """Add the observations of another histogram with the same layout"""
+        if other.num_buckets != self.num_buckets:
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def reset(self) -> None:
+        """Drop all observations"""
+        for i in range(self.num_buckets):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact serialisable form (only non-empty buckets are stored)"""
+        return {
+            "n": self.count,
+            "s": self.total,
+            "m": self.max,
+            "b": {str(i): c for i, c in enumerate(self.counts) if c},
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], **kwargs) -> "LogHistogram":
+        """Rebuild a histogram serialised with ``to_dict``"""
+        histogram = cls(**kwargs)
+        for index, c in data.get("b", {}).items():
+            index = int(index)
+            if 0 <= index < histogram.num_buckets:
+                histogram.counts[index] += c
+        histogram.count = data.get("n", 0)
+        histogram.total = data.get("s", 0.0)
+        histogram.max = data.get("m", 0.0)
+        return histogram
+
+    def quantile(self, q: float) -> float:
+        """Approximate value at quantile ``q`` (0..1)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            cumulative += c
+            if cumulative > rank:
+                return min(self._bucket_value(i), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean, p50/p90/p99 and max in milliseconds"""
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": round(mean * 1000, 2),
+            "p50_ms": round(self.quantile(0.50) * 1000, 2),
+            "p90_ms": round(self.quantile(0.90) * 1000, 2),
+            "p99_ms": round(self.quantile(0.99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class WindowedHistogram:
+    """
+    Sliding-window histogram built from a ring of time slots.
+
+    Each slot holds a LogHistogram for ``slot_seconds``; a window query merges
+    the slots that fall inside it. An all-time histogram is kept alongside.
+    """
+
+    def __init__(self, slot_seconds: int = 15, num_slots: int = 60, **histogram_kwargs):
+        self.slot_seconds = slot_seconds
+        self.num_slots = num_slots
+        self._histogram_kwargs = histogram_kwargs
+        # Slots are allocated on first use so idle series stay small
+        self._slots: List[Optional[LogHistogram]] = [None] * num_slots
+        self._slot_ids = [-1] * num_slots
+        self.all_time = LogHistogram(**histogram_kwargs)
+
+    @property
+    def max_window_seconds(self) -> int:
+        return self.slot_seconds * self.num_slots
+
+    def record(self, value: float, now: Optional[float] = None, count: int = 1) -> None:
+        """Record an observation into the current slot"""
+        slot_id = int((now if now is not None else time.time()) // self.slot_seconds)
+        index = slot_id % self.num_slots
+        slot = self._slots[index]
+        if slot is None:
+            slot = self._slots[index] = LogHistogram(**self._histogram_kwargs)
+        elif self._slot_ids[index] != slot_id:
+            slot.reset()
+        self._slot_ids[index] = slot_id
+        slot.record(value, count)
+        self.all_time.record(value, count)
+
+    def window(self, seconds: int, now: Optional[float] = None) -> LogHistogram:
+        """Merged histogram of the last ``seconds`` (rounded up to whole slots)"""
+        current = int((now if now is not None else time.time()) // self.slot_seconds)
+        span = min(self.num_slots, max(1, math.ceil(seconds / self.slot_seconds)))
+        merged = LogHistogram(**self._histogram_kwargs)
+        for index, slot in enumerate(self._slots):
+            if slot is not None and current - span < self._slot_ids[index] <= current:
+                merged.merge(slot)
+        return merged
+
+
+class LatencyTracker:
+    """Latency series keyed by (endpoint, stage), e.g. ("message_stream", "llm_ttfb")"""
+
+    def __init__(self, max_series: int = 64, slot_seconds: int = 15, num_slots: int = 60):
+        self.max_series = max_series
+        self.slot_seconds = slot_seconds
+        self.num_slots = num_slots
+        self.series: Dict[Tuple[str, str], WindowedHistogram] = {}
+
+    def record(
+        self,
+        endpoint: str,
+        stage: str,
+        seconds: float,
+        now: Optional[float] = None,
+        count: int = 1,
+    ) -> None:
+        """Record a latency observation in seconds"""
+        key = (endpoint, stage)
+        series = self.series.get(key)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                return  # Fixed memory: ignore series beyond the cap
+            series = self.series[key] = WindowedHistogram(self.slot_seconds, self.num_slots)
+        series.record(seconds, now, count)
+
+    def summary(
+        self,
+        windows: Optional[Dict[str, int]] = None,
+        stages: Optional[Iterable[str]] = None,
+    ) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+        """Percentiles per endpoint and stage for each sliding window plus all-time"""
+        windows = windows or DEFAULT_WINDOWS
+        now = time.time()
+        result: Dict[str, Dict[str, Dict[str, Dict[str, float]]]] = {}
+        for (endpoint, stage), series in sorted(self.series.items()):
+            if stages is not None and stage not in stages:
+                continue
+            stage_summary = {
+                name: series.window(seconds, now).summary()
+                for name, seconds in windows.items()
+                if seconds <= series.max_window_seconds
+            }
+            stage_summary["all"] = series.all_time.summary()
+            result.setdefault(endpoint, {})[stage] = stage_summary
+        return result
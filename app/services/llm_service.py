@@ -1,9 +1,14 @@
-import httpx
-from typing import List, Dict, AsyncGenerator
+import asyncio
+from typing import List, Dict, AsyncGenerator, Optional
 import logging
 import json
+import time
 
 from app.core.config import settings
+from app.core.deadline import CANCEL_DEADLINE, Deadline, DeadlineExceeded, cancel_reason, record_cancelled
+from app.core.http_client import get_http_client
+from app.core.metrics import UPSTREAM_REQUESTS, UPSTREAM_LATENCY
+from app.core import tracing
 from app.models.chat import ChatMessage
 
 logger = logging.getLogger(__name__)
@@ -19,90 +24,142 @@ class LLMService:
         prompt: str,
         context: List[ChatMessage] = [],
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        deadline: Optional[Deadline] = None
     ) -> str:
         """Generate response using POE API"""
+        if deadline is not None:
+            deadline.check()
+        start_time = time.perf_counter()
+        span = tracing.span("llm")
         try:
             messages = self._prepare_messages(prompt, context)
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.poe_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens
-                    },
-                    timeout=30.0
-                )
+            response = await get_http_client().post(
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.poe_api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens
+                },
+                timeout=deadline.timeout(30.0) if deadline is not None else 30.0
+            )
+            UPSTREAM_LATENCY.labels("poe").observe(time.perf_counter() - start_time)
+            UPSTREAM_REQUESTS.labels("poe", str(response.status_code)).inc()
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result["choices"][0]["message"]["content"]
+            else:
+                logger.error(f"LLM API error: {response.status_code} - {response.text}")
+                return "Maaf, terjadi kesalahan dalam memproses permintaan Anda."
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["choices"][0]["message"]["content"]
-                else:
-                    logger.error(f"LLM API error: {response.status_code} - {response.text}")
-                    return "Maaf, terjadi kesalahan dalam memproses permintaan Anda."
-                    
+        except asyncio.CancelledError as e:
+            record_cancelled(cancel_reason(e), time.perf_counter() - start_time)
+            span.set("cancelled", True)
+            raise
         except Exception as e:
+            if deadline is not None and deadline.expired:
+                UPSTREAM_REQUESTS.labels("poe", "deadline").inc()
+                record_cancelled(CANCEL_DEADLINE, time.perf_counter() - start_time)
+                span.set("error", "deadline exceeded")
+                raise DeadlineExceeded() from e
+            UPSTREAM_REQUESTS.labels("poe", "error").inc()
+            span.set("error", str(e))
             logger.error(f"Error calling LLM API: {str(e)}")
             return "Maaf, terjadi kesalahan sistem. Silakan coba lagi."
+        finally:
+            span.end()
     
     async def generate_response_stream(
         self,
         prompt: str,
         context: List[ChatMessage] = [],
         temperature: float = 0.7,
-        max_tokens: int = 500
+        max_tokens: int = 500,
+        deadline: Optional[Deadline] = None
     ) -> AsyncGenerator[str, None]:
-        """Generate streaming response using POE API"""
+        """
+        Generate streaming response using POE API
+        
+        Closing the generator (client disconnect) or an expired deadline
+        closes the upstream stream and returns its connection to the pool.
+        """
+        if deadline is not None:
+            deadline.check()
+        start_time = time.perf_counter()
+        span = tracing.span("llm_stream")
+        ttfb_span = tracing.span("llm_ttfb")
+        tokens = 0
         try:
             messages = self._prepare_messages(prompt, context)
             
-            async with httpx.AsyncClient() as client:
-                # Request with stream=true for streaming response
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.poe_api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens,
-                        "stream": True  # Enable streaming
-                    },
-                    timeout=30.0
-                ) as response:
-                    if response.status_code == 200:
-                        async for line in response.aiter_lines():
-                            if line.startswith("data: "):
-                                data_str = line[6:]  # Remove "data: " prefix
-                                if data_str == "[DONE]":
-                                    break
-                                try:
-                                    data = json.loads(data_str)
-                                    if "choices" in data and len(data["choices"]) > 0:
-                                        delta = data["choices"][0].get("delta", {})
-                                        content = delta.get("content", "")
-                                        if content:
-                                            yield content
-                                except json.JSONDecodeError:
-                                    continue
-                    else:
-                        logger.error(f"LLM API stream error: {response.status_code}")
-                        yield "Maaf, terjadi kesalahan dalam memproses permintaan Anda."
-                        
+            # Request with stream=true for streaming response
+            async with get_http_client().stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.poe_api_key}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True  # Enable streaming
+                },
+                timeout=deadline.timeout(30.0) if deadline is not None else 30.0
+            ) as response:
+                UPSTREAM_LATENCY.labels("poe_stream").observe(time.perf_counter() - start_time)
+                UPSTREAM_REQUESTS.labels("poe_stream", str(response.status_code)).inc()
+                if response.status_code == 200:
+                    async for line in response.aiter_lines():
+                        if deadline is not None:
+                            deadline.check()
+                        if line.startswith("data: "):
+                            data_str = line[6:]  # Remove "data: " prefix
+                            if data_str == "[DONE]":
+                                break
+                            try:
+                                data = json.loads(data_str)
+                                if "choices" in data and len(data["choices"]) > 0:
+                                    delta = data["choices"][0].get("delta", {})
+                                    content = delta.get("content", "")
+                                    if content:
+                                        if not tokens:
+                                            ttfb_span.end()
+                                        tokens += 1
+                                        yield content
+                            except json.JSONDecodeError:
+                                continue
+                else:
+                    logger.error(f"LLM API stream error: {response.status_code}")
+                    yield "Maaf, terjadi kesalahan dalam memproses permintaan Anda."
+                    
+        except (asyncio.CancelledError, GeneratorExit) as e:
+            record_cancelled(cancel_reason(e), time.perf_counter() - start_time)
+            span.set("cancelled", True)
+            raise
         except Exception as e:
+            if deadline is not None and deadline.expired:
+                UPSTREAM_REQUESTS.labels("poe_stream", "deadline").inc()
+                record_cancelled(CANCEL_DEADLINE, time.perf_counter() - start_time)
+                span.set("error", "deadline exceeded")
+                raise DeadlineExceeded() from e
+            UPSTREAM_REQUESTS.labels("poe_stream", "error").inc()
+            span.set("error", str(e))
             logger.error(f"Error calling LLM API stream: {str(e)}")
             yield "Maaf, terjadi kesalahan sistem. Silakan coba lagi."
+        finally:
+            span.set("chunks", tokens)
+            ttfb_span.end()
+            span.end()
     
     def _prepare_messages(self, prompt: str, context: List[ChatMessage]) -> List[Dict]:
         """Prepare messages for API call"""
@@ -0,0 +1,211 @@
+"""
+FAQ embeddings shared by all workers on a host.
+
+With ``KB_SHARED_EMBEDDINGS_DIR`` set (ideally on tmpfs, e.g.
+``/dev/shm/atabot``), the first worker to embed a knowledge base publishes
+its FAQ embedding matrices there, and every worker, the publisher
+included, maps them read-only instead of holding a private copy:
+
+    KB_SHARED_EMBEDDINGS_DIR/
+        <key>.npy    raw and L2-normalized matrices, shape (2, rows, dim)
+        <key>.lock   held by the worker embedding and publishing <key>
+
+A segment's key is a hash of the embedding model and the FAQ texts, so
+workers serving the same data.json find the same segment, and a reload
+that changes the FAQ publishes a new one. A worker holds a shared flock on
+each segment it maps for as long as one of its snapshots uses it (the OS
+drops it if the worker dies). The worker that drops the last one deletes
+the segment, and publishing also sweeps segments nobody holds once they
+are a minute old, so a segment is not swept between its publication and
+its publisher mapping it. Segments outlive a full restart, so restarted
+workers map them without calling the embedding API.
+
+Needs flock, so sharing is off on platforms without fcntl.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".npy"
+LOCK_SUFFIX = ".lock"
+
+# How long a worker waits for another one to publish the same segment before embedding itself
+PUBLISH_WAIT = 300.0
+POLL_INTERVAL = 0.1
+
+# Sweeps leave younger segments alone: their publisher may not have mapped them yet
+SWEEP_MIN_AGE = 60.0
+
+SHARED_EMBEDDINGS = metrics.counter(
+    "atabot_kb_shared_embeddings_total", "Shared FAQ embedding segments mapped, by origin", ["result"]
+)
+_ATTACHED = SHARED_EMBEDDINGS.labels("attached")
+_PUBLISHED = SHARED_EMBEDDINGS.labels("published")
+
+
+class SharedEmbeddingStore:
+    """Directory of FAQ embedding segments mapped by every worker of the host"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def key(model: str, faq_texts: Sequence[str]) -> str:
+        digest = hashlib.sha256(model.encode("utf-8"))
+        for text in faq_texts:
+            digest.update(b"\0")
+            digest.update(text.encode("utf-8"))
+        return digest.hexdigest()[:32]
+    
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+    
+    async def attach(self, key: str) -> Optional[Tuple["np.ndarray", "np.ndarray"]]:
+        """Map segment ``key`` read-only: (embeddings, unit embeddings), or None if it is not published"""
+        shared = await asyncio.to_thread(self._attach, key)
+        if shared is not None:
+            _ATTACHED.inc()
+        return shared
+    
+    def _attach(self, key: str) -> Optional[Tuple["np.ndarray", "np.ndarray"]]:
+        import numpy as np
+        
+        path = self._path(key, SEGMENT_SUFFIX)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        try:
+            # Waits only while another worker is deleting it; once held, nobody can
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_nlink == 0:
+                os.close(fd)
+                return None
+            # Mapped through its own descriptor: mmap keeps a duplicate of the one it maps,
+            # which would hold on to the lock until the mapping itself is freed
+            segment = np.load(path, mmap_mode="r")
+        except Exception:
+            os.close(fd)
+            raise
+        
+        # The shared lock lasts as long as the mapping: snapshots hold views of it
+        finalizer = weakref.finalize(segment, self._release, key, fd)
+        # A restart keeps the segment for the next workers instead of deleting it
+        finalizer.atexit = False
+        return segment[0], segment[1]
+    
+    def _release(self, key: str, fd: int) -> None:
+        os.close(fd)
+        self._collect(key)
+    
+    def _collect(self, key: str, min_age: float = 0.0) -> bool:
+        """Delete segment ``key`` unless a worker maps it or it was written less than ``min_age`` seconds ago"""
+        path = self._path(key, SEGMENT_SUFFIX)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            stat = os.fstat(fd)
+            if stat.st_nlink == 0 or time.time() - stat.st_mtime < min_age:
+                return False
+            os.unlink(path)
+            try:
+                os.unlink(self._path(key, LOCK_SUFFIX))
+            except FileNotFoundError:
+                pass
+        finally:
+            os.close(fd)
+        logger.info(f"Shared FAQ embeddings {key} released")
+        return True
+    
+    def _sweep(self, keep: str) -> int:
+        """Delete every unmapped segment but ``keep`` older than SWEEP_MIN_AGE, e.g. left by workers that have exited"""
+        keys = [
+            name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)
+        ]
+        return sum(self._collect(key, SWEEP_MIN_AGE) for key in keys if key != keep)
+    
+    @asynccontextmanager
+    async def publishing(self, key: str) -> AsyncIterator[None]:
+        """
+        Held by the one worker embedding ``key``, so the others wait and
+        then attach its segment instead of calling the embedding API too.
+        Gives up waiting after PUBLISH_WAIT seconds.
+        """
+        fd = os.open(self._path(key, LOCK_SUFFIX), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            deadline = time.monotonic() + PUBLISH_WAIT
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        logger.warning(f"Timed out waiting for shared FAQ embeddings {key}, embedding here")
+                        break
+                    await asyncio.sleep(POLL_INTERVAL)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+    
+    async def publish(
+        self, key: str, embeddings: "np.ndarray", unit_embeddings: "np.ndarray"
+    ) -> Optional[Tuple["np.ndarray", "np.ndarray"]]:
+        """Write segment ``key`` and map it; the caller can drop its own copies"""
+        await asyncio.to_thread(self._publish, key, embeddings, unit_embeddings)
+        _PUBLISHED.inc()
+        logger.info(f"Shared FAQ embeddings {key} published ({embeddings.shape[0]}x{embeddings.shape[1]})")
+        shared = await self.attach(key)
+        await asyncio.to_thread(self._sweep, key)
+        return shared
+    
+    def _publish(self, key: str, embeddings: "np.ndarray", unit_embeddings: "np.ndarray") -> None:
+        import numpy as np
+        from numpy.lib import format as npy_format
+        
+        path = self._path(key, SEGMENT_SUFFIX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        segment = npy_format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(2,) + embeddings.shape)
+        segment[0] = embeddings
+        segment[1] = unit_embeddings
+        segment.flush()
+        del segment
+        # Readers only ever see complete segments
+        os.replace(tmp_path, path)
+
+
+@lru_cache(maxsize=None)
+def get_shared_embedding_store() -> Optional[SharedEmbeddingStore]:
+    """Store in KB_SHARED_EMBEDDINGS_DIR, or None when sharing is off or unsupported"""
+    if not settings.KB_SHARED_EMBEDDINGS_DIR:
+        return None
+    if fcntl is None:
+        logger.warning("KB_SHARED_EMBEDDINGS_DIR needs flock (POSIX); FAQ embeddings stay per worker")
+        return None
+    return SharedEmbeddingStore(settings.KB_SHARED_EMBEDDINGS_DIR)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+from app.core.http_client import get_http_client
+from app.core.metrics import metrics
+from app.core.performance_config import performance_settings
+from app.services.chatbot_service import ChatbotService
+
+logger = logging.getLogger(__name__)
+
+READY = metrics.gauge("atabot_ready", "1 once the startup pipeline has finished, else 0")
+STARTUP_PHASE_SECONDS = metrics.gauge("atabot_startup_phase_seconds", "Duration of each startup phase", ["phase"])
+
+STARTING = "starting"
+READY_STATE = "ready"
+FAILED = "failed"
+
+
+class ServiceNotReady(Exception):
+    """The worker has not finished starting up"""
+
+
+class Readiness:
+    """Startup state of this worker, for the readiness probe and the request gate"""
+    
+    def __init__(self):
+        self.state = STARTING
+        self.error: Optional[str] = None
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.startup_ms: Optional[float] = None
+        self.startup: Optional[asyncio.Future] = None
+        READY.set_function(lambda: 1 if self.ready else 0)
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == READY_STATE
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "startup_ms": self.startup_ms,
+            "phases": self.phases,
+        }
+
+
+readiness = Readiness()
+
+
+async def _phase(name: str, work: Awaitable[str]) -> str:
+    """Run one startup phase, recording and logging its duration and result"""
+    start_time = time.perf_counter()
+    try:
+        result = await work
+    except Exception as e:
+        result = f"error: {str(e)}"
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        STARTUP_PHASE_SECONDS.labels(name).set(duration)
+        readiness.phases[name] = {"ms": round(duration * 1000, 1), "result": result}
+        logger.info(f"Startup phase {name}: {result} ({duration * 1000:.1f} ms)")
+    return result
+
+
+async def _load_knowledge_base(service: ChatbotService) -> str:
+    kb = await service.load()
+    return f"v{kb.version}, {len(kb.faq_texts)} FAQ items, {len(kb.services)} services"
+
+
+async def _load_embeddings(service: ChatbotService) -> str:
+    if not service.embedding_service.use_embeddings:
+        return "disabled (no VOYAGE_API_KEY), keyword FAQ search"
+    if not service.kb.faq_texts:
+        return "no FAQ items"
+    precomputed = service.kb.faq_embeddings is not None
+    await service.initialize_embeddings()
+    if service.kb.faq_embeddings is None:
+        logger.warning("FAQ embeddings unavailable, falling back to keyword FAQ search")
+        return "failed, keyword FAQ search"
+    return f"{len(service.kb.faq_texts)} FAQ rows {'from artifact' if precomputed else 'embedded'}"
+
+
+async def _warm_http_pool(service: ChatbotService) -> str:
+    """Open keep-alive connections (DNS, TCP and TLS) to the upstream APIs ahead of the first request"""
+    per_host = performance_settings.STARTUP_WARM_HTTP_CONNECTIONS
+    if per_host <= 0:
+        return "disabled"
+    hosts: List[str] = [service.llm_service.base_url]
+    if service.embedding_service.use_embeddings:
+        hosts.append(service.embedding_service.base_url)
+    
+    client = get_http_client()
+    
+    async def connect(url: str) -> bool:
+        try:
+            # Any response will do; the connection stays in the pool
+            await client.head(url, timeout=performance_settings.STARTUP_WARM_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.debug(f"HTTP warm-up of {url} failed: {str(e)}")
+            return False
+    
+    results = await asyncio.gather(*[connect(url) for url in hosts for _ in range(per_host)])
+    return f"{sum(results)}/{len(results)} connections"
+
+
+async def _warm_caches(service: ChatbotService) -> str:
+    """Pre-embed FAQ questions into the query embedding cache (users often ask them verbatim)"""
+    limit = performance_settings.STARTUP_WARM_FAQ_QUESTIONS
+    if limit <= 0 or not service.embedding_service.use_embeddings:
+        return "disabled"
+    questions = list(dict.fromkeys(item["question"] for item in service.kb.company_data.faq))[:limit]
+    try:
+        cached = await service.embedding_service.warm_cache(questions)
+    except Exception as e:
+        logger.warning(f"Cache warm-up failed: {str(e)}")
+        return "failed"
+    return f"{cached} FAQ question embeddings cached"
+
+
+async def run_startup(service: ChatbotService) -> None:
+    """
+    Bring the worker up: load the knowledge base, then embed (or take from
+    the artifact) the FAQ embeddings and warm the query cache, while the
+    upstream connection pool warms up alongside. The worker is marked ready
+    only when all of it is done; an unexpected error marks it failed and is
+    raised, so the server does not start serving.
+    """
+    start_time = time.perf_counter()
+    readiness.state = STARTING
+    try:
+        http_pool = asyncio.ensure_future(_phase("http_pool", _warm_http_pool(service)))
+        try:
+            await _phase("knowledge_base", _load_knowledge_base(service))
+            await asyncio.gather(
+                _phase("embeddings", _load_embeddings(service)),
+                _phase("caches", _warm_caches(service)),
+            )
+        finally:
+            await http_pool
+    except Exception as e:
+        readiness.state = FAILED
+        readiness.error = str(e)
+        logger.error(f"Startup failed: {str(e)}")
+        raise
+    
+    readiness.startup_ms = round((time.perf_counter() - start_time) * 1000, 1)
+    readiness.state = READY_STATE
+    logger.info(
+        f"Startup finished in {readiness.startup_ms:.1f} ms ("
+        + ", ".join(f"{name} {phase['ms']:.1f} ms" for name, phase in readiness.phases.items())
+        + ")"
+    )
+
+
+async def ensure_started(service: ChatbotService) -> None:
+    """
+    Run startup unless it already ran. The lifespan calls this before the
+    server accepts requests; hosts without a lifespan (serverless functions)
+    get it on the first request instead, and concurrent requests wait for
+    the same run. Raises ServiceNotReady when startup failed; the next call
+    tries again.
+    """
+    if readiness.ready:
+        return
+    if readiness.startup is None or readiness.startup.done():
+        readiness.startup = asyncio.ensure_future(run_startup(service))
+    try:
+        # shield: a cancelled request does not cancel the startup others wait for
+        await asyncio.shield(readiness.startup)
+    except Exception as e:
+        raise ServiceNotReady(readiness.state) from e
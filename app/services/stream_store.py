@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import metrics
+from app.core.performance_config import performance_settings
+from app.core.sse import FrameCoalescer, SSEEncoder
+
+logger = logging.getLogger(__name__)
+
+STREAM_ID_HEADER = "X-Stream-ID"
+
+STREAMS_BUFFERED = metrics.gauge("atabot_stream_buffers", "Chat streams buffered for resumption")
+STREAM_BUFFER_BYTES = metrics.gauge("atabot_stream_buffer_bytes", "Bytes of buffered chat stream frames")
+STREAM_RESUMES = metrics.counter("atabot_stream_resumes_total", "Chat stream resumption attempts", ["result"])
+STREAMS_ABANDONED = metrics.counter(
+    "atabot_streams_abandoned_total", "Chat streams stopped because no client reattached in time"
+)
+
+_RESUMED = STREAM_RESUMES.labels("resumed")
+_RESUME_NOT_FOUND = STREAM_RESUMES.labels("not_found")
+
+
+class StreamBuffer:
+    """
+    Encoded SSE frames of one chat stream, in order.
+    
+    One producer task appends frames as the answer is generated; any number
+    of readers replay them from an offset (the number of frames already
+    received, which is the SSE event id of the last one) and then follow
+    new frames until the stream is finished.
+    """
+    
+    def __init__(self, stream_id: str, owner: Any):
+        self.stream_id = stream_id
+        self.owner = owner
+        self.frames: List[bytes] = []
+        self.size = 0
+        self.finished = False
+        self.finished_at = 0.0
+        self.readers = 0
+        self.producer: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+    
+    def append(self, frames: List[bytes]) -> int:
+        """Add frames; returns their size"""
+        size = sum(len(frame) for frame in frames)
+        self.frames.extend(frames)
+        self.size += size
+        self._notify()
+        return size
+    
+    def finish(self) -> None:
+        self.finished = True
+        self.finished_at = time.monotonic()
+        self._notify()
+    
+    def _notify(self) -> None:
+        # Readers wait on the event they saw; a fresh one is armed for the next change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+    
+    async def read(self, offset: int = 0) -> AsyncGenerator[Tuple[int, List[bytes]], None]:
+        """Batches of ``(event id of the first frame, frames)`` from ``offset`` on"""
+        while True:
+            changed = self._changed
+            if offset < len(self.frames):
+                frames = self.frames[offset:]
+                yield offset + 1, frames
+                offset += len(frames)
+            elif self.finished:
+                return
+            else:
+                await changed.wait()
+
+
+class StreamStore:
+    """
+    Chat streams kept in memory so a client that lost its connection can
+    resume (``Last-Event-ID``) without a new generation.
+    
+    Generation runs in a producer task decoupled from the HTTP response. When
+    the last reader goes away it keeps running for ``resume_grace`` seconds;
+    if nobody reattaches by then it is cancelled and the stream dropped, so
+    abandoned answers still stop costing upstream tokens. Detached producers
+    no longer hold a concurrency slot, so at most ``max_detached`` of them
+    keep running; beyond that a detached stream is abandoned at once.
+    Finished streams stay resumable for ``ttl`` seconds; beyond
+    ``max_streams`` or ``max_bytes`` the oldest finished streams are dropped
+    first.
+    """
+    
+    def __init__(self, max_streams: int, max_bytes: int, ttl: float, resume_grace: float, max_detached: int):
+        self.max_streams = max_streams
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.resume_grace = resume_grace
+        self.max_detached = max_detached
+        self._streams: Dict[str, StreamBuffer] = {}
+        # Finished streams, oldest first: expiry and eviction only look at the front
+        self._finished: "OrderedDict[str, StreamBuffer]" = OrderedDict()
+        self._size = 0
+        # Grace timers of in-progress streams without a reader
+        self._idle: Dict[str, asyncio.TimerHandle] = {}
+        # Those of them whose readers all went away (not just started), capped at max_detached
+        self._orphaned: Set[str] = set()
+        STREAMS_BUFFERED.set_function(lambda: len(self._streams))
+        STREAM_BUFFER_BYTES.set_function(lambda: self._size)
+    
+    def start(
+        self,
+        owner: Any,
+        chunks: AsyncIterator[Dict[str, Any]],
+        encoder: SSEEncoder
+    ) -> StreamBuffer:
+        """
+        Buffer the frames of ``chunks`` (``ChatbotService.process_message_stream``)
+        under a new stream id. ``owner`` (the tenant's service) is the only one
+        allowed to resume it.
+        """
+        self._evict()
+        buffer = StreamBuffer(uuid.uuid4().hex, owner)
+        self._streams[buffer.stream_id] = buffer
+        buffer.producer = asyncio.ensure_future(self._produce(buffer, chunks, encoder))
+        # Nobody is reading yet; the first reader cancels this
+        self._detached(buffer)
+        return buffer
+    
+    def get(self, stream_id: str, owner: Any) -> Optional[StreamBuffer]:
+        buffer = self._streams.get(stream_id)
+        if buffer is None or buffer.owner is not owner or self._expired(buffer, time.monotonic()):
+            _RESUME_NOT_FOUND.inc()
+            return None
+        _RESUMED.inc()
+        return buffer
+    
+    async def follow(self, buffer: StreamBuffer, offset: int = 0) -> AsyncGenerator[Tuple[int, List[bytes]], None]:
+        """``buffer.read(offset)`` as an attached reader (keeps the generation alive)"""
+        buffer.readers += 1
+        self._cancel_idle(buffer.stream_id)
+        try:
+            async with aclosing(buffer.read(offset)) as batches:
+                async for batch in batches:
+                    yield batch
+        finally:
+            buffer.readers -= 1
+            if not buffer.readers and not buffer.finished:
+                if len(self._orphaned) >= self.max_detached:
+                    self._abandon(buffer)
+                else:
+                    self._orphaned.add(buffer.stream_id)
+                    self._detached(buffer)
+    
+    async def _produce(self, buffer: StreamBuffer, chunks: AsyncIterator[Dict[str, Any]], encoder: SSEEncoder) -> None:
+        def emit(frames: List[bytes]) -> None:
+            size = buffer.append(frames)
+            # A dropped (abandoned) stream has already been taken out of the accounting
+            if self._streams.get(buffer.stream_id) is buffer:
+                self._size += size
+        
+        # Coalescing happens here, once, so every reader sees the same numbered frames
+        coalescer = FrameCoalescer(
+            encoder,
+            performance_settings.SSE_FLUSH_INTERVAL,
+            performance_settings.SSE_FLUSH_BYTES,
+            emit
+        )
+        try:
+            # aclosing: cancelling the producer closes the upstream LLM stream right away
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    coalescer.feed(chunk)
+        except DeadlineExceeded:
+            coalescer.flush()
+            emit([encoder.event("error", "Request deadline exceeded", done=True)])
+        except Exception as e:
+            logger.error(f"Chat stream {buffer.stream_id} failed: {str(e)}")
+            coalescer.flush()
+            emit([encoder.event("error", "Maaf, terjadi kesalahan. Silakan coba lagi.", done=True)])
+        finally:
+            coalescer.flush()
+            buffer.finish()
+            self._cancel_idle(buffer.stream_id)
+            if buffer.stream_id in self._streams:
+                self._finished[buffer.stream_id] = buffer
+    
+    def _detached(self, buffer: StreamBuffer) -> None:
+        loop = asyncio.get_running_loop()
+        self._idle[buffer.stream_id] = loop.call_later(self.resume_grace, self._abandon, buffer)
+    
+    def _cancel_idle(self, stream_id: str) -> None:
+        idle = self._idle.pop(stream_id, None)
+        if idle is not None:
+            idle.cancel()
+        self._orphaned.discard(stream_id)
+    
+    def _abandon(self, buffer: StreamBuffer) -> None:
+        self._cancel_idle(buffer.stream_id)
+        if buffer.readers or buffer.finished:
+            return
+        STREAMS_ABANDONED.inc()
+        logger.info(f"Chat stream {buffer.stream_id} abandoned without a client")
+        self._drop(buffer.stream_id)
+        buffer.producer.cancel()
+    
+    def _expired(self, buffer: StreamBuffer, now: float) -> bool:
+        return buffer.finished and now - buffer.finished_at > self.ttl
+    
+    def _drop(self, stream_id: str) -> None:
+        buffer = self._streams.pop(stream_id, None)
+        if buffer is not None:
+            self._finished.pop(stream_id, None)
+            self._size -= buffer.size
+    
+    def stats(self) -> Dict[str, int]:
+        return {"streams": len(self._streams), "finished": len(self._finished), "bytes": self._size}
+    
+    def _evict(self) -> None:
+        """Drop expired streams, then the oldest finished ones while over the limits"""
+        now = time.monotonic()
+        # Never dropped here: in-progress streams are bounded by the chat lane (attached) and max_detached
+        while self._finished:
+            buffer = next(iter(self._finished.values()))
+            if not self._expired(buffer, now) and len(self._streams) < self.max_streams and self._size <= self.max_bytes:
+                break
+            self._drop(buffer.stream_id)
+
+
+stream_store = StreamStore(
+    max_streams=performance_settings.STREAM_BUFFER_MAX_STREAMS,
+    max_bytes=performance_settings.STREAM_BUFFER_MAX_MB * 1024 * 1024,
+    ttl=performance_settings.STREAM_BUFFER_TTL,
+    resume_grace=performance_settings.STREAM_RESUME_GRACE,
+    max_detached=performance_settings.STREAM_MAX_DETACHED,
+)
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.metrics import metrics
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.enhanced_llm_service import EnhancedLLMService
+from app.services.knowledge_base import DATA_PATH, KnowledgeBase
+
+logger = logging.getLogger(__name__)
+
+# Tenant ids double as directory names, so only a safe subset is accepted
+TENANT_ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Per-tenant compiled knowledge base, next to the tenant's data.json
+TENANT_ARTIFACT_DIR = "kb_artifact"
+
+# How long a tenant id without data.json is answered from memory, and how many such ids are remembered
+NOT_FOUND_TTL = 10.0
+NOT_FOUND_MAX = 10000
+
+# Chat sessions grow without reloads, so loaded tenants are re-measured at most this often
+MEASURE_INTERVAL = 10.0
+
+# Rough per-object overhead of chat histories (list, ChatMessage model and its fields)
+SESSION_OVERHEAD = 120
+MESSAGE_OVERHEAD = 600
+
+TENANTS_LOADED = metrics.gauge("atabot_tenants_loaded", "Tenant knowledge bases held in memory")
+TENANT_MEMORY = metrics.gauge("atabot_tenant_memory_bytes", "Estimated memory of loaded tenant knowledge bases")
+TENANT_LOADS = metrics.counter("atabot_tenant_loads_total", "Tenant knowledge base loads", ["result"])
+TENANT_EVICTIONS = metrics.counter("atabot_tenant_evictions_total", "Tenants evicted to stay within the memory budget")
+
+_LOADS_OK = TENANT_LOADS.labels("ok")
+_LOADS_NOT_FOUND = TENANT_LOADS.labels("not_found")
+_LOADS_ERROR = TENANT_LOADS.labels("error")
+
+
+class TenantNotFound(LookupError):
+    """No tenant with this id (invalid id or no data.json for it)"""
+
+
+def estimate_kb_bytes(kb: KnowledgeBase) -> int:
+    """
+    Rough private memory of a snapshot: its text (raw and indexed) plus the
+    embedding arrays. Memory-mapped arrays live in the shared page cache and
+    are not counted.
+    """
+    size = 2 * sum(len(text) for text in kb.faq_texts)
+    size += 2 * sum(len(name) + len(description) for name, description, _ in kb.services)
+    if kb.faq_embeddings is None:
+        return size
+    import numpy as np
+    
+    for array in (kb.faq_embeddings, kb.faq_unit_embeddings):
+        if array is not None and not isinstance(array, np.memmap):
+            size += array.nbytes
+    return size
+
+
+def estimate_session_bytes(sessions: Dict[str, List[Any]]) -> int:
+    """Rough memory of chat histories: message text plus a fixed overhead per session and message"""
+    size = 0
+    for session_id, history in sessions.items():
+        size += SESSION_OVERHEAD + len(session_id) + MESSAGE_OVERHEAD * len(history)
+        size += sum(len(message.content) for message in history)
+    return size
+
+
+class TenantStats:
+    """Usage counters of one tenant; kept across evictions"""
+    
+    __slots__ = ("loads", "evictions", "requests", "last_used", "load_ms", "memory_bytes")
+    
+    def __init__(self):
+        self.loads = 0
+        self.evictions = 0
+        self.requests = 0
+        self.last_used = 0.0
+        self.load_ms = 0.0
+        self.memory_bytes = 0
+
+
+class TenantRegistry:
+    """
+    Chatbot services of many tenants in one process.
+    
+    Each tenant is a directory ``<root_dir>/<tenant id>/`` holding its
+    data.json (and optionally a compiled ``kb_artifact/``). A tenant's
+    service, knowledge base and embeddings are loaded on first use;
+    concurrent first requests share one load. Loaded tenants are kept in
+    LRU order and the least recently used are evicted once more than
+    ``max_loaded`` are held or their estimated memory (knowledge base and
+    chat sessions) exceeds ``memory_budget`` bytes. Eviction drops the
+    tenant's chat sessions; requests already running keep the service they
+    started with. Unknown tenant ids are remembered for NOT_FOUND_TTL
+    seconds, so repeated lookups do not touch the filesystem.
+    
+    All tenants share one LLM and one embedding service (HTTP client and
+    caches).
+    """
+    
+    def __init__(
+        self,
+        root_dir: str,
+        memory_budget: int,
+        max_loaded: int,
+        llm_service: Optional[EnhancedLLMService] = None,
+        embedding_service: Optional[EnhancedEmbeddingService] = None,
+    ):
+        self.root_dir = root_dir
+        self.memory_budget = memory_budget
+        self.max_loaded = max_loaded
+        self.llm_service = llm_service
+        self.embedding_service = embedding_service
+        self._loaded: "OrderedDict[str, ChatbotService]" = OrderedDict()
+        # Snapshot and time of each memory estimate: reloads are re-estimated at once, sessions periodically
+        self._measured: Dict[str, Tuple[KnowledgeBase, float]] = {}
+        # Tenant ids without data.json, with when to look again
+        self._not_found: "OrderedDict[str, float]" = OrderedDict()
+        self._memory_bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.stats: Dict[str, TenantStats] = {}
+        TENANTS_LOADED.set_function(lambda: len(self._loaded))
+        TENANT_MEMORY.set_function(lambda: self._memory_bytes)
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root_dir)
+    
+    async def get(self, tenant_id: str) -> ChatbotService:
+        """Service of ``tenant_id``, loading it if needed; raises TenantNotFound"""
+        service = self._loaded.get(tenant_id)
+        if service is None:
+            if not self.enabled or not TENANT_ID_RE.match(tenant_id) or self._known_missing(tenant_id):
+                raise TenantNotFound(tenant_id)
+            future = self._loading.get(tenant_id)
+            if future is None:
+                future = asyncio.ensure_future(self._load(tenant_id))
+                self._loading[tenant_id] = future
+                future.add_done_callback(lambda _: self._loading.pop(tenant_id, None))
+            # Shielded: a caller that goes away must not cancel the load for the others
+            service = await asyncio.shield(future)
+        else:
+            self._loaded.move_to_end(tenant_id)
+            kb, measured_at = self._measured[tenant_id]
+            if kb is not service.kb or time.monotonic() - measured_at >= MEASURE_INTERVAL:
+                self._measure(tenant_id, service)
+                self._evict(keep=tenant_id)
+        
+        stats = self.stats[tenant_id]
+        stats.requests += 1
+        stats.last_used = time.time()
+        return service
+    
+    async def _load(self, tenant_id: str) -> ChatbotService:
+        tenant_dir = os.path.join(self.root_dir, tenant_id)
+        data_path = os.path.join(tenant_dir, DATA_PATH)
+        if not await asyncio.to_thread(os.path.isfile, data_path):
+            _LOADS_NOT_FOUND.inc()
+            self._not_found[tenant_id] = time.monotonic() + NOT_FOUND_TTL
+            if len(self._not_found) > NOT_FOUND_MAX:
+                self._not_found.popitem(last=False)
+            raise TenantNotFound(tenant_id)
+        
+        start_time = time.perf_counter()
+        try:
+            service = ChatbotService(
+                data_path,
+                os.path.join(tenant_dir, TENANT_ARTIFACT_DIR),
+                self.llm_service,
+                self.embedding_service,
+            )
+            await service.load()
+            await service.initialize_embeddings()
+        except Exception:
+            _LOADS_ERROR.inc()
+            raise
+        _LOADS_OK.inc()
+        
+        stats = self.stats.setdefault(tenant_id, TenantStats())
+        stats.loads += 1
+        stats.load_ms = round((time.perf_counter() - start_time) * 1000, 3)
+        self._loaded[tenant_id] = service
+        self._measure(tenant_id, service)
+        self._evict(keep=tenant_id)
+        logger.info(
+            f"Loaded tenant {tenant_id} in {stats.load_ms:.1f} ms "
+            f"(~{stats.memory_bytes / 1024:.0f} KiB, {len(self._loaded)} tenants loaded)"
+        )
+        return service
+    
+    def _known_missing(self, tenant_id: str) -> bool:
+        expires = self._not_found.get(tenant_id)
+        if expires is None:
+            return False
+        if time.monotonic() < expires:
+            return True
+        del self._not_found[tenant_id]
+        return False
+    
+    def _measure(self, tenant_id: str, service: ChatbotService) -> None:
+        stats = self.stats[tenant_id]
+        kb = service.kb
+        memory_bytes = estimate_kb_bytes(kb) + estimate_session_bytes(service.sessions)
+        self._memory_bytes += memory_bytes - stats.memory_bytes
+        stats.memory_bytes = memory_bytes
+        self._measured[tenant_id] = (kb, time.monotonic())
+    
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used tenants (never ``keep``) until within limits"""
+        while len(self._loaded) > 1 and (
+            len(self._loaded) > self.max_loaded or self._memory_bytes > self.memory_budget
+        ):
+            tenant_id = next(iter(self._loaded))
+            if tenant_id == keep:
+                break
+            del self._loaded[tenant_id]
+            del self._measured[tenant_id]
+            stats = self.stats[tenant_id]
+            self._memory_bytes -= stats.memory_bytes
+            stats.memory_bytes = 0
+            stats.evictions += 1
+            TENANT_EVICTIONS.inc()
+            logger.info(f"Evicted tenant {tenant_id} ({len(self._loaded)} tenants loaded)")
+    
+    def loaded_services(self) -> Dict[str, ChatbotService]:
+        """Services of the tenants currently in memory"""
+        return dict(self._loaded)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Registry totals and per-tenant stats, most recently used first"""
+        tenants: List[Dict[str, Any]] = []
+        for tenant_id, stats in sorted(self.stats.items(), key=lambda item: item[1].last_used, reverse=True):
+            service = self._loaded.get(tenant_id)
+            tenants.append({
+                "tenant_id": tenant_id,
+                "loaded": service is not None,
+                "kb_version": service.kb.version if service is not None else None,
+                "faq_count": len(service.kb.faq_texts) if service is not None else None,
+                "sessions": len(service.sessions) if service is not None else 0,
+                "requests": stats.requests,
+                "loads": stats.loads,
+                "evictions": stats.evictions,
+                "last_used": stats.last_used,
+                "load_ms": stats.load_ms,
+                "memory_bytes": stats.memory_bytes,
+            })
+        return {
+            "enabled": self.enabled,
+            "loaded": len(self._loaded),
+            "max_loaded": self.max_loaded,
+            "memory_bytes": self._memory_bytes,
+            "memory_budget": self.memory_budget,
+            "tenants": tenants,
+        }
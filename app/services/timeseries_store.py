@@ -0,0 +1,343 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.services.latency_histogram import LogHistogram
+
+logger = logging.getLogger(__name__)
+
+# Bucket width in seconds for every rollup resolution
+RESOLUTIONS: Dict[str, int] = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Series names are namespaced by kind, e.g. "endpoint:chat", "error:llm_service", "cache:embeddings"
+SERIES_ENDPOINT = "endpoint:"
+SERIES_ERROR = "error:"
+SERIES_CACHE = "cache:"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    series TEXT NOT NULL,
+    messages INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    cache_hits INTEGER NOT NULL DEFAULT 0,
+    cache_lookups INTEGER NOT NULL DEFAULT 0,
+    latency TEXT,
+    PRIMARY KEY (resolution, bucket, series)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_bucket ON rollups (bucket);
+"""
+
+
+class Rollup:
+    """Aggregated counters and latency histogram for one bucket and series"""
+    
+    __slots__ = ("messages", "errors", "cache_hits", "cache_lookups", "latency")
+    
+    def __init__(self):
+        self.messages = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.latency: Optional[LogHistogram] = None
+    
+    def record_latency(self, seconds: float, count: int = 1):
+        if self.latency is None:
+            self.latency = LogHistogram()
+        self.latency.record(seconds, count)
+    
+    def merge(self, other: "Rollup"):
+        self.messages += other.messages
+        self.errors += other.errors
+        self.cache_hits += other.cache_hits
+        self.cache_lookups += other.cache_lookups
+        if other.latency is not None:
+            if self.latency is None:
+                self.latency = LogHistogram()
+            self.latency.merge(other.latency)
+    
+    def to_row(self) -> Tuple[int, int, int, int, Optional[str]]:
+        latency = json.dumps(self.latency.to_dict()) if self.latency is not None else None
+        return (self.messages, self.errors, self.cache_hits, self.cache_lookups, latency)
+    
+    @classmethod
+    def from_row(cls, messages, errors, cache_hits, cache_lookups, latency) -> "Rollup":
+        rollup = cls()
+        rollup.messages = messages
+        rollup.errors = errors
+        rollup.cache_hits = cache_hits
+        rollup.cache_lookups = cache_lookups
+        if latency:
+            rollup.latency = LogHistogram.from_dict(json.loads(latency))
+        return rollup
+    
+    def summary(self) -> Dict[str, Any]:
+        latency = self.latency.summary() if self.latency is not None else LogHistogram().summary()
+        return {
+            "messages": self.messages,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_lookups": self.cache_lookups,
+            "cache_hit_rate": round(self.cache_hits / self.cache_lookups, 4) if self.cache_lookups else 0.0,
+            "latency": latency,
+        }
+
+
+class TimeSeriesStore:
+    """
+    Per-minute analytics rollups persisted to SQLite.
+    
+    Events are folded into in-memory minute rollups on the event loop; closed
+    minutes are handed to ``write`` (run in a worker thread) in one batched
+    transaction. ``compact`` folds old minutes into hours and old hours into
+    days so the table size stays bounded.
+    """
+    
+    def __init__(
+        self,
+        path: str = "analytics.db",
+        minute_retention: int = 48 * 3600,
+        hour_retention: int = 90 * 86400,
+        day_retention: int = 730 * 86400,
+    ):
+        self.path = path or ":memory:"
+        self.minute_retention = minute_retention
+        self.hour_retention = hour_retention
+        self.day_retention = day_retention
+        self.pending: Dict[Tuple[int, str], Rollup] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+    
+    # ------------------------------------------------------------------
+    # Event loop side
+    # ------------------------------------------------------------------
+    
+    def _pending(self, series: str, now: Optional[float]) -> Rollup:
+        bucket = int(now if now is not None else time.time()) // 60 * 60
+        key = (bucket, series)
+        rollup = self.pending.get(key)
+        if rollup is None:
+            rollup = self.pending[key] = Rollup()
+        return rollup
+    
+    def add_message(self, endpoint: str, latency: float, count: int = 1, now: Optional[float] = None):
+        rollup = self._pending(SERIES_ENDPOINT + endpoint, now)
+        rollup.messages += count
+        rollup.record_latency(latency, count)
+    
+    def add_error(self, error_type: str, count: int = 1, now: Optional[float] = None):
+        self._pending(SERIES_ERROR + error_type, now).errors += count
+    
+    def add_cache_lookup(self, cache: str, hit: bool, count: int = 1, now: Optional[float] = None):
+        rollup = self._pending(SERIES_CACHE + cache, now)
+        rollup.cache_lookups += count
+        if hit:
+            rollup.cache_hits += count
+    
+    def take_pending(self, now: Optional[float] = None, include_open: bool = False) -> List[Tuple[int, str, Rollup]]:
+        """Remove and return closed minute rollups (or all of them on shutdown)"""
+        current = int(now if now is not None else time.time()) // 60 * 60
+        rows = []
+        for key in list(self.pending):
+            if include_open or key[0] < current:
+                rows.append((key[0], key[1], self.pending.pop(key)))
+        return rows
+    
+    def requeue(self, rows: List[Tuple[int, str, Rollup]]):
+        """Put rollups back after a failed write, merged with anything recorded since"""
+        for bucket, series, rollup in rows:
+            existing = self.pending.get((bucket, series))
+            if existing is None:
+                self.pending[(bucket, series)] = rollup
+            else:
+                existing.merge(rollup)
+    
+    def snapshot_pending(self) -> List[Tuple[int, str, Rollup]]:
+        """Copy of the not-yet-persisted rollups, for range queries"""
+        rows = []
+        for (bucket, series), rollup in self.pending.items():
+            copy = Rollup()
+            copy.merge(rollup)
+            rows.append((bucket, series, copy))
+        return rows
+    
+    # ------------------------------------------------------------------
+    # Storage side (blocking, call through asyncio.to_thread)
+    # ------------------------------------------------------------------
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            try:
+                self._conn = self._open(self.path)
+            except sqlite3.Error as e:
+                # e.g. read-only filesystem on serverless deployments
+                logger.error(f"Cannot open analytics store {self.path}: {str(e)}, using in-memory store")
+                self._conn = self._open(":memory:")
+        return self._conn
+    
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.executescript(SCHEMA)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    @contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transaction holding the database write lock from its start. Workers
+        share the file, and a merge reads rows before writing them back, so
+        the read must not happen before another worker's write commits.
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                yield conn
+    
+    def _upsert(self, conn: sqlite3.Connection, resolution: int, rows: Iterable[Tuple[int, str, Rollup]]):
+        """Merge rollups into existing rows of the same bucket (inside ``_write_transaction``)"""
+        for bucket, series, rollup in rows:
+            existing = conn.execute(
+                "SELECT messages, errors, cache_hits, cache_lookups, latency FROM rollups "
+                "WHERE resolution = ? AND bucket = ? AND series = ?",
+                (resolution, bucket, series),
+            ).fetchone()
+            if existing is not None:
+                merged = Rollup.from_row(*existing)
+                merged.merge(rollup)
+                rollup = merged
+            conn.execute(
+                "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (resolution, bucket, series) + rollup.to_row(),
+            )
+    
+    def write(self, rows: List[Tuple[int, str, Rollup]]):
+        """Persist minute rollups in a single transaction"""
+        if not rows:
+            return
+        with self._write_transaction() as conn:
+            self._upsert(conn, RESOLUTIONS["minute"], rows)
+    
+    def compact(self, now: Optional[float] = None):
+        """Fold minutes into hours and hours into days, then apply retention"""
+        now = now if now is not None else time.time()
+        steps = [
+            (RESOLUTIONS["minute"], RESOLUTIONS["hour"], now - self.minute_retention),
+            (RESOLUTIONS["hour"], RESOLUTIONS["day"], now - self.hour_retention),
+        ]
+        with self._write_transaction() as conn:
+            for source, target, cutoff in steps:
+                # Only compact whole target buckets
+                cutoff = int(cutoff) // target * target
+                merged: Dict[Tuple[int, str], Rollup] = {}
+                for bucket, series, *values in conn.execute(
+                    "SELECT bucket, series, messages, errors, cache_hits, cache_lookups, latency "
+                    "FROM rollups WHERE resolution = ? AND bucket < ?",
+                    (source, cutoff),
+                ):
+                    key = (bucket // target * target, series)
+                    if key not in merged:
+                        merged[key] = Rollup()
+                    merged[key].merge(Rollup.from_row(*values))
+                if not merged:
+                    continue
+                conn.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?", (source, cutoff))
+                self._upsert(conn, target, ((b, s, r) for (b, s), r in merged.items()))
+                logger.info(f"Compacted {len(merged)} analytics rollups into {target}s buckets")
+                
+            conn.execute(
+                "DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                (RESOLUTIONS["day"], int(now - self.day_retention)),
+            )
+    
+    def _pick_resolution(self, start: float, end: float, now: float) -> str:
+        span = end - start
+        if span <= 6 * 3600 and start >= now - self.minute_retention:
+            return "minute"
+        if span <= 31 * 86400 and start >= now - self.hour_retention:
+            return "hour"
+        return "day"
+    
+    def query(
+        self,
+        start: float,
+        end: float,
+        resolution: Optional[str] = None,
+        series: Optional[str] = None,
+        pending: Iterable[Tuple[int, str, Rollup]] = (),
+    ) -> Dict[str, Any]:
+        """Aggregate rollups in [start, end) into points of the requested resolution"""
+        resolution = resolution or self._pick_resolution(start, end, time.time())
+        width = RESOLUTIONS[resolution]
+        
+        sql = (
+            "SELECT resolution, bucket, series, messages, errors, cache_hits, cache_lookups, latency "
+            "FROM rollups WHERE bucket >= ? AND bucket < ?"
+        )
+        # Minute buckets overlapping the start are included, by the database and the pending rows alike
+        first_bucket, end = int(start) // 60 * 60, int(end)
+        params: List[Any] = [first_bucket, end]
+        if series:
+            sql += " AND series = ?"
+            params.append(series)
+        
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        
+        points: Dict[int, Rollup] = {}
+        by_series: Dict[str, Rollup] = {}
+        total = Rollup()
+        
+        def fold(row_resolution: int, bucket: int, row_series: str, rollup: Rollup):
+            # Rows coarser than the requested resolution keep their own bucket
+            point = bucket // width * width if row_resolution <= width else bucket
+            points.setdefault(point, Rollup()).merge(rollup)
+            by_series.setdefault(row_series, Rollup()).merge(rollup)
+            total.merge(rollup)
+        
+        for row_resolution, bucket, row_series, *values in rows:
+            fold(row_resolution, bucket, row_series, Rollup.from_row(*values))
+        for bucket, row_series, rollup in pending:
+            if first_bucket <= bucket < end and (not series or row_series == series):
+                fold(RESOLUTIONS["minute"], bucket, row_series, rollup)
+        
+        return {
+            "start": int(start),
+            "end": int(end),
+            "resolution": resolution,
+            "totals": total.summary(),
+            "series": {name: rollup.summary() for name, rollup in sorted(by_series.items())},
+            "points": [
+                {"timestamp": bucket, **rollup.summary()}
+                for bucket, rollup in sorted(points.items())
+            ],
+        }
+    
+    def totals(self, since: float = 0) -> Tuple[int, int, Dict[str, int]]:
+        """Message count, error count and messages per day since ``since``"""
+        with self._lock:
+            conn = self._connect()
+            messages, errors = conn.execute(
+                "SELECT COALESCE(SUM(messages), 0), COALESCE(SUM(errors), 0) FROM rollups"
+            ).fetchone()
+            daily = conn.execute(
+                "SELECT bucket / 86400 * 86400 AS day, SUM(messages) FROM rollups "
+                "WHERE bucket >= ? GROUP BY day HAVING SUM(messages) > 0",
+                (int(since),),
+            ).fetchall()
+        return messages, errors, {
+            time.strftime("%Y-%m-%d", time.gmtime(day)): count for day, count in daily
+        }
+    
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,124 @@
+"""
+Cold start of the application: import time of ``app.main`` and time to the
+first successful chat response, each run in a fresh interpreter.
+
+Two ways a process comes up are measured: ``lifespan`` (uvicorn and other
+servers that run the ASGI lifespan before accepting requests) and
+``serverless`` (hosts that call the app without a lifespan, so the first
+request runs startup). The first request goes through all middlewares to
+the chat endpoint, with a fake LLM. Times are in milliseconds, the median
+over ``--runs`` processes; ``process_ms`` includes interpreter start-up.
+Also reports which optional heavy modules were loaded by then.
+
+Keep the history across commits with ``--history FILE`` (one JSON line per
+run of this script).
+
+    python -m benchmarks.cold_start [--runs 7] [--output FILE] [--history FILE]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# Modules the application should only load when they are needed
+HEAVY_MODULES = ("numpy", "httpx", "watchfiles", "jose", "passlib")
+
+RESULT_PREFIX = "COLD_START_RESULT "
+
+METRICS = ("import_ms", "startup_ms", "first_response_ms", "total_ms", "process_ms")
+
+
+def child(mode: str) -> None:
+    """One cold start; prints its timings as a single line on stdout"""
+    start = time.perf_counter()
+    import app.main
+    imported = time.perf_counter()
+    loaded_at_import = [name for name in HEAVY_MODULES if name in sys.modules]
+    
+    import asyncio
+    
+    from benchmarks.common import FakeLLM, call_asgi, json_body
+    
+    FakeLLM(tokens=20).install()
+    body, headers = json_body({"message": "Apa saja layanan yang tersedia?", "session_id": "cold-start"})
+    
+    async def first_response() -> Dict[str, float]:
+        startup_start = time.perf_counter()
+        if mode == "lifespan":
+            async with app.main.app.router.lifespan_context(app.main.app):
+                started = time.perf_counter()
+                status, _ = await call_asgi(app.main.app, "POST", "/api/v1/chat/message", body, headers)
+                responded = time.perf_counter()
+        else:
+            # Startup runs inside the first request; it counts as response time
+            started = startup_start
+            status, _ = await call_asgi(app.main.app, "POST", "/api/v1/chat/message", body, headers)
+            responded = time.perf_counter()
+        assert status == 200, status
+        return {"startup_ms": (started - startup_start) * 1000, "first_response_ms": (responded - started) * 1000}
+    
+    timings = asyncio.run(first_response())
+    result = {
+        "import_ms": (imported - start) * 1000,
+        "total_ms": (imported - start) * 1000 + timings["startup_ms"] + timings["first_response_ms"],
+        "loaded_at_import": loaded_at_import,
+        "loaded_at_first_response": [name for name in HEAVY_MODULES if name in sys.modules],
+        **timings,
+    }
+    print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+
+def run_child(mode: str) -> Dict[str, Any]:
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.cold_start", "--child", mode],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    result = None
+    for line in process.stdout:
+        if line.startswith(RESULT_PREFIX):
+            result = json.loads(line[len(RESULT_PREFIX):])
+            result["process_ms"] = (time.perf_counter() - spawned) * 1000
+    if process.wait() != 0 or result is None:
+        raise RuntimeError(f"Cold start run ({mode}) failed with exit code {process.returncode}")
+    return result
+
+
+def bench(mode: str, runs: int) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = [run_child(mode) for _ in range(runs)]
+    summary: Dict[str, Any] = {
+        metric: round(statistics.median(result[metric] for result in results), 1) for metric in METRICS
+    }
+    summary["min_total_ms"] = round(min(result["total_ms"] for result in results), 1)
+    summary["loaded_at_import"] = results[-1]["loaded_at_import"]
+    summary["loaded_at_first_response"] = results[-1]["loaded_at_first_response"]
+    return summary
+
+
+def main(args) -> Dict[str, Any]:
+    run_child("lifespan")  # Warm-up: file system and bytecode caches
+    results: Dict[str, Any] = {mode: bench(mode, args.runs) for mode in ("lifespan", "serverless")}
+    results["settings"] = {"runs": args.runs}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=7, help="Processes per mode")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    parser.add_argument("--history", default=None, help="Append the results as one JSON line to this file")
+    parser.add_argument("--child", choices=("lifespan", "serverless"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    from benchmarks.common import configure_environment, write_results
+    
+    # Set in the parent too, so child processes inherit it
+    configure_environment()
+    if args.child:
+        child(args.child)
+    else:
+        write_results("cold_start", main(args), args.output, history=args.history)
@@ -0,0 +1,206 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run from the repository root as modules, e.g.
+``python -m benchmarks.middleware_overhead``. Upstream APIs are replaced by
+in-process fakes so results only measure this service.
+"""
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Patterns of the original per-request ``re.search`` validation, used as a baseline
+LEGACY_SUSPICIOUS_PATTERNS = [
+    r'<script[^>]*>.*?</script>',
+    r'javascript:',
+    r'on\w+\s*=',
+    r'eval\s*\(',
+    r'document\.cookie',
+]
+
+
+def configure_environment() -> None:
+    """Settings for benchmarking; must run before any ``app`` import"""
+    defaults = {
+        "POE_API_KEY": "benchmark",
+        "VOYAGE_API_KEY": "",
+        "DEBUG": "False",
+        "ANALYTICS_DB_PATH": "",
+        "TRACE_EXPORT_PATH": "",
+        "TRACE_SAMPLE_RATE": "0",
+        "RATE_LIMIT_DEFAULT": "",
+        "RATE_LIMIT_CHAT": "",
+        "RATE_LIMIT_CHAT_STREAM": "",
+        "RATE_LIMIT_CHAT_BATCH": "",
+        "RATE_LIMIT_ADMIN": "",
+        "STARTUP_WARM_HTTP_CONNECTIONS": "0",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+async def start_app() -> None:
+    """Run the startup pipeline; benchmarks drive the routers without a lifespan"""
+    from app.api.tenancy import get_default_chatbot_service
+    from app.services.startup import run_startup
+    
+    await run_startup(get_default_chatbot_service())
+
+
+class FakeLLM:
+    """Replaces the Poe calls of LLMService with a local token generator"""
+    
+    def __init__(self, tokens: int = 50, token: str = "lorem ", delay: float = 0.0, burst: int = 1):
+        self.tokens = tokens
+        self.token = token
+        self.delay = delay
+        # Tokens per upstream read: the delay is applied once per burst, like several
+        # tokens arriving in one network chunk
+        self.burst = burst
+        # perf_counter() of every streamed token, for chunk latency measurements
+        self.yield_times: List[float] = []
+    
+    def install(self) -> "FakeLLM":
+        from app.services.llm_service import LLMService
+        
+        fake = self
+        
+        async def generate_response(self, prompt, context=[], temperature=0.7, max_tokens=500, deadline=None):
+            if fake.delay:
+                await asyncio.sleep(fake.delay)
+            return fake.token * fake.tokens
+        
+        async def generate_response_stream(self, prompt, context=[], temperature=0.7, max_tokens=500, deadline=None):
+            for i in range(fake.tokens):
+                if i % fake.burst == 0:
+                    await asyncio.sleep(fake.delay)
+                fake.yield_times.append(time.perf_counter())
+                yield fake.token
+        
+        LLMService.generate_response = generate_response
+        LLMService.generate_response_stream = generate_response_stream
+        return self
+
+
+async def call_asgi(
+    app,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Sequence[Tuple[bytes, bytes]] = (),
+    client: Tuple[str, int] = ("127.0.0.1", 50000),
+) -> Tuple[int, List[Tuple[float, bytes]]]:
+    """
+    Drive an ASGI app directly for one HTTP request.
+    
+    Returns the status code and every body chunk with the perf_counter() at
+    which the app sent it.
+    """
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-length", str(len(body)).encode())] + list(headers),
+        "client": client,
+        "server": ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    request_sent = False
+    status = 0
+    chunks: List[Tuple[float, bytes]] = []
+    
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append((time.perf_counter(), message.get("body", b"")))
+            if not message.get("more_body", False):
+                finished.set()
+    
+    await app(scope, receive, send)
+    finished.set()
+    return status, chunks
+
+
+def json_body(data: Any) -> Tuple[bytes, List[Tuple[bytes, bytes]]]:
+    return json.dumps(data).encode(), [(b"content-type", b"application/json")]
+
+
+def summarize(values: Iterable[float], scale: float = 1e6) -> Dict[str, float]:
+    """Mean and percentiles, scaled (default: seconds to microseconds)"""
+    values = sorted(v * scale for v in values)
+    if not values:
+        return {"count": 0}
+    
+    def pct(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+    
+    return {
+        "count": len(values),
+        "mean": round(statistics.fmean(values), 2),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(values[-1], 2),
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    """Metadata stored next to results so runs can be compared"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=False
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def write_results(
+    name: str,
+    results: Dict[str, Any],
+    output: Optional[str] = None,
+    history: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Print results as JSON and optionally write them to ``output``; with
+    ``history``, also append them as one line (JSON Lines), to follow a
+    benchmark across commits
+    """
+    document = {"benchmark": name, "environment": environment_info(), "results": results}
+    text = json.dumps(document, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if history:
+        with open(history, "a", encoding="utf-8") as f:
+            f.write(json.dumps(document) + "\n")
+    return document
@@ -0,0 +1,128 @@
+"""
+Compare two benchmark result files (``--output`` of any benchmark) and fail
+on regressions.
+
+Timings are matched by their path in the results, e.g.
+``benchmarks/build_prompt[1000]/ns_per_op``. Keys with a time unit
+(``_ns``, ``_us``, ``_ms``, ``_s``) are lower-is-better, rates
+(``_per_s``, ``_per_cpu_s``) higher-is-better; other values are ignored.
+A change worse than ``--threshold`` (relative) is a regression and makes
+the exit status 1, so the comparison can gate CI. Where a timing has a
+``spread`` next to it (the relative interquartile range of its repeated
+runs, see ``benchmarks.micro``), the change must also exceed the larger
+spread of the two runs: a noisy case does not fail on noise.
+
+    python -m benchmarks.compare BASELINE.json CURRENT.json [--threshold 0.10] [--all]
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TIME_UNITS = {"ns", "us", "ms", "s"}
+
+# Settings are inputs, not measurements
+SKIPPED_KEYS = {"settings"}
+
+
+def direction(key: str) -> Optional[int]:
+    """1 when higher is better, -1 when lower is better, None if ``key`` is not a timing"""
+    parts = key.split("_")
+    if len(parts) >= 2 and parts[-2:] in (["per", "s"], ["cpu", "s"]):
+        return 1
+    if TIME_UNITS.intersection(parts):
+        return -1
+    return None
+
+
+def timings(results: Any, path: str = "") -> Iterator[Tuple[str, int, float, float]]:
+    """``(path, direction, value, spread)`` of every timing in a results tree"""
+    if isinstance(results, dict):
+        spread = results.get("spread", 0.0)
+        for key, value in results.items():
+            if key in SKIPPED_KEYS:
+                continue
+            child = f"{path}/{key}" if path else key
+            if isinstance(value, dict):
+                yield from timings(value, child)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                better = direction(key)
+                if better is not None:
+                    yield child, better, float(value), spread
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> Dict[str, List[Dict[str, Any]]]:
+    old = {path: (better, value, spread) for path, better, value, spread in timings(baseline["results"])}
+    new = {path: (value, spread) for path, _, value, spread in timings(current["results"])}
+    report: Dict[str, List[Dict[str, Any]]] = {"regressions": [], "improvements": [], "unchanged": []}
+    for path, (better, before, old_spread) in old.items():
+        if path not in new or before <= 0:
+            # Removed case, or a baseline (such as a near-zero overhead) with no meaningful ratio
+            continue
+        after, new_spread = new[path]
+        change = (after - before) / before
+        limit = max(threshold, old_spread, new_spread)
+        entry = {"path": path, "baseline": before, "current": after, "change": round(change, 4)}
+        if change * better < -limit:
+            report["regressions"].append(entry)
+        elif change * better > limit:
+            report["improvements"].append(entry)
+        else:
+            report["unchanged"].append(entry)
+    report["added"] = [{"path": path} for path in new if path not in old]
+    report["removed"] = [{"path": path} for path in old if path not in new]
+    return report
+
+
+def print_report(report: Dict[str, List[Dict[str, Any]]], show_all: bool) -> None:
+    sections = ["regressions", "improvements"] + (["unchanged"] if show_all else [])
+    for section in sections:
+        if not report[section]:
+            continue
+        print(f"{section.title()}:")
+        for entry in report[section]:
+            print(
+                f"  {entry['path']:64} {entry['baseline']:>14,.1f} -> {entry['current']:>14,.1f}"
+                f"  {entry['change']:+.1%}"
+            )
+    for section in ("added", "removed"):
+        if report[section]:
+            print(f"{section.title()}: {', '.join(entry['path'] for entry in report[section])}")
+    print(
+        f"{len(report['regressions'])} regressions, {len(report['improvements'])} improvements, "
+        f"{len(report['unchanged'])} unchanged"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline", help="Results of the reference run")
+    parser.add_argument("current", help="Results to check")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change that counts (0.10 = 10%%)")
+    parser.add_argument("--all", action="store_true", help="Also list unchanged timings")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+    
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        parser.error(f"Different benchmarks: {baseline.get('benchmark')} and {current.get('benchmark')}")
+    
+    for key in ("python", "platform"):
+        before, after = baseline["environment"].get(key), current["environment"].get(key)
+        if before != after:
+            print(f"Warning: {key} differs ({before} vs {after})", file=sys.stderr)
+    
+    report = compare(baseline, current, args.threshold)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{baseline['environment'].get('commit')} -> {current['environment'].get('commit')}")
+        print_report(report, args.all)
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Microbenchmarks of the request hot paths: retrieval, prompt building, the
+response cache, the rate limiter, analytics, metrics instrumentation and
+SSE encoding.
+
+Retrieval and prompt building run on synthetic knowledge bases (see
+``benchmarks.synthetic_kb``) of every ``--sizes`` entry, with as many
+services as FAQ items; the vector FAQ search uses random embeddings and a
+stub in place of the embedding API. Each case is calibrated to run for at
+least ``--min-time`` seconds and repeated ``--repeat`` times; ``ns_per_op``
+is the median and ``spread`` the relative interquartile range of the runs.
+Save runs with ``--output`` and compare them with
+``python -m benchmarks.compare``.
+
+    python -m benchmarks.micro [--sizes 10,1000,100000] [--filter TEXT] [--output FILE]
+"""
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from benchmarks.common import configure_environment, write_results
+from benchmarks.synthetic_kb import generate_data
+
+configure_environment()
+
+import numpy as np  # noqa: E402
+
+from app.core.metrics import MetricsRegistry, metrics  # noqa: E402
+from app.core.sse import FrameCoalescer, SSEEncoder  # noqa: E402
+from app.middleware.rate_limiting import RateLimiter  # noqa: E402
+from app.services.analytics_service import AnalyticsService  # noqa: E402
+from app.services.cache_service import MemoryCache  # noqa: E402
+from app.services.chatbot_service import ChatbotService  # noqa: E402
+from app.services.knowledge_base import KnowledgeBase  # noqa: E402
+
+QUERY = "Berapa biaya membuat chatbot whatsapp?"
+
+Operation = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+class StubEmbeddings:
+    """Embedding service that returns one precomputed query vector"""
+    
+    use_embeddings = True
+    
+    def __init__(self, vector: np.ndarray):
+        self.vector = vector[np.newaxis, :]
+    
+    async def get_embeddings(self, texts: List[str], cache: bool = True) -> np.ndarray:
+        return self.vector
+
+
+class Runner:
+    """Times operations and collects results by case name"""
+    
+    def __init__(self, min_time: float, repeat: int, pattern: Optional[str]):
+        self.min_time = min_time
+        self.repeat = repeat
+        self.pattern = pattern
+        self.results: Dict[str, Dict[str, float]] = {}
+        # One loop for all async cases, so background workers (analytics) keep running
+        self.loop = asyncio.new_event_loop()
+    
+    def bench(self, name: str, op: Operation, is_async: bool = False) -> None:
+        if self.pattern and self.pattern not in name:
+            return
+        
+        if is_async:
+            async def batch(number: int) -> None:
+                for _ in range(number):
+                    await op()
+            
+            def timed(number: int) -> float:
+                start = time.perf_counter()
+                self.loop.run_until_complete(batch(number))
+                return time.perf_counter() - start
+        else:
+            def timed(number: int) -> float:
+                start = time.perf_counter()
+                for _ in range(number):
+                    op()
+                return time.perf_counter() - start
+        
+        # Calibrate: grow the loop count (at least doubling) until one run takes min_time
+        number = 1
+        while True:
+            elapsed = timed(number)
+            if elapsed >= self.min_time:
+                break
+            number = max(number * 2, int(number * self.min_time / max(elapsed, 1e-9)) + 1)
+        
+        # As in timeit: collection pauses depend on earlier cases, not on this one
+        gc.collect()
+        gc.disable()
+        try:
+            per_op = sorted(timed(number) / number * 1e9 for _ in range(self.repeat))
+        finally:
+            gc.enable()
+        median = statistics.median(per_op)
+        quartiles = statistics.quantiles(per_op, n=4)
+        self.results[name] = {
+            "ns_per_op": round(median, 1),
+            # Relative interquartile range of the timed runs: how noisy this case is here
+            "spread": round((quartiles[2] - quartiles[0]) / median, 3),
+            "ops": number * self.repeat,
+        }
+        print(f"{name:48} {self.results[name]['ns_per_op']:>14,.1f} ns/op", flush=True)
+    
+    def close(self) -> None:
+        async def cancel_background_tasks() -> None:
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self.loop.run_until_complete(cancel_background_tasks())
+        self.loop.close()
+
+
+def bench_retrieval(runner: Runner, size: int, dim: int) -> None:
+    kb = KnowledgeBase.from_dict(generate_data(size, size))
+    service = ChatbotService()
+    service.embedding_service.use_embeddings = False
+    
+    runner.bench(f"find_similar_faq.keyword[{size}]", lambda: service._find_similar_faq(QUERY, kb), is_async=True)
+    runner.bench(f"find_relevant_services[{size}]", lambda: service._find_relevant_services(QUERY, kb))
+    
+    relevant_info = runner.loop.run_until_complete(service._find_relevant_info(QUERY, kb))
+    runner.bench(f"build_prompt[{size}]", lambda: service._build_prompt(QUERY, relevant_info, kb))
+    
+    rng = np.random.default_rng(0)
+    kb = kb.with_embeddings(rng.standard_normal((size, dim), dtype=np.float32))
+    vector_service = ChatbotService(embedding_service=StubEmbeddings(rng.standard_normal(dim, dtype=np.float32)))
+    runner.bench(
+        f"find_similar_faq.vector[{size}]", lambda: vector_service._find_similar_faq(QUERY, kb), is_async=True
+    )
+
+
+def bench_cache(runner: Runner, sizes: List[int]) -> None:
+    cache = MemoryCache()
+    cache.set("hit", {"response": "lorem " * 50})
+    runner.bench("memory_cache.get.hit", lambda: cache.get("hit"))
+    runner.bench("memory_cache.get.miss", lambda: cache.get("miss"))
+    runner.bench("memory_cache.set", lambda: cache.set("key", "value"))
+    runner.bench("memory_cache.generate_key", lambda: cache._generate_key("llm_response", {"prompt": QUERY}))
+    for size in sizes:
+        cache = MemoryCache()
+        for i in range(size):
+            cache.set(f"key-{i}", i)
+        runner.bench(f"memory_cache.get_stats[{size}]", cache.get_stats)
+
+
+def bench_rate_limiter(runner: Runner) -> None:
+    limiter = RateLimiter(max_requests=10**9, window_seconds=1)
+    runner.bench("rate_limiter.is_allowed.one_key", lambda: limiter.is_allowed("127.0.0.1"))
+    
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(10000)]
+    position = 0
+    
+    def many_keys() -> bool:
+        nonlocal position
+        position = (position + 1) % len(keys)
+        return limiter.is_allowed(keys[position])
+    
+    runner.bench("rate_limiter.is_allowed.10k_keys", many_keys)
+
+
+def bench_analytics(runner: Runner, batch_size: int = 256) -> None:
+    analytics = AnalyticsService(queue_size=10**9, sample_watermark=1.0)
+    calls = 0
+    
+    async def track() -> None:
+        # Queueing plus aggregation: events are folded in batches, as the background
+        # worker does, but synchronously so that the work lands in the timed run
+        nonlocal calls
+        calls += 1
+        await analytics.track_message("session", QUERY, 0.05)
+        if calls % batch_size == 0:
+            await analytics.flush()
+    
+    runner.bench("analytics.track_message", track, is_async=True)
+
+
+def bench_metrics(runner: Runner) -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("benchmark_total", "Benchmark counter", ["result"])
+    hit = counter.labels("hit")
+    histogram = registry.histogram("benchmark_seconds", "Benchmark histogram", ["stage"]).labels("retrieval")
+    # The cost of the call itself, which every instrumentation point below includes
+    runner.bench("metrics.baseline_call", lambda: None)
+    runner.bench("metrics.counter.inc", hit.inc)
+    runner.bench("metrics.counter.labels_inc", lambda: counter.labels("hit").inc())
+    runner.bench("metrics.histogram.observe", lambda: histogram.observe(0.042))
+    # A scrape of every metric registered by the modules imported here
+    runner.bench("metrics.render", metrics.render)
+
+
+def bench_sse(runner: Runner, tokens: int) -> None:
+    encoder = SSEEncoder("benchmark-session")
+    runner.bench("sse.encode_token", lambda: encoder.content("lorem "))
+    runner.bench("sse.encode_chunk", lambda: encoder.chunk({"type": "content", "content": "lorem "}))
+    
+    chunks = [{"type": "session", "session_id": "benchmark-session"}]
+    chunks += [{"type": "content", "content": "lorem "} for _ in range(tokens)]
+    chunks.append({"type": "done", "done": True})
+    
+    async def coalesce_response() -> None:
+        # Async only because the coalescer schedules its flush timer on the running loop
+        frames: List[bytes] = []
+        coalescer = FrameCoalescer(encoder, 0.05, 4096, frames.extend)
+        for chunk in chunks:
+            coalescer.feed(chunk)
+        coalescer.flush()
+    
+    runner.bench(f"sse.coalesce_response[{tokens}_tokens]", coalesce_response, is_async=True)
+
+
+def main(args) -> Dict[str, Any]:
+    sizes = [int(size) for size in args.sizes.split(",")]
+    runner = Runner(args.min_time, args.repeat, args.filter)
+    try:
+        for size in sizes:
+            bench_retrieval(runner, size, args.dim)
+        bench_cache(runner, sizes)
+        bench_rate_limiter(runner)
+        bench_analytics(runner)
+        bench_metrics(runner)
+        bench_sse(runner, args.tokens)
+    finally:
+        runner.close()
+    return {
+        "benchmarks": runner.results,
+        "settings": {
+            "sizes": sizes,
+            "dim": args.dim,
+            "tokens": args.tokens,
+            "min_time": args.min_time,
+            "repeat": args.repeat,
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,1000,100000", help="Knowledge base sizes (FAQ items and services)")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimensions of the vector FAQ search")
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens per coalesced SSE response")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=7, help="Timed runs per case")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name contains this text")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    args = parser.parse_args()
+    write_results("micro", main(args), args.output)
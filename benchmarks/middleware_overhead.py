@@ -0,0 +1,136 @@
+"""
+Middleware overhead: function-style ``@app.middleware("http")`` wrappers
+versus the pure ASGI middleware classes.
+
+Measures per-request latency of a trivial endpoint and, for the SSE chat
+stream, the delay between the LLM yielding a token and the app handing the
+corresponding frame to the server.
+
+    python -m benchmarks.middleware_overhead [--requests 2000] [--tokens 200] [--output FILE]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import (
+    LEGACY_SUSPICIOUS_PATTERNS, FakeLLM, call_asgi, configure_environment, json_body, start_app, summarize,
+    write_results
+)
+
+configure_environment()
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, Response  # noqa: E402
+
+from app.api.v1.api import api_router  # noqa: E402
+from app.core.performance_config import performance_settings  # noqa: E402
+from app.middleware.performance_middleware import PerformanceMiddleware  # noqa: E402
+from app.middleware.rate_limiting import RateLimitMiddleware, rate_limiter  # noqa: E402
+from app.middleware.security import SecurityMiddleware  # noqa: E402
+
+
+# Previous function-style middlewares, kept here as the comparison baseline
+async def legacy_security(request: Request, call_next):
+    import re
+    if request.query_params:
+        query_string = str(request.query_params)
+        for pattern in LEGACY_SUSPICIOUS_PATTERNS:
+            if re.search(pattern, query_string, re.IGNORECASE):
+                return Response("Suspicious request detected", status_code=400)
+    response = await call_next(request)
+    response.headers["X-Content-Type-Options"] = "nosniff"
+    response.headers["X-Frame-Options"] = "DENY"
+    response.headers["X-XSS-Protection"] = "1; mode=block"
+    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+    return response
+
+
+async def legacy_rate_limit(request: Request, call_next):
+    client_ip = request.client.host if request.client else "unknown"
+    allowed, _ = await rate_limiter.policy_for(request.url.path).check(client_ip)
+    if not allowed:
+        return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
+    return await call_next(request)
+
+
+legacy_semaphore = asyncio.Semaphore(performance_settings.MAX_CONCURRENT_REQUESTS)
+
+
+async def legacy_performance(request: Request, call_next):
+    await legacy_semaphore.acquire()
+    try:
+        return await asyncio.wait_for(call_next(request), timeout=performance_settings.REQUEST_TIMEOUT)
+    finally:
+        legacy_semaphore.release()
+
+
+def build_app(variant: str) -> FastAPI:
+    app = FastAPI()
+    if variant == "http_middleware":
+        app.middleware("http")(legacy_security)
+        app.middleware("http")(legacy_rate_limit)
+        app.middleware("http")(legacy_performance)
+    elif variant == "asgi":
+        app.add_middleware(SecurityMiddleware)
+        app.add_middleware(RateLimitMiddleware)
+        app.add_middleware(PerformanceMiddleware)
+    app.include_router(api_router, prefix="/api/v1")
+    return app
+
+
+async def bench_requests(app, requests: int) -> dict:
+    for _ in range(50):
+        await call_asgi(app, "GET", "/api/v1/health/")
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status, _ = await call_asgi(app, "GET", "/api/v1/health/")
+        timings.append(time.perf_counter() - start)
+        assert status == 200, status
+    return summarize(timings)
+
+
+async def bench_stream(app, fake: FakeLLM, streams: int) -> dict:
+    body, headers = json_body({"message": "benchmark"})
+    latencies, totals = [], []
+    for _ in range(streams):
+        fake.yield_times.clear()
+        start = time.perf_counter()
+        status, chunks = await call_asgi(app, "POST", "/api/v1/chat/message/stream", body, headers)
+        totals.append(time.perf_counter() - start)
+        assert status == 200, status
+        # Pair each content frame with the token that produced it
+        content_times = [
+            sent for sent, data in chunks
+            if data.startswith(b"data: ") and b'"type": "content"' in data
+        ]
+        latencies.extend(sent - produced for sent, produced in zip(content_times, fake.yield_times))
+    return {"chunk_latency_us": summarize(latencies), "stream_total_ms": summarize(totals, scale=1e3)}
+
+
+async def main(args) -> dict:
+    fake = FakeLLM(tokens=args.tokens).install()
+    await start_app()
+    # One frame per token, so every frame can be paired with the token that produced it
+    performance_settings.SSE_FLUSH_INTERVAL = 0
+    results = {}
+    for variant in ("none", "http_middleware", "asgi"):
+        app = build_app(variant)
+        results[variant] = {
+            "request_us": await bench_requests(app, args.requests),
+            "stream": await bench_stream(app, fake, args.streams),
+        }
+    baseline = results["none"]["request_us"]["mean"]
+    for variant in ("http_middleware", "asgi"):
+        results[variant]["overhead_us"] = round(results[variant]["request_us"]["mean"] - baseline, 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    args = parser.parse_args()
+    write_results("middleware_overhead", asyncio.run(main(args)), args.output)
@@ -0,0 +1,118 @@
+"""
+SSE encoding cost of the chat stream endpoint: the previous per-token
+``json.dumps`` frames versus pre-encoded templates, with and without token
+coalescing.
+
+Runs many concurrent streams against the chat router (no middleware) with
+a fake LLM that delivers tokens in bursts, and reports CPU time per
+streamed response plus frames and bytes written.
+
+    python -m benchmarks.sse_encoding [--concurrency 200] [--tokens 300] [--burst 4] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import time
+from contextlib import aclosing
+
+from benchmarks.common import FakeLLM, call_asgi, configure_environment, json_body, start_app, write_results
+
+configure_environment()
+
+from fastapi import APIRouter, Depends, FastAPI  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from app.api.tenancy import get_chatbot_service  # noqa: E402
+from app.api.v1.endpoints import chat  # noqa: E402
+from app.core.performance_config import performance_settings  # noqa: E402
+from app.models.chat import ChatRequest  # noqa: E402
+from app.services.chatbot_service import ChatbotService  # noqa: E402
+
+legacy_router = APIRouter()
+
+
+# Previous streaming endpoint body, kept here as the comparison baseline
+@legacy_router.post("/message/stream")
+async def legacy_stream(request: ChatRequest, service: ChatbotService = Depends(get_chatbot_service)):
+    async def generate():
+        async with aclosing(service.process_message_stream(request)) as stream:
+            async for chunk in stream:
+                data = json.dumps({
+                    "type": chunk.get("type", "content"),
+                    "content": chunk.get("content", ""),
+                    "session_id": chunk.get("session_id", request.session_id),
+                    "done": chunk.get("done", False)
+                })
+                yield f"data: {data}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'done': True})}\n\n"
+    
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+VARIANTS = {
+    # name: (router, SSE_FLUSH_INTERVAL)
+    "legacy_json": (legacy_router, None),
+    "templates": (chat.router, 0.0),
+    "templates_coalesced": (chat.router, None),
+}
+
+
+async def bench(app: FastAPI, concurrency: int, rounds: int) -> dict:
+    body, headers = json_body({"message": "benchmark", "session_id": "benchmark-session"})
+    frames = size = responses = 0
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(rounds):
+        results = await asyncio.gather(*[
+            call_asgi(app, "POST", "/chat/message/stream", body, headers) for _ in range(concurrency)
+        ])
+        for status, chunks in results:
+            assert status == 200, status
+            data = b"".join(chunk for _, chunk in chunks)
+            frames += data.count(b"data: ")
+            size += len(data)
+            responses += 1
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    return {
+        "responses": responses,
+        "cpu_us_per_response": round(cpu / responses * 1e6, 1),
+        "wall_s": round(wall, 3),
+        "frames_per_response": round(frames / responses, 1),
+        "bytes_per_response": round(size / responses, 1),
+    }
+
+
+async def main(args) -> dict:
+    FakeLLM(tokens=args.tokens, delay=args.delay, burst=args.burst).install()
+    await start_app()
+    default_interval = performance_settings.SSE_FLUSH_INTERVAL
+    results = {}
+    for name, (router, interval) in VARIANTS.items():
+        performance_settings.SSE_FLUSH_INTERVAL = default_interval if interval is None else interval
+        app = FastAPI()
+        app.include_router(router, prefix="/chat")
+        await bench(app, concurrency=10, rounds=1)  # Warm-up
+        results[name] = await bench(app, args.concurrency, args.rounds)
+    performance_settings.SSE_FLUSH_INTERVAL = default_interval
+    baseline = results["legacy_json"]["cpu_us_per_response"]
+    for name in ("templates", "templates_coalesced"):
+        results[name]["cpu_saving"] = round(1 - results[name]["cpu_us_per_response"] / baseline, 3)
+    results["settings"] = {
+        "flush_interval": default_interval,
+        "flush_bytes": performance_settings.SSE_FLUSH_BYTES,
+        "tokens": args.tokens,
+        "burst": args.burst,
+        "delay": args.delay,
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=300)
+    parser.add_argument("--burst", type=int, default=4, help="Tokens per upstream read")
+    parser.add_argument("--delay", type=float, default=0.005, help="Seconds between upstream reads")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    args = parser.parse_args()
+    write_results("sse_encoding", asyncio.run(main(args)), args.output)
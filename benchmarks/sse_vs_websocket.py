@@ -0,0 +1,144 @@
+"""
+Chat throughput over SSE versus the WebSocket endpoint: one HTTP request
+per message against many messages on long-lived connections.
+
+Runs the chat routers behind the ASGI middlewares with a fake LLM; every
+client sends ``--messages`` messages one after the other, over a new SSE
+request each or over its one WebSocket. Both go through the chat lane's
+admission limit. Reports messages per second and per CPU second (the
+process is single threaded, so that is messages/s per core).
+
+    python -m benchmarks.sse_vs_websocket [--clients 200] [--messages 5] [--tokens 100] [--output FILE]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import List
+
+from benchmarks.common import FakeLLM, call_asgi, configure_environment, json_body, start_app, write_results
+
+# Every client is admitted eventually; queue sheds would not be messages
+os.environ.setdefault("CONCURRENCY_QUEUE_SIZE", "10000")
+os.environ.setdefault("CONCURRENCY_QUEUE_TIMEOUT", "60")
+configure_environment()
+
+from fastapi import FastAPI  # noqa: E402
+
+from app.api.v1.endpoints import chat, chat_ws  # noqa: E402
+from app.core.performance_config import performance_settings  # noqa: E402
+from app.middleware.performance_middleware import PerformanceMiddleware  # noqa: E402
+from app.middleware.rate_limiting import RateLimitMiddleware  # noqa: E402
+from app.middleware.security import SecurityMiddleware  # noqa: E402
+
+
+async def sse_client(app: FastAPI, client_id: int, messages: int) -> int:
+    body, headers = json_body({"message": "benchmark", "session_id": f"sse-{client_id}"})
+    frames = 0
+    for _ in range(messages):
+        status, chunks = await call_asgi(app, "POST", "/api/v1/chat/message/stream", body, headers)
+        assert status == 200, status
+        data = b"".join(chunk for _, chunk in chunks)
+        assert b'"done": true' in data
+        frames += data.count(b"data: ")
+    return frames
+
+
+async def websocket_client(app: FastAPI, client_id: int, messages: int) -> int:
+    """One connection driven through the ASGI WebSocket protocol"""
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "scheme": "ws",
+        "path": "/api/v1/chat/ws",
+        "raw_path": b"/api/v1/chat/ws",
+        "query_string": f"session_id=ws-{client_id}".encode(),
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 50000 + client_id),
+        "server": ("benchmark", 80),
+        "subprotocols": [],
+    }
+    inbox: asyncio.Queue = asyncio.Queue()
+    done = asyncio.Event()
+    frames = 0
+    
+    async def receive():
+        return await inbox.get()
+    
+    async def send(message):
+        nonlocal frames
+        if message["type"] == "websocket.send":
+            frames += 1
+            if message["text"].endswith('"done": true}'):
+                assert message["text"].startswith('{"type": "done"'), message["text"]
+                done.set()
+        elif message["type"] == "websocket.close":
+            done.set()
+    
+    await inbox.put({"type": "websocket.connect"})
+    server = asyncio.ensure_future(app(scope, receive, send))
+    request = json.dumps({"type": "message", "message": "benchmark"})
+    for _ in range(messages):
+        done.clear()
+        await inbox.put({"type": "websocket.receive", "text": request})
+        await done.wait()
+    await inbox.put({"type": "websocket.disconnect", "code": 1000})
+    await server
+    return frames
+
+
+async def bench(app: FastAPI, client, clients: int, messages: int) -> dict:
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    frames: List[int] = await asyncio.gather(*[client(app, i, messages) for i in range(clients)])
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    total = clients * messages
+    return {
+        "messages": total,
+        "messages_per_s": round(total / wall, 1),
+        "messages_per_cpu_s": round(total / cpu, 1),
+        "cpu_us_per_message": round(cpu / total * 1e6, 1),
+        "frames_per_message": round(sum(frames) / total, 1),
+    }
+
+
+async def main(args) -> dict:
+    FakeLLM(tokens=args.tokens, delay=args.delay, burst=args.burst).install()
+    await start_app()
+    app = FastAPI()
+    app.add_middleware(SecurityMiddleware)
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(PerformanceMiddleware)
+    # Same paths as the API, so both transports share the chat lane
+    app.include_router(chat.router, prefix="/api/v1/chat")
+    app.include_router(chat_ws.router, prefix="/api/v1/chat")
+    results = {}
+    for name, client in (("sse", sse_client), ("websocket", websocket_client)):
+        await bench(app, client, clients=10, messages=1)  # Warm-up
+        results[name] = await bench(app, client, args.clients, args.messages)
+    results["websocket_cpu_saving"] = round(
+        1 - results["websocket"]["cpu_us_per_message"] / results["sse"]["cpu_us_per_message"], 3
+    )
+    results["settings"] = {
+        "clients": args.clients,
+        "messages_per_client": args.messages,
+        "tokens": args.tokens,
+        "burst": args.burst,
+        "delay": args.delay,
+        "flush_interval": performance_settings.SSE_FLUSH_INTERVAL,
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5, help="Messages per client")
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--burst", type=int, default=4, help="Tokens per upstream read")
+    parser.add_argument("--delay", type=float, default=0.005, help="Seconds between upstream reads")
+    parser.add_argument("--output", default=None, help="Write JSON results to this file")
+    args = parser.parse_args()
+    write_results("sse_vs_websocket", asyncio.run(main(args)), args.output)
@@ -0,0 +1,6 @@
+import os
+
+# Settings require an API key at import time; tests never call the upstream APIs
+os.environ.setdefault("POE_API_KEY", "test")
+# Analytics rollups stay in memory instead of going to analytics.db in the working directory
+os.environ.setdefault("ANALYTICS_DB_PATH", "")
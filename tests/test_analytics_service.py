@@ -0,0 +1,105 @@
+import asyncio
+
+from app.services.analytics_service import AnalyticsService
+from app.services.timeseries_store import TimeSeriesStore
+
+
+def _service(**kwargs):
+    service = AnalyticsService(**kwargs)
+    service.timeseries = TimeSeriesStore(path="")
+    return service
+
+
+def test_events_are_aggregated_by_the_background_worker():
+    async def run():
+        service = _service(flush_interval=0.01)
+        service.record_message("jadwal layanan kantor", 0.2)
+        service.record_message("jadwal layanan kantor", 0.4)
+        service.record_latency("retrieval", 0.01)
+        service.record_session_created()
+        # Recording never aggregates inline while a loop is running
+        assert service.message_count == 0
+        await asyncio.sleep(0.05)
+        
+        assert service.message_count == 2
+        assert service.session_count == 1
+        assert service.events_processed == 4
+        stats = service.get_stats()
+        assert stats["popular_queries"]["jadwal"] == 2
+        assert stats["avg_response_time_ms"] == 300.0
+        assert stats["pipeline"]["processed"] == 4
+        await service.stop()
+    
+    asyncio.run(run())
+
+
+def test_events_outside_an_event_loop_are_aggregated_inline():
+    service = _service()
+    service.record_message("halo", 0.1)
+    service.record_error("llm_service", "timeout")
+    assert (service.message_count, service.error_count) == (1, 1)
+
+
+def test_sampling_under_pressure_keeps_totals_unbiased():
+    async def run():
+        service = _service(queue_size=10, sample_watermark=0.5, sample_rate=4)
+        # No await between events: the worker cannot drain the queue meanwhile
+        for _ in range(25):
+            service.record_message("halo", 0.1)
+        assert service.events_sampled_out == 15
+        
+        # Errors are never sampled; a full queue drops them
+        service.record_error("llm_service", "timeout")
+        assert service.events_dropped == 1
+        
+        await service.flush()
+        assert service.message_count == 25
+        await service.stop()
+    
+    asyncio.run(run())
+
+
+def test_stop_drains_queued_events():
+    async def run():
+        service = _service()
+        for _ in range(3):
+            service.record_message("halo", 0.1)
+        await service.stop()
+        assert service.message_count == 3
+        assert service._worker is None
+    
+    asyncio.run(run())
+
+
+def test_events_queued_on_a_closed_loop_are_kept():
+    service = _service()
+    
+    async def record():
+        service.record_message("halo", 0.1)
+    
+    asyncio.run(record())
+    
+    async def next_loop():
+        # The first event on a new loop starts a new worker and aggregates the old queue
+        service.record_session_created()
+        await service.stop()
+    
+    asyncio.run(next_loop())
+    assert service.message_count == 1
+    assert service.session_count == 1
+
+
+def test_worker_stops_when_cancelled_as_an_event_arrives():
+    async def run():
+        service = _service(flush_interval=0.01)
+        service.record_session_created()
+        await asyncio.sleep(0.05)
+        # The worker waits for the next event; it arrives with the cancellation
+        service.record_message("halo", 0.1)
+        service._worker.cancel()
+        done, _ = await asyncio.wait({service._worker}, timeout=1.0)
+        assert done
+        # The event it had already taken is aggregated, not lost
+        assert service.message_count == 1
+    
+    asyncio.run(run())
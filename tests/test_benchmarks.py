@@ -0,0 +1,85 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import KnowledgeBase
+from benchmarks import compare
+from benchmarks.common import summarize
+from benchmarks.synthetic_kb import generate_data
+
+
+def test_synthetic_knowledge_base_is_deterministic():
+    assert generate_data(50, 20, seed=1) == generate_data(50, 20, seed=1)
+    assert generate_data(50, 20, seed=1) != generate_data(50, 20, seed=2)
+
+
+def test_synthetic_knowledge_base_is_valid_and_searchable():
+    kb = KnowledgeBase.from_dict(generate_data(500, 100))
+    assert len(kb.faq_texts) == 500
+    assert len(kb.services) == 100
+    assert len(set(kb.faq_questions)) == 500
+    
+    embedding_service = EnhancedEmbeddingService()
+    embedding_service.use_embeddings = False
+    service = ChatbotService(embedding_service=embedding_service)
+    query = "Berapa biaya membuat chatbot whatsapp?"
+    assert asyncio.run(service._find_similar_faq(query, kb))
+    assert service._find_relevant_services(query, kb)
+
+
+def test_summarize():
+    summary = summarize([0.001, 0.002, 0.003, 0.004], scale=1e3)
+    assert summary == {"count": 4, "mean": 2.5, "p50": 3.0, "p90": 4.0, "p99": 4.0, "max": 4.0}
+    assert summarize([]) == {"count": 0}
+
+
+def test_timing_directions():
+    assert compare.direction("ns_per_op") == -1
+    assert compare.direction("p99_ms") == -1
+    assert compare.direction("requests_per_s") == 1
+    assert compare.direction("bytes_per_cpu_s") == 1
+    assert compare.direction("spread") is None
+    assert compare.direction("ops") is None
+
+
+def _document(results):
+    return {"benchmark": "micro", "environment": {"commit": "abc"}, "results": results}
+
+
+def test_regressions_must_exceed_threshold_and_spread():
+    baseline = _document({
+        "fast": {"ns_per_op": 100.0, "spread": 0.01},
+        "noisy": {"ns_per_op": 100.0, "spread": 0.5},
+        "throughput": {"requests_per_s": 1000.0},
+        "removed": {"ns_per_op": 10.0},
+        "settings": {"size_ms": 1.0},
+    })
+    current = _document({
+        "fast": {"ns_per_op": 120.0, "spread": 0.01},
+        "noisy": {"ns_per_op": 140.0, "spread": 0.02},
+        "throughput": {"requests_per_s": 1500.0},
+        "added": {"ns_per_op": 1.0},
+        "settings": {"size_ms": 100.0},
+    })
+    report = compare.compare(baseline, current, threshold=0.1)
+    
+    assert [entry["path"] for entry in report["regressions"]] == ["fast/ns_per_op"]
+    assert [entry["path"] for entry in report["improvements"]] == ["throughput/requests_per_s"]
+    assert [entry["path"] for entry in report["unchanged"]] == ["noisy/ns_per_op"]
+    assert report["added"] == [{"path": "added/ns_per_op"}]
+    assert report["removed"] == [{"path": "removed/ns_per_op"}]
+
+
+@pytest.mark.parametrize("current, status", [(105.0, 0), (150.0, 1)])
+def test_compare_exit_status(tmp_path, monkeypatch, current, status):
+    paths = []
+    for name, value in (("baseline", 100.0), ("current", current)):
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps(_document({"case": {"ns_per_op": value}})))
+        paths.append(str(path))
+    monkeypatch.setattr(sys, "argv", ["compare", *paths])
+    assert compare.main() == status
@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.tenancy import get_chatbot_service
+from app.api.v1.endpoints import chat
+from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import DATA_PATH
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+QUERIES = [
+    "Apa layanan utama Atams?",
+    "Berapa harga chatbot AI?",
+    "Bagaimana cara menghubungi kalian?",
+    "Ceritakan tentang perusahaan ini",
+    "dashboard bisnis",
+]
+
+
+class _FakeLLM:
+    """Answers with the query; ``fail`` maps a query to the exception it raises"""
+    
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fail = {}
+        self.running = 0
+        self.max_running = 0
+    
+    async def generate_response(self, prompt, context, temperature, max_tokens, deadline=None):
+        query = next(query for query in QUERIES if query in prompt)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        if query in self.fail:
+            raise self.fail[query]
+        return f"answer: {query}"
+
+
+class _FakeEmbeddings(EnhancedEmbeddingService):
+    def __init__(self):
+        super().__init__()
+        self.use_embeddings = True
+        self.model = "fake"
+    
+    async def get_embeddings(self, texts, cache=True):
+        return np.stack([
+            np.frombuffer(hashlib.sha256(text.encode()).digest()[:8], dtype=np.uint8).astype(np.float32)
+            for text in texts
+        ])
+
+
+def _service(tmp_path, llm_service=None, embedding_service=None):
+    shutil.copy(SAMPLE_DATA, tmp_path / DATA_PATH)
+    if embedding_service is None:
+        embedding_service = EnhancedEmbeddingService()
+        embedding_service.use_embeddings = False
+    service = ChatbotService(
+        str(tmp_path / DATA_PATH),
+        artifact_dir=str(tmp_path / "artifacts"),
+        llm_service=llm_service or _FakeLLM(),
+        embedding_service=embedding_service,
+    )
+    
+    async def load():
+        await service.load()
+        await service.initialize_embeddings()
+    
+    asyncio.run(load())
+    return service
+
+
+def _client(service):
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+    app.dependency_overrides[get_chatbot_service] = lambda: service
+    return TestClient(app)
+
+
+def _batch(messages, **extra):
+    return {"messages": [{"message": message, "session_id": f"s{i}"} for i, message in enumerate(messages)], **extra}
+
+
+def test_results_stream_as_ndjson(tmp_path):
+    llm = _FakeLLM()
+    llm.fail = {QUERIES[1]: RuntimeError("upstream 500: secret details"), QUERIES[2]: DeadlineExceeded()}
+    service = _service(tmp_path, llm_service=llm)
+    response = _client(service).post("/chat/batch", json=_batch(QUERIES))
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results = {result["index"]: result for result in lines}
+    assert len(lines) == len(results) == len(QUERIES)
+    assert results[0]["response"] == f"answer: {QUERIES[0]}"
+    assert results[0]["session_id"] == "s0"
+    assert results[0]["latency_ms"] >= 0
+    # Internal error details stay in the log
+    assert results[1]["error"] == "Maaf, terjadi kesalahan. Silakan coba lagi."
+    assert results[2]["error"] == "Request deadline exceeded"
+    # Batch messages are stateless
+    assert service.sessions == {}
+
+
+def test_concurrency_is_bounded(tmp_path):
+    llm = _FakeLLM(delay=0.02)
+    service = _service(tmp_path, llm_service=llm)
+    response = _client(service).post("/chat/batch", json=_batch(QUERIES * 4, concurrency=2))
+    
+    assert len(response.text.splitlines()) == len(QUERIES) * 4
+    assert llm.max_running == 2
+
+
+def test_invalid_batches_are_rejected(tmp_path):
+    client = _client(_service(tmp_path))
+    assert client.post("/chat/batch", json={"messages": []}).status_code == 422
+    too_many = _batch(["halo"] * (settings.MAX_CHAT_BATCH_MESSAGES + 1))
+    assert client.post("/chat/batch", json=too_many).status_code == 422
+    assert client.post("/chat/batch", json=_batch(["halo"], concurrency=0)).status_code == 422
+
+
+@pytest.mark.parametrize("embeddings", [False, True], ids=["keywords", "embeddings"])
+def test_batch_retrieval_matches_single_messages(tmp_path, embeddings):
+    service = _service(tmp_path, embedding_service=_FakeEmbeddings() if embeddings else None)
+    
+    async def run():
+        kb = service.kb
+        batch = await service._find_relevant_info_batch(QUERIES, kb)
+        single = [await service._find_relevant_info(query, kb) for query in QUERIES]
+        return batch, single
+    
+    batch, single = asyncio.run(run())
+    assert batch == single
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1.endpoints import chat_ws
+from app.core.performance_config import performance_settings
+
+
+class _FakeService:
+    """Streams ``tokens``, one per ``delay``, and records how each stream ended"""
+    
+    def __init__(self, tokens, delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.sessions = {}
+        self.finished = []
+    
+    def create_session(self, session_id):
+        self.sessions.setdefault(session_id, [])
+        return session_id
+    
+    async def process_message_stream(self, request, deadline=None):
+        yield {"type": "session", "session_id": request.session_id}
+        completed = False
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield {"type": "content", "content": token}
+            completed = True
+        finally:
+            self.finished.append("completed" if completed else "closed")
+        yield {"type": "done", "session_id": request.session_id, "done": True}
+
+
+class _AllowAll:
+    async def check(self, key):
+        return True, 0.0
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = _FakeService(["a", "b", "c"])
+    
+    async def resolve(tenant_id):
+        return service
+    
+    monkeypatch.setattr(chat_ws, "resolve_chatbot_service", resolve)
+    monkeypatch.setattr(chat_ws, "_RATE_LIMIT", _AllowAll())
+    monkeypatch.setattr(performance_settings, "SSE_FLUSH_INTERVAL", 0.0)
+    return service
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(chat_ws.router)
+    return TestClient(app)
+
+
+def _receive_until(websocket, type):
+    messages = []
+    while True:
+        message = websocket.receive_json()
+        messages.append(message)
+        if message["type"] == type:
+            return messages
+
+
+def test_message_is_streamed(service):
+    with _client().websocket_connect("/ws?session_id=s1") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+        websocket.send_json({"type": "message", "message": "halo"})
+        messages = _receive_until(websocket, "done")
+    
+    assert [m["content"] for m in messages if m["type"] == "content"] == ["a", "b", "c"]
+    assert all(m["session_id"] == "s1" for m in messages)
+    assert service.finished == ["completed"]
+
+
+def test_cancel_stops_the_generation(service):
+    service.tokens, service.delay = ["x"] * 1000, 0.01
+    with _client().websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "message", "message": "halo"})
+        _receive_until(websocket, "content")
+        websocket.send_json({"type": "cancel"})
+        messages = _receive_until(websocket, "cancelled")
+        assert messages[-1]["done"] is True
+        # The connection stays usable
+        websocket.send_json({"type": "ping"})
+        assert _receive_until(websocket, "pong")
+    
+    assert service.finished == ["closed"]
+
+
+def test_disconnect_stops_the_generation(service):
+    service.tokens, service.delay = ["x"] * 1000, 0.01
+    with _client().websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "message", "message": "halo"})
+        _receive_until(websocket, "content")
+    
+    assert service.finished == ["closed"]
+
+
+def test_invalid_messages_are_answered_with_an_error(service):
+    with _client().websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        websocket.send_text("not json")
+        assert websocket.receive_json()["content"] == "Invalid message"
+        websocket.send_json({"type": "shutdown"})
+        assert websocket.receive_json()["content"] == "Invalid message"
+        websocket.send_json({"type": "message", "message": ""})
+        assert websocket.receive_json()["type"] == "error"
+
+
+def test_idle_connection_is_closed(service, monkeypatch):
+    monkeypatch.setattr(performance_settings, "WEBSOCKET_IDLE_TIMEOUT", 0.1)
+    with _client().websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            websocket.receive_json()
+    assert exc_info.value.code == chat_ws.NORMAL_CLOSURE
+
+
+def test_connection_waiting_for_a_response_is_not_idle(service, monkeypatch):
+    monkeypatch.setattr(performance_settings, "WEBSOCKET_IDLE_TIMEOUT", 0.1)
+    service.delay = 0.15
+    with _client().websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        websocket.send_json({"type": "message", "message": "halo"})
+        messages = _receive_until(websocket, "done")
+    assert [m["content"] for m in messages if m["type"] == "content"] == ["a", "b", "c"]
+
+
+def test_connections_over_the_cap_are_refused(service, monkeypatch):
+    monkeypatch.setattr(performance_settings, "WEBSOCKET_MAX_CONNECTIONS", 1)
+    client = _client()
+    with client.websocket_connect("/ws") as websocket:
+        websocket.receive_json()
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect("/ws"):
+                pass
+        assert exc_info.value.code == chat_ws.TRY_AGAIN_LATER
+    
+    # The slot is free again once the first connection is closed
+    with client.websocket_connect("/ws") as websocket:
+        assert websocket.receive_json()["type"] == "session"
+    assert chat_ws._open_connections == 0
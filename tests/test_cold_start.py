@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from app.core import http_client
+from app.services.analytics_service import get_analytics_service
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED_MODULES = ("numpy", "httpx", "watchfiles", "jose", "passlib")
+
+
+def _run(code):
+    """Run ``code`` in a fresh interpreter and return what it prints as JSON"""
+    env = dict(
+        os.environ, POE_API_KEY="test", VOYAGE_API_KEY="", STARTUP_WARM_HTTP_CONNECTIONS="0", ANALYTICS_DB_PATH=""
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_importing_the_app_defers_heavy_modules_and_singletons():
+    loaded = _run(
+        "import json, sys\n"
+        "import app.main\n"
+        "from app.api import tenancy\n"
+        "from app.services import analytics_service\n"
+        f"print(json.dumps({{\n"
+        f"    'modules': [m for m in {DEFERRED_MODULES!r} if m in sys.modules],\n"
+        "    'singletons': [tenancy._chatbot_service, tenancy._tenant_registry, analytics_service._analytics_service],\n"
+        "}))\n"
+    )
+    assert loaded == {"modules": [], "singletons": [None, None, None]}
+
+
+def test_first_request_without_a_lifespan_runs_startup():
+    result = _run(
+        "import json\n"
+        "from fastapi.testclient import TestClient\n"
+        "from app.main import app\n"
+        "from app.services.startup import readiness\n"
+        "client = TestClient(app)  # Not entered: no lifespan\n"
+        "response = client.get('/api/v1/chat/session/create')\n"
+        "print(json.dumps([response.status_code, readiness.state, client.get('/api/v1/health/ready').status_code]))\n"
+    )
+    assert result == [200, "ready", 200]
+
+
+def test_http_client_is_shared_per_event_loop():
+    async def clients():
+        return http_client.get_http_client(), http_client.get_http_client()
+    
+    first, same = asyncio.run(clients())
+    assert first is same
+    # A new event loop (tests, a serverless invocation) gets a new pool
+    second, _ = asyncio.run(clients())
+    assert second is not first
+    asyncio.run(http_client.close_http_client())
+
+
+def test_analytics_service_is_shared():
+    assert get_analytics_service() is get_analytics_service()
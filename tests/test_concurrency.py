@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.performance_middleware import (
+    AdaptiveLimiter,
+    ConcurrencyLane,
+    ConcurrencyLanes,
+    PerformanceMiddleware,
+)
+
+
+def test_fixed_limit_queues_then_sheds():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, max_queue=1, queue_timeout=0.05)
+        assert await limiter.acquire() is None
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        assert await limiter.acquire() == "queue_full"
+        assert await waiter == "queue_timeout"
+        assert limiter.waiting == 0
+    
+    asyncio.run(run())
+
+
+def test_released_slots_go_to_waiters_in_order():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, max_queue=10, queue_timeout=1.0)
+        await limiter.acquire()
+        order = []
+        
+        async def wait(name):
+            await limiter.acquire()
+            order.append(name)
+        
+        waiters = [asyncio.ensure_future(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        for _ in range(3):
+            limiter.release(0.01)
+            await asyncio.sleep(0)
+        await asyncio.gather(*waiters)
+        assert order == ["a", "b", "c"]
+        assert limiter.in_flight == 1
+    
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def run():
+        limiter = AdaptiveLimiter(1, 1, 1, max_queue=10, queue_timeout=1.0)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.waiting == 0
+        
+        limiter.release(0.01)
+        assert limiter.in_flight == 0
+        assert await limiter.acquire() is None
+    
+    asyncio.run(run())
+
+
+def test_limit_grows_while_used_and_backs_off_on_latency():
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=2, max_limit=20, backoff=0.5)
+    limiter.in_flight = 10
+    for _ in range(20):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    assert limiter.limit > 10
+    
+    grown = limiter.limit
+    limiter.in_flight += 1
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(grown * 0.5)
+    
+    # At most one decrease per round trip
+    limiter.in_flight += 1
+    limiter.release(1.0)
+    assert limiter.limit == pytest.approx(grown * 0.5)
+
+
+def test_failures_back_off_to_the_minimum():
+    limiter = AdaptiveLimiter(initial_limit=10, min_limit=4, max_limit=20, backoff=0.5)
+    for _ in range(5):
+        limiter.in_flight += 1
+        limiter._last_decrease = 0.0
+        limiter.release(0.1, dropped=True)
+    assert limiter.limit == 4
+
+
+def test_full_lane_answers_503_with_retry_after():
+    app = FastAPI()
+    release = asyncio.Event()
+    
+    @app.get("/api/v1/chat/message")
+    async def chat():
+        await release.wait()
+        return {"ok": True}
+    
+    @app.get("/api/v1/health")
+    async def health():
+        return {"ok": True}
+    
+    limiter = AdaptiveLimiter(1, 1, 1, max_queue=0, queue_timeout=1.0)
+    lanes = ConcurrencyLanes(
+        [ConcurrencyLane("chat", "/api/v1/chat/message", limiter), ConcurrencyLane("health", "/api/v1/health", None)],
+        ConcurrencyLane("interactive", "/", None),
+    )
+    middleware = PerformanceMiddleware(app, timeout=5.0, lanes=lanes)
+    
+    async def request(path):
+        messages = []
+        
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+        
+        async def send(message):
+            messages.append(message)
+        
+        scope = {
+            "type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "query_string": b"",
+            "headers": [], "scheme": "http", "server": ("test", 80), "client": ("1.2.3.4", 1), "root_path": "",
+        }
+        await middleware(scope, receive, send)
+        return messages[0]
+    
+    async def run():
+        first = asyncio.ensure_future(request("/api/v1/chat/message"))
+        await asyncio.sleep(0.01)
+        shed = await request("/api/v1/chat/message")
+        assert shed["status"] == 503
+        assert (b"retry-after", b"1") in shed["headers"]
+        # Other lanes are not affected
+        assert (await request("/api/v1/health"))["status"] == 200
+        release.set()
+        assert (await first)["status"] == 200
+        assert limiter.in_flight == 0
+    
+    asyncio.run(run())
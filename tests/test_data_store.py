@@ -0,0 +1,140 @@
+import asyncio
+import errno
+import gzip
+import json
+import os
+import stat
+
+import pytest
+
+from app.services.data_store import LEGACY_PREFIX, BackupStore, DataStore, atomic_write
+
+
+def _leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_atomic_write_replaces_the_file_and_keeps_its_mode(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_bytes(b"old")
+    os.chmod(path, 0o600)
+    atomic_write(str(path), b"new")
+    
+    assert path.read_bytes() == b"new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert _leftovers(tmp_path) == []
+
+
+def test_failed_atomic_write_keeps_the_old_file(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    path.write_bytes(b"old")
+    
+    def replace(src, dst):
+        raise OSError(errno.EACCES, "Permission denied")
+    
+    monkeypatch.setattr(os, "replace", replace)
+    with pytest.raises(OSError):
+        atomic_write(str(path), b"new")
+    assert path.read_bytes() == b"old"
+    assert _leftovers(tmp_path) == []
+
+
+def test_atomic_write_rewrites_a_bind_mounted_file_in_place(tmp_path, monkeypatch):
+    path = tmp_path / "data.json"
+    path.write_bytes(b"a much longer old content")
+    inode = os.stat(path).st_ino
+    
+    def replace(src, dst):
+        raise OSError(errno.EBUSY, "Device or resource busy")
+    
+    monkeypatch.setattr(os, "replace", replace)
+    atomic_write(str(path), b"new")
+    assert path.read_bytes() == b"new"
+    assert os.stat(path).st_ino == inode
+    assert _leftovers(tmp_path) == []
+
+
+def _objects(directory):
+    return sorted(os.listdir(os.path.join(directory, "objects")))
+
+
+def test_backups_are_compressed_and_deduplicated(tmp_path):
+    store = BackupStore(str(tmp_path))
+    first = store.create(b'{"v": 1}')
+    # Identical to the newest backup: nothing to do
+    assert store.create(b'{"v": 1}') is None
+    second = store.create(b'{"v": 2}')
+    third = store.create(b'{"v": 1}')
+    
+    assert [entry["id"] for entry in store.list()] == [third["id"], second["id"], first["id"]]
+    # Versions seen before share their object
+    assert third["filename"] == first["filename"]
+    assert len(_objects(tmp_path)) == 2
+    with gzip.open(tmp_path / first["filename"]) as f:
+        assert f.read() == b'{"v": 1}'
+    # The manifest is what a new process reads back
+    assert BackupStore(str(tmp_path)).list() == store.list()
+
+
+def test_retention_by_count_deletes_unreferenced_objects(tmp_path):
+    store = BackupStore(str(tmp_path), max_count=2)
+    for content in (b"a", b"b", b"c", b"b"):
+        store.create(content)
+    
+    entries = store.list()
+    assert len(entries) == 2
+    # "a" is gone, "c" and "b" are still referenced
+    assert _objects(tmp_path) == sorted(f"{entry['sha256']}.json.gz" for entry in entries)
+
+
+def test_retention_by_age(tmp_path, monkeypatch):
+    now = 1_700_000_000.0
+    monkeypatch.setattr("app.services.data_store.time.time", lambda: now)
+    store = BackupStore(str(tmp_path), max_age_days=1)
+    store.create(b"old")
+    now += 2 * 86400
+    store.create(b"new")
+    
+    assert [entry["size"] for entry in store.list()] == [3]
+    assert len(_objects(tmp_path)) == 1
+
+
+def test_legacy_backups_are_imported(tmp_path):
+    for i, content in enumerate((b'{"v": 1}', b'{"v": 2}')):
+        (tmp_path / f"{LEGACY_PREFIX}2024010{i + 1}_120000.json").write_bytes(content)
+    entries = BackupStore(str(tmp_path)).list()
+    
+    assert [entry["id"] for entry in entries] == ["20240102_120000", "20240101_120000"]
+    # The originals are left in place
+    assert len([name for name in os.listdir(tmp_path) if name.startswith(LEGACY_PREFIX)]) == 2
+
+
+def test_writes_back_up_the_previous_version(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"bot_config": {}, "company_data": {"v": 1}}))
+    store = DataStore(str(path), BackupStore(str(tmp_path / "backups")))
+    
+    async def run():
+        await store.write({"bot_config": {}, "company_data": {"v": 2}})
+        return await store.read(), await store.list_backups()
+    
+    data, backups = asyncio.run(run())
+    assert data["company_data"] == {"v": 2}
+    assert len(backups) == 1
+    with gzip.open(tmp_path / "backups" / backups[0]["filename"]) as f:
+        assert json.loads(f.read())["company_data"] == {"v": 1}
+
+
+def test_concurrent_section_updates_are_not_lost(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps({"bot_config": {}, "company_data": {}}))
+    store = DataStore(str(path), BackupStore(str(tmp_path / "backups")))
+    
+    async def run():
+        await asyncio.gather(
+            store.update_section("bot_config", {"name": "Bot"}),
+            store.update_section("company_data", {"company_name": "Company"}),
+        )
+        return await store.read()
+    
+    assert asyncio.run(run()) == {"bot_config": {"name": "Bot"}, "company_data": {"company_name": "Company"}}
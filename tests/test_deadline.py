@@ -0,0 +1,172 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.deadline import (
+    CANCEL_DEADLINE,
+    CANCEL_DISCONNECT,
+    GENERATIONS_CANCELLED,
+    ClientDisconnected,
+    Deadline,
+    DeadlineExceeded,
+    run_until_disconnected,
+)
+from app.services.llm_service import LLMService
+
+
+class _UpstreamStream(httpx.AsyncByteStream):
+    """SSE body that yields one chunk per ``delay`` and records being closed"""
+    
+    def __init__(self, tokens, delay):
+        self.tokens = tokens
+        self.delay = delay
+        self.sent = 0
+        self.closed = False
+    
+    async def __aiter__(self):
+        for token in self.tokens:
+            payload = {"choices": [{"delta": {"content": token}}]}
+            yield f"data: {json.dumps(payload)}\n\n".encode()
+            self.sent += 1
+            await asyncio.sleep(self.delay)
+        yield b"data: [DONE]\n\n"
+    
+    async def aclose(self):
+        self.closed = True
+
+
+def _upstream(monkeypatch, tokens, delay=0.0):
+    stream = _UpstreamStream(tokens, delay)
+    
+    def handler(request):
+        return httpx.Response(200, stream=stream)
+    
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("app.services.llm_service.get_http_client", lambda: client)
+    return stream
+
+
+def _cancelled(reason):
+    return GENERATIONS_CANCELLED.labels(reason).value
+
+
+def test_header_can_only_shorten_the_deadline():
+    assert Deadline.from_headers({"X-Request-Timeout": "2"}, 30.0).remaining() <= 2.0
+    assert Deadline.from_headers({"X-Request-Timeout": "120"}, 30.0).remaining() > 29.0
+    for value in ("0", "-5", "soon"):
+        assert Deadline.from_headers({"X-Request-Timeout": value}, 30.0).remaining() > 29.0
+
+
+def test_expired_deadline():
+    deadline = Deadline(0.0)
+    assert deadline.expired
+    assert deadline.timeout(30.0) == 0.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+    assert Deadline(10.0).timeout(5.0) == 5.0
+
+
+def test_stream_completes(monkeypatch):
+    stream = _upstream(monkeypatch, ["a", "b", "c"])
+    
+    async def run():
+        return [token async for token in LLMService().generate_response_stream("hi", deadline=Deadline(5.0))]
+    
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert stream.closed
+
+
+def test_closing_the_stream_closes_upstream(monkeypatch):
+    stream = _upstream(monkeypatch, ["a", "b", "c", "d"])
+    before = _cancelled(CANCEL_DISCONNECT)
+    
+    async def run():
+        generator = LLMService().generate_response_stream("hi")
+        assert await generator.__anext__() == "a"
+        await generator.aclose()
+    
+    asyncio.run(run())
+    assert stream.closed
+    assert stream.sent < 4
+    assert _cancelled(CANCEL_DISCONNECT) == before + 1
+
+
+def test_expired_deadline_stops_the_upstream_stream(monkeypatch):
+    stream = _upstream(monkeypatch, ["a", "b", "c", "d"], delay=0.1)
+    before = _cancelled(CANCEL_DEADLINE)
+    
+    async def run():
+        tokens = []
+        with pytest.raises(DeadlineExceeded):
+            async for token in LLMService().generate_response_stream("hi", deadline=Deadline(0.15)):
+                tokens.append(token)
+        return tokens
+    
+    assert asyncio.run(run()) == ["a", "b"]
+    assert stream.closed
+    assert stream.sent < 4
+    assert _cancelled(CANCEL_DEADLINE) == before + 1
+
+
+def test_expired_deadline_skips_the_upstream_call(monkeypatch):
+    stream = _upstream(monkeypatch, ["a"])
+    
+    async def run():
+        async for _ in LLMService().generate_response_stream("hi", deadline=Deadline(0.0)):
+            pass
+    
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert stream.sent == 0
+
+
+def _receive(disconnect_after=None):
+    async def receive():
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+    
+    return receive
+
+
+async def _work(seconds, state):
+    try:
+        await asyncio.sleep(seconds)
+        return "done"
+    except asyncio.CancelledError as e:
+        state["cancelled"] = e.args
+        raise
+
+
+def test_run_until_disconnected_returns_the_result():
+    async def run():
+        state = {}
+        result = await run_until_disconnected(_receive(), _work(0.0, state), Deadline(5.0))
+        return result, state
+    
+    assert asyncio.run(run()) == ("done", {})
+
+
+def test_disconnect_cancels_the_work():
+    async def run():
+        state = {}
+        with pytest.raises(ClientDisconnected):
+            await run_until_disconnected(_receive(0.01), _work(5.0, state), Deadline(5.0))
+        await asyncio.sleep(0)
+        return state
+    
+    assert asyncio.run(run()) == {"cancelled": (CANCEL_DISCONNECT,)}
+
+
+def test_deadline_cancels_the_work():
+    async def run():
+        state = {}
+        with pytest.raises(DeadlineExceeded):
+            await run_until_disconnected(_receive(), _work(5.0, state), Deadline(0.01), grace=0.01)
+        await asyncio.sleep(0)
+        return state
+    
+    assert asyncio.run(run()) == {"cancelled": (CANCEL_DEADLINE,)}
@@ -0,0 +1,175 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import admin
+from app.core.config import settings
+from app.services import diagnostics
+from app.services.diagnostics import CpuProfiler, MemoryTracer, ProfilerBusy, container_size, estimate_size
+
+
+def _spin(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_cpu_profile_samples_the_event_loop():
+    profiler = CpuProfiler(max_seconds=5.0, interval=0.002)
+    
+    async def run():
+        profiling = asyncio.ensure_future(profiler.profile(0.3))
+        # Let the sampler thread start, then block the loop
+        await asyncio.sleep(0.05)
+        _spin(0.15)
+        return await profiling
+    
+    profile = asyncio.run(run())
+    assert not profiler.running
+    assert profile.samples > 0
+    summary = profile.summary()
+    assert summary["samples"] == profile.samples
+    assert 0 < summary["busy_percent"] <= 100
+    assert any(entry["frame"].startswith("_spin (tests/test_diagnostics.py:") for entry in summary["top_self"])
+    
+    lines = profile.folded().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == profile.samples
+    assert any(";_spin (tests/test_diagnostics.py:" in line for line in lines)
+
+
+def test_one_cpu_profile_at_a_time():
+    profiler = CpuProfiler(max_seconds=5.0, interval=0.01)
+    
+    async def run():
+        first = asyncio.ensure_future(profiler.profile(0.1))
+        await asyncio.sleep(0)
+        assert profiler.running
+        with pytest.raises(ProfilerBusy):
+            await profiler.profile(0.1)
+        await first
+    
+    asyncio.run(run())
+    assert not profiler.running
+
+
+def test_cancelled_profile_stops_the_sampler():
+    profiler = CpuProfiler(max_seconds=60.0, interval=0.01)
+    
+    async def run():
+        profiling = asyncio.ensure_future(profiler.profile(60.0))
+        await asyncio.sleep(0.05)
+        profiling.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await profiling
+    
+    started = time.monotonic()
+    asyncio.run(run())
+    # asyncio.run waits for the sampler thread on shutdown
+    assert time.monotonic() - started < 5
+    assert not profiler.running
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "secret")
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/admin")
+    return TestClient(app)
+
+
+def test_diagnostics_require_the_admin_key(client, monkeypatch):
+    assert client.post("/admin/diagnostics/profile").status_code == 401
+    wrong = {"Authorization": "Bearer wrong"}
+    assert client.post("/admin/diagnostics/profile", headers=wrong).status_code == 401
+    monkeypatch.setattr(settings, "ADMIN_API_KEY", "")
+    assert client.post("/admin/diagnostics/profile").status_code == 404
+
+
+def test_profile_endpoint(client, monkeypatch):
+    monkeypatch.setattr(diagnostics.cpu_profiler, "interval", 0.01)
+    headers = {"Authorization": "Bearer secret"}
+    
+    response = client.post("/admin/diagnostics/profile?seconds=0.05", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-disposition"].startswith('attachment; filename="profile-')
+    assert response.json()["samples"] > 0
+    response = client.post("/admin/diagnostics/profile?seconds=0.05&format=folded", headers=headers)
+    assert response.headers["content-type"].startswith("text/plain")
+    assert client.post("/admin/diagnostics/profile?format=svg", headers=headers).status_code == 400
+    
+    # A profile is already running
+    monkeypatch.setattr(diagnostics.cpu_profiler, "_stop", threading.Event())
+    response = client.post("/admin/diagnostics/profile?seconds=0.05", headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "A profile is already running"
+
+
+def _allocate():
+    return [bytes(1000) for _ in range(2000)]
+
+
+def test_memory_tracer_reports_growth_since_the_baseline():
+    tracer = MemoryTracer(frames=5)
+    
+    async def run():
+        await tracer.start()
+        try:
+            kept = _allocate()
+            report = await tracer.report(limit=10, group_by="traceback")
+        finally:
+            stopped = tracer.stop()
+        return kept, report, stopped
+    
+    kept, report, stopped = asyncio.run(run())
+    assert report["tracing"] is True
+    assert report["overhead_bytes"] > 0
+    growth = report["growth"][0]
+    assert growth["location"].startswith("tests/test_diagnostics.py:")
+    assert growth["size_diff_bytes"] >= len(kept) * 1000
+    assert growth["count_diff"] >= len(kept)
+    assert any(frame.startswith("tests/test_diagnostics.py:") for frame in growth["traceback"])
+    assert stopped == {"tracing": False}
+    assert tracer.baseline is None
+
+
+def test_memory_report_without_tracing_is_empty():
+    assert asyncio.run(MemoryTracer(frames=1).report()) == {"tracing": False}
+
+
+def test_memory_report_rejects_unknown_grouping(client):
+    response = client.get("/admin/diagnostics/memory?group_by=module", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 400
+
+
+class _Node:
+    def __init__(self, payload):
+        self.payload = payload
+
+
+def test_estimate_size_counts_shared_objects_once():
+    payload = "x" * 10000
+    one = estimate_size([_Node(payload)])
+    shared = estimate_size([_Node(payload), _Node(payload)])
+    copies = estimate_size([_Node(payload), _Node("y" * 10000)])
+    assert one > 10000
+    assert shared < one + 1000
+    assert copies > one + 10000
+    # Classes and functions are referenced, not walked
+    assert estimate_size(_Node) == sys.getsizeof(_Node)
+
+
+def test_estimate_size_is_bounded():
+    nested = [[i] for i in range(1000)]
+    assert estimate_size(nested, limit=10) < estimate_size(nested)
+
+
+def test_container_size_extrapolates_from_a_sample():
+    items = {f"key{i}": f"{i:0100d}" for i in range(1000)}
+    exact = estimate_size(items)
+    assert abs(container_size(items, sample=50) - exact) / exact < 0.05
+    assert container_size([]) == sys.getsizeof([])
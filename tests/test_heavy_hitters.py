@@ -0,0 +1,54 @@
+import random
+
+from app.services.heavy_hitters import SpaceSaving
+
+
+def test_frequent_items_are_found_within_the_error_bound():
+    rng = random.Random(1)
+    counts = {}
+    sketch = SpaceSaving(capacity=50)
+    for _ in range(20000):
+        # A few heavy items over a long tail of rare ones
+        item = f"hot{rng.randrange(5)}" if rng.random() < 0.5 else f"cold{rng.randrange(5000)}"
+        counts[item] = counts.get(item, 0) + 1
+        sketch.add(item)
+    
+    assert len(sketch) == 50
+    top = sketch.top(5)
+    assert {item for item, _, _ in top} == {f"hot{i}" for i in range(5)}
+    for item, estimate, error in top:
+        assert counts[item] <= estimate <= counts[item] + error
+        assert error <= sketch.error_bound()
+
+
+def test_evicted_count_becomes_the_newcomer_error():
+    sketch = SpaceSaving(capacity=2)
+    sketch.add("a", 3)
+    sketch.add("b", 1)
+    sketch.add("c")
+    
+    assert dict((item, (count, error)) for item, count, error in sketch.top()) == {"a": (3, 0), "c": (2, 1)}
+
+
+def test_decay_favours_recent_items():
+    sketch = SpaceSaving(capacity=10, decay_seconds=60)
+    start = sketch._epoch
+    for _ in range(10):
+        sketch.add("old", now=start)
+    for _ in range(5):
+        sketch.add("new", now=start + 600)
+    
+    top = sketch.top(2, now=start + 600)
+    assert top[0][0] == "new"
+    assert abs(top[0][1] - 5) < 1e-6
+    assert top[1][1] < 0.01
+
+
+def test_decay_survives_long_idle_periods():
+    sketch = SpaceSaving(capacity=10, decay_seconds=1)
+    start = sketch._epoch
+    sketch.add("a", now=start)
+    # Far enough that the scale would overflow without renormalizing
+    sketch.add("b", now=start + 10000)
+    
+    assert sketch.top(1, now=start + 10000)[0][0] == "b"
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.kb_artifact import (
+    CURRENT_NAME,
+    current_version_dir,
+    load_artifact,
+    write_artifact,
+)
+from app.services.knowledge_base import DATA_PATH, load_knowledge_base, read_source
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+
+@pytest.fixture
+def kb():
+    faq_count = len(load_knowledge_base(SAMPLE_DATA).faq_texts)
+    embeddings = np.arange(faq_count * 4, dtype=np.float32).reshape(faq_count, 4) + 1
+    return load_knowledge_base(SAMPLE_DATA).with_embeddings(embeddings)
+
+
+def test_round_trip(kb, tmp_path):
+    write_artifact(kb, str(tmp_path), "model-a")
+    loaded = load_artifact(str(tmp_path), kb.source_hash, "model-a")
+    
+    assert loaded.bot_config == kb.bot_config
+    assert loaded.company_data == kb.company_data
+    assert loaded.faq_texts == kb.faq_texts
+    assert loaded.faq_questions == kb.faq_questions
+    assert loaded.services == kb.services
+    assert np.array_equal(loaded.faq_embeddings, kb.faq_embeddings)
+    assert np.array_equal(loaded.faq_unit_embeddings, kb.faq_unit_embeddings)
+    # Mapped read-only from the file, not copied
+    assert isinstance(loaded.faq_embeddings, np.memmap)
+    assert not loaded.faq_unit_embeddings.flags.writeable
+
+
+def test_artifact_without_embeddings(tmp_path):
+    kb = load_knowledge_base(SAMPLE_DATA)
+    write_artifact(kb, str(tmp_path), "model-a")
+    loaded = load_artifact(str(tmp_path), kb.source_hash, "model-a")
+    
+    assert loaded.faq_texts == kb.faq_texts
+    assert loaded.faq_embeddings is None
+
+
+def test_stale_or_missing_artifacts_are_ignored(kb, tmp_path):
+    assert load_artifact(str(tmp_path), kb.source_hash, "model-a") is None
+    write_artifact(kb, str(tmp_path), "model-a")
+    assert load_artifact(str(tmp_path), "0" * 64, "model-a") is None
+    
+    manifest_path = os.path.join(current_version_dir(str(tmp_path)), "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["format_version"] += 1
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    assert load_artifact(str(tmp_path), kb.source_hash, "model-a") is None
+
+
+def test_embeddings_of_another_model_are_left_out(kb, tmp_path):
+    write_artifact(kb, str(tmp_path), "model-a")
+    loaded = load_artifact(str(tmp_path), kb.source_hash, "model-b")
+    
+    assert loaded.faq_texts == kb.faq_texts
+    assert loaded.faq_embeddings is None
+
+
+def test_only_the_previous_version_is_kept(tmp_path):
+    data = tmp_path / "data.json"
+    artifact_dir = tmp_path / "artifacts"
+    os.makedirs(artifact_dir)
+    with open(SAMPLE_DATA) as f:
+        content = json.load(f)
+    names = []
+    for i in range(3):
+        content["company_data"]["company_name"] = f"Company {i}"
+        data.write_text(json.dumps(content))
+        version_dir = write_artifact(load_knowledge_base(str(data)), str(artifact_dir), None)
+        names.append(os.path.basename(version_dir))
+        # Pruning goes by modification time
+        os.utime(version_dir, (i, i))
+    
+    assert (artifact_dir / CURRENT_NAME).read_text() == names[-1]
+    assert sorted(os.listdir(artifact_dir)) == sorted([CURRENT_NAME] + names[1:])
+
+
+def test_service_loads_the_artifact_while_it_matches(tmp_path, kb):
+    data = tmp_path / "data.json"
+    data.write_bytes(read_source(SAMPLE_DATA)[0])
+    artifact_dir = str(tmp_path / "artifacts")
+    os.makedirs(artifact_dir)
+    write_artifact(kb, artifact_dir, "model-a")
+    
+    embedding_service = EnhancedEmbeddingService()
+    embedding_service.use_embeddings = True
+    embedding_service.model = "model-a"
+    
+    async def no_api_calls(texts, cache=True):
+        raise AssertionError("embeddings should come from the artifact")
+    
+    embedding_service.get_embeddings = no_api_calls
+    service = ChatbotService(str(data), artifact_dir, embedding_service=embedding_service)
+    
+    async def run():
+        await service.load()
+        await service.initialize_embeddings()
+        return service.kb
+    
+    loaded = asyncio.run(run())
+    assert isinstance(loaded.faq_embeddings, np.memmap)
+    
+    # Edited data.json: the artifact is stale, data.json is parsed instead
+    embedding_service.use_embeddings = False
+    data.write_text(data.read_text().replace(kb.company_data.company_name, "Renamed"))
+    assert asyncio.run(service.load()).company_data.company_name == "Renamed"
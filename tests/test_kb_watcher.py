@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+import pytest
+
+from app.services.kb_watcher import KnowledgeBaseWatcher
+
+
+@pytest.fixture(params=["polling", "notifications"])
+def mode(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr("app.services.kb_watcher._load_awatch", lambda: None)
+    else:
+        pytest.importorskip("watchfiles")
+    return request.param
+
+
+def _write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+async def _wait_for_calls(calls, count, timeout=3.0):
+    loop = asyncio.get_running_loop()
+    give_up = loop.time() + timeout
+    while len(calls) < count and loop.time() < give_up:
+        await asyncio.sleep(0.02)
+
+
+def test_burst_of_writes_is_reloaded_once(tmp_path, mode):
+    path = str(tmp_path / "data.json")
+    _write(path, "{}")
+    calls = []
+    
+    async def on_change():
+        with open(path) as f:
+            calls.append(f.read())
+    
+    async def run():
+        watcher = KnowledgeBaseWatcher(path, on_change, debounce=0.2, poll_interval=0.05)
+        watcher.start()
+        await asyncio.sleep(0.2)
+        for i in range(5):
+            _write(path, f'{{"step": {i}}}')
+            await asyncio.sleep(0.005)
+        await _wait_for_calls(calls, 1)
+        # Nothing further once the file has settled
+        await asyncio.sleep(0.5)
+        await watcher.stop()
+    
+    asyncio.run(run())
+    assert calls == ['{"step": 4}']
+
+
+def test_file_replaced_by_rename_is_picked_up(tmp_path, mode):
+    path = str(tmp_path / "data.json")
+    _write(path, "{}")
+    calls = []
+    
+    async def on_change():
+        calls.append(True)
+    
+    async def run():
+        watcher = KnowledgeBaseWatcher(path, on_change, debounce=0.1, poll_interval=0.05)
+        watcher.start()
+        await asyncio.sleep(0.2)
+        _write(path + ".tmp", '{"replaced": true}')
+        os.replace(path + ".tmp", path)
+        await _wait_for_calls(calls, 1)
+        await watcher.stop()
+    
+    asyncio.run(run())
+    assert calls
+
+
+def test_removed_file_keeps_the_knowledge_base(tmp_path, mode):
+    path = str(tmp_path / "data.json")
+    _write(path, "{}")
+    calls = []
+    
+    async def on_change():
+        calls.append(True)
+    
+    async def run():
+        watcher = KnowledgeBaseWatcher(path, on_change, debounce=0.1, poll_interval=0.05)
+        watcher.start()
+        await asyncio.sleep(0.2)
+        os.remove(path)
+        await asyncio.sleep(0.6)
+        await watcher.stop()
+    
+    asyncio.run(run())
+    assert calls == []
+
+
+def test_failed_reload_keeps_watching(tmp_path, mode):
+    path = str(tmp_path / "data.json")
+    _write(path, "{}")
+    calls = []
+    
+    async def on_change():
+        calls.append(True)
+        if len(calls) == 1:
+            raise ValueError("invalid data.json")
+    
+    async def run():
+        watcher = KnowledgeBaseWatcher(path, on_change, debounce=0.1, poll_interval=0.05)
+        watcher.start()
+        await asyncio.sleep(0.2)
+        _write(path, "{not json")
+        await _wait_for_calls(calls, 1)
+        await asyncio.sleep(0.1)
+        _write(path, '{"fixed": true}')
+        await _wait_for_calls(calls, 2)
+        await watcher.stop()
+    
+    asyncio.run(run())
+    assert len(calls) == 2
@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from app.models.chat import ChatRequest
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import DATA_PATH
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+
+def _vector(text):
+    digest = hashlib.sha256(text.encode()).digest()
+    return np.frombuffer(digest[:8], dtype=np.uint8).astype(np.float32) + 1.0
+
+
+class _FakeEmbeddings(EnhancedEmbeddingService):
+    """
+    Deterministic embeddings; ``gate`` holds every call until it is set
+    and ``fail`` makes calls fail like an unavailable API
+    """
+    
+    def __init__(self, gate=None):
+        super().__init__()
+        self.use_embeddings = True
+        self.model = "fake"
+        self.gate = gate
+        self.fail = False
+        self.calls = []
+    
+    async def get_embeddings(self, texts, cache=True):
+        self.calls.append(list(texts))
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            return None
+        return np.stack([_vector(text) for text in texts])
+
+
+class _EchoLLM:
+    """Answers with the prompt, after running ``during_call`` (if any)"""
+    
+    def __init__(self):
+        self.during_call = None
+    
+    async def generate_response(self, prompt, context, temperature, max_tokens, deadline=None):
+        if self.during_call is not None:
+            await self.during_call()
+        return prompt
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / DATA_PATH
+    shutil.copy(SAMPLE_DATA, path)
+    return str(path)
+
+
+def _edit(path, change):
+    with open(path) as f:
+        data = json.load(f)
+    change(data)
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def _rename_company(name):
+    def change(data):
+        data["company_data"]["company_name"] = name
+    
+    return change
+
+
+def _service(data_path, tmp_path, embedding_service=None, llm_service=None):
+    if embedding_service is None:
+        embedding_service = EnhancedEmbeddingService()
+        embedding_service.use_embeddings = False
+    return ChatbotService(
+        data_path,
+        artifact_dir=str(tmp_path / "artifacts"),
+        llm_service=llm_service or _EchoLLM(),
+        embedding_service=embedding_service,
+    )
+
+
+def test_reload_swaps_in_a_new_snapshot(data_path, tmp_path):
+    async def run():
+        service = _service(data_path, tmp_path)
+        old = await service.load()
+        _edit(data_path, _rename_company("Renamed"))
+        new = await service.reload()
+        return service, old, new
+    
+    service, old, new = asyncio.run(run())
+    assert service.kb is new
+    assert new.version > old.version
+    assert new.company_data.company_name == "Renamed"
+    # The old snapshot is left as it was for requests still using it
+    assert old.company_data.company_name != "Renamed"
+    # Unchanged sections are shared, not rebuilt
+    assert new.bot_config is old.bot_config
+    assert new.faq_texts is old.faq_texts
+
+
+def test_unchanged_file_keeps_the_snapshot(data_path, tmp_path):
+    async def run():
+        service = _service(data_path, tmp_path)
+        old = await service.load()
+        return old, await service.reload()
+    
+    old, new = asyncio.run(run())
+    assert new is old
+
+
+def test_invalid_file_keeps_the_current_snapshot(data_path, tmp_path):
+    async def run():
+        service = _service(data_path, tmp_path)
+        old = await service.load()
+        with open(data_path, "w") as f:
+            f.write("{not json")
+        with pytest.raises(ValueError):
+            await service.reload()
+        return service, old
+    
+    service, old = asyncio.run(run())
+    assert service.kb is old
+
+
+def test_snapshot_is_swapped_only_once_embedded(data_path, tmp_path):
+    async def run():
+        gate = asyncio.Event()
+        service = _service(data_path, tmp_path, embedding_service=_FakeEmbeddings(gate))
+        await service.load()
+        gate.set()
+        await service.initialize_embeddings()
+        old = service.kb
+        
+        gate.clear()
+        _edit(data_path, lambda data: data["company_data"]["faq"].append({"question": "New?", "answer": "Yes."}))
+        reload = asyncio.ensure_future(service.reload())
+        while len(service.embedding_service.calls) < 2 and not reload.done():
+            await asyncio.sleep(0.01)
+        # Still embedding: requests are served from the old snapshot
+        assert service.kb is old
+        gate.set()
+        new = await reload
+        return service, old, new
+    
+    service, old, new = asyncio.run(run())
+    assert service.kb is new
+    assert len(new.faq_texts) == len(old.faq_texts) + 1
+    assert new.faq_embeddings.shape == (len(new.faq_texts), 8)
+    assert len(old.faq_embeddings) == len(old.faq_texts)
+
+
+def test_snapshot_embeddings_are_read_only(data_path, tmp_path):
+    async def run():
+        service = _service(data_path, tmp_path, embedding_service=_FakeEmbeddings())
+        await service.load()
+        await service.initialize_embeddings()
+        return service.kb
+    
+    kb = asyncio.run(run())
+    with pytest.raises(ValueError):
+        kb.faq_embeddings[0, 0] = 0.0
+    with pytest.raises(ValueError):
+        kb.faq_unit_embeddings[0, 0] = 0.0
+
+
+def test_request_keeps_its_snapshot_during_a_reload(data_path, tmp_path):
+    async def run():
+        llm = _EchoLLM()
+        service = _service(data_path, tmp_path, llm_service=llm)
+        old = await service.load()
+        
+        async def reload_mid_request():
+            _edit(data_path, _rename_company("Renamed"))
+            await service.reload()
+        
+        llm.during_call = reload_mid_request
+        first = await service.process_message(ChatRequest(message="Apa layanan utama?", session_id="s"))
+        llm.during_call = None
+        second = await service.process_message(ChatRequest(message="Apa layanan utama?", session_id="s"))
+        return old, first, second
+    
+    old, first, second = asyncio.run(run())
+    assert f"assistant for {old.company_data.company_name}." in first.response
+    assert "assistant for Renamed." in second.response
+
+
+def _faq_text(item):
+    return f"{item['question']} {item['answer']}"
+
+
+def test_reload_embeds_only_new_and_edited_faq_items(data_path, tmp_path):
+    embeddings = _FakeEmbeddings()
+    
+    def change(data):
+        faq = data["company_data"]["faq"]
+        faq[0]["answer"] = "Jawaban baru."
+        faq.append({"question": "Ada promo?", "answer": "Ada."})
+        faq.insert(1, faq.pop(2))
+    
+    async def run():
+        service = _service(data_path, tmp_path, embedding_service=embeddings)
+        await service.load()
+        await service.initialize_embeddings()
+        old = service.kb
+        _edit(data_path, change)
+        return old, await service.reload()
+    
+    old, new = asyncio.run(run())
+    faq = new.company_data.faq
+    assert embeddings.calls[1] == [_faq_text(faq[0]), _faq_text(faq[-1])]
+    # Every row lines up with its FAQ item, reused or not
+    expected = np.stack([_vector(text) for text in new.faq_texts])
+    assert np.array_equal(new.faq_embeddings, expected)
+
+
+def test_failed_embedding_keeps_the_other_rows_and_is_retried(data_path, tmp_path):
+    embeddings = _FakeEmbeddings()
+    
+    async def run():
+        service = _service(data_path, tmp_path, embedding_service=embeddings)
+        await service.load()
+        await service.initialize_embeddings()
+        old = service.kb
+        
+        embeddings.fail = True
+        _edit(data_path, lambda data: data["company_data"]["faq"].append({"question": "Ada promo?", "answer": "Ada."}))
+        failed = await service.reload()
+        
+        embeddings.fail = False
+        # Same file: reloaded anyway, to embed the rows that failed
+        retried = await service.reload()
+        return old, failed, retried
+    
+    old, failed, retried = asyncio.run(run())
+    assert np.array_equal(failed.faq_embeddings[:-1], old.faq_embeddings)
+    assert not failed.faq_embeddings[-1].any()
+    assert embeddings.calls[-1] == [failed.faq_texts[-1]]
+    assert np.array_equal(retried.faq_embeddings[-1], _vector(retried.faq_texts[-1]))
+    assert np.array_equal(retried.faq_embeddings[:-1], old.faq_embeddings)
@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from app.services.latency_histogram import LatencyTracker, LogHistogram, WindowedHistogram
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-3, 1.0) for _ in range(20000)]
+    histogram = LogHistogram(relative_accuracy=0.02)
+    for value in values:
+        histogram.record(value)
+    
+    for q in (0.5, 0.9, 0.99):
+        exact = _exact_quantile(values, q)
+        assert abs(histogram.quantile(q) - exact) <= 0.02 * exact
+    assert histogram.count == len(values)
+    assert histogram.max == max(values)
+
+
+def test_values_outside_the_range_are_clamped():
+    histogram = LogHistogram(min_value=0.001, max_value=10.0)
+    histogram.record(0.0)
+    histogram.record(1000.0)
+    assert histogram.counts[0] == 1
+    assert histogram.counts[-1] == 1
+    # The top bucket stands for anything above max_value; the exact max is kept apart
+    assert histogram.quantile(1.0) <= 10.0
+    assert histogram.max == 1000.0
+
+
+def test_merge_equals_recording_everything_in_one():
+    first, second, combined = LogHistogram(), LogHistogram(), LogHistogram()
+    for i in range(1, 500):
+        value = i / 1000
+        (first if i % 2 else second).record(value)
+        combined.record(value)
+    first.merge(second)
+    
+    assert list(first.counts) == list(combined.counts)
+    assert first.count == combined.count
+    assert first.quantile(0.9) == combined.quantile(0.9)
+
+
+def test_merge_rejects_different_layouts():
+    with pytest.raises(ValueError):
+        LogHistogram(relative_accuracy=0.02).merge(LogHistogram(relative_accuracy=0.05))
+
+
+def test_window_only_covers_recent_slots():
+    histogram = WindowedHistogram(slot_seconds=10, num_slots=6)
+    histogram.record(1.0, now=0)
+    histogram.record(2.0, now=55)
+    
+    assert histogram.window(10, now=59).count == 1
+    assert histogram.window(60, now=59).count == 2
+    # Slot 0 is reused (and reset) a full ring later
+    histogram.record(3.0, now=60)
+    assert histogram.window(60, now=60).count == 2
+    assert histogram.all_time.count == 3
+
+
+def test_tracker_ignores_series_beyond_the_cap():
+    tracker = LatencyTracker(max_series=1)
+    tracker.record("message", "total", 0.1)
+    tracker.record("message", "llm", 0.1)
+    assert list(tracker.series) == [("message", "total")]
@@ -0,0 +1,89 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import metrics as metrics_endpoint
+from app.core.metrics import CONTENT_TYPE, MetricsRegistry
+
+
+def test_counter_exposition():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests", ["route", "status"])
+    requests.labels("/chat", "200").inc()
+    requests.labels("/chat", "200").inc(2)
+    requests.labels('/a"b\\c\nd', "500").inc()
+    
+    assert registry.render() == (
+        "# HELP app_requests_total Requests\n"
+        "# TYPE app_requests_total counter\n"
+        'app_requests_total{route="/chat",status="200"} 3\n'
+        'app_requests_total{route="/a\\"b\\\\c\\nd",status="500"} 1\n'
+    )
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    registry = MetricsRegistry()
+    items = []
+    gauge = registry.gauge("app_items", "Items")
+    gauge.set_function(lambda: len(items))
+    items.extend([1, 2])
+    assert "app_items 2\n" in registry.render()
+    
+    failing = registry.gauge("app_broken", "Broken")
+    failing.set_function(lambda: 1 / 0)
+    assert "app_broken NaN\n" in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("app_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    child = latency.labels("llm")
+    for value in (0.05, 0.1, 0.5, 5.0):
+        child.observe(value)
+    
+    assert registry.render().splitlines()[2:] == [
+        'app_seconds_bucket{stage="llm",le="0.1"} 2',
+        'app_seconds_bucket{stage="llm",le="1"} 3',
+        'app_seconds_bucket{stage="llm",le="+Inf"} 4',
+        'app_seconds_sum{stage="llm"} 5.65',
+        'app_seconds_count{stage="llm"} 4',
+    ]
+
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("app_total", "Total")
+    assert registry.counter("app_total", "Total") is first
+    with pytest.raises(ValueError):
+        registry.gauge("app_total", "Total")
+    with pytest.raises(ValueError):
+        first.labels("unexpected")
+
+
+def test_unlabelled_metrics_render_without_braces():
+    registry = MetricsRegistry()
+    registry.counter("app_total", "Total").inc(0.5)
+    assert registry.render().endswith("app_total 0.5\n")
+
+
+def test_special_values():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("app_value", "Value", ["case"])
+    gauge.labels("up").set(float("inf"))
+    gauge.labels("down").set(float("-inf"))
+    gauge.labels("large").set(1e20)
+    assert registry.render().splitlines()[2:] == [
+        'app_value{case="up"} +Inf',
+        'app_value{case="down"} -Inf',
+        'app_value{case="large"} 100000000000000000000',
+    ]
+
+
+def test_metrics_endpoint():
+    app = FastAPI()
+    app.include_router(metrics_endpoint.router)
+    response = TestClient(app).get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert "# TYPE atabot_upstream_requests_total counter" in response.text
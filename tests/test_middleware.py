@@ -0,0 +1,85 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.performance_middleware import ConcurrencyLane, ConcurrencyLanes, PerformanceMiddleware
+from app.middleware.rate_limiting import RateLimitMiddleware, RateLimitPolicy, RouteRateLimiter
+
+
+def _app():
+    app = FastAPI()
+    
+    @app.get("/api/v1/chat/history")
+    async def history():
+        return {"ok": True}
+    
+    @app.get("/api/v1/health")
+    async def health():
+        return {"ok": True}
+    
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(1)
+        return {"ok": True}
+    
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for _ in range(3):
+                await asyncio.sleep(0.05)
+                yield b"x"
+        return StreamingResponse(body())
+    
+    return app
+
+
+def test_rate_limit_policies_by_route():
+    app = _app()
+    limiter = RouteRateLimiter(
+        policies=[
+            RateLimitPolicy("chat", "/api/v1/chat", "2/60"),
+            RateLimitPolicy("health", "/api/v1/health", ""),
+        ],
+        default=RateLimitPolicy("default", "/", "100/60"),
+    )
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    client = TestClient(app)
+    
+    assert [client.get("/api/v1/chat/history").status_code for _ in range(2)] == [200, 200]
+    response = client.get("/api/v1/chat/history")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "30"
+    # Unlimited policies never reject
+    assert all(client.get("/api/v1/health").status_code == 200 for _ in range(10))
+
+
+def _unlimited_lanes():
+    return ConcurrencyLanes([], ConcurrencyLane("test", "/", None))
+
+
+def test_timeout_until_the_response_starts():
+    app = _app()
+    app.add_middleware(PerformanceMiddleware, timeout=0.05, lanes=_unlimited_lanes())
+    client = TestClient(app)
+    
+    assert client.get("/slow").status_code == 408
+    # A started stream may run longer than the timeout
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.content == b"xxx"
+
+
+def test_non_http_scopes_pass_through():
+    seen = []
+    
+    async def app(scope, receive, send):
+        seen.append(scope["type"])
+    
+    async def run():
+        for middleware in (RateLimitMiddleware(app), PerformanceMiddleware(app, lanes=_unlimited_lanes())):
+            await middleware({"type": "lifespan"}, None, None)
+    
+    asyncio.run(run())
+    assert seen == ["lifespan", "lifespan"]
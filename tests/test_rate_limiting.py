@@ -0,0 +1,64 @@
+import pytest
+
+from app.middleware.rate_limiting import RateLimiter, RateLimitPolicy
+
+
+def test_burst_then_reject_with_retry_after():
+    limiter = RateLimiter(max_requests=10, window_seconds=60, burst=3)
+    assert [limiter.is_allowed("a", now=0.0) for _ in range(3)] == [True, True, True]
+    
+    allowed, retry_after = limiter.check("a", now=0.0)
+    assert not allowed
+    assert retry_after == pytest.approx(6.0)
+    # Other keys have their own bucket
+    assert limiter.is_allowed("b", now=0.0)
+
+
+def test_tokens_refill_at_the_steady_rate():
+    limiter = RateLimiter(max_requests=10, window_seconds=60, burst=2)
+    assert limiter.is_allowed("a", now=0.0)
+    assert limiter.is_allowed("a", now=0.0)
+    assert not limiter.is_allowed("a", now=5.9)
+    assert limiter.is_allowed("a", now=6.0)
+    assert not limiter.is_allowed("a", now=6.0)
+
+
+def test_rejected_requests_do_not_consume_tokens():
+    limiter = RateLimiter(max_requests=1, window_seconds=10)
+    assert limiter.is_allowed("a", now=0.0)
+    for _ in range(5):
+        assert not limiter.is_allowed("a", now=1.0)
+    assert limiter.is_allowed("a", now=10.0)
+
+
+def test_idle_keys_are_evicted():
+    limiter = RateLimiter(max_requests=10, window_seconds=10, evict_every=1, evict_batch=16)
+    for i in range(10):
+        limiter.is_allowed(f"key{i}", now=0.0)
+    assert len(limiter.tat) == 10
+    
+    # Every bucket has refilled by now, so the next check drops them
+    limiter.is_allowed("busy", now=5.0)
+    assert set(limiter.tat) == {"busy"}
+
+
+def test_eviction_keeps_keys_that_are_still_limited():
+    limiter = RateLimiter(max_requests=1, window_seconds=100, evict_every=1)
+    limiter.is_allowed("limited", now=0.0)
+    limiter.is_allowed("other", now=50.0)
+    assert "limited" in limiter.tat
+
+
+def test_parse_specs():
+    assert RateLimitPolicy._parse("") is None
+    assert RateLimitPolicy._parse("0") is None
+    
+    limiter = RateLimitPolicy._parse("20/60/5")
+    assert (limiter.max_requests, limiter.window_seconds, limiter.burst) == (20, 60, 5)
+    assert RateLimitPolicy._parse("20/60").burst == 20
+
+
+@pytest.mark.parametrize("spec", ["0/60", "20/0", "20/60/0", "20", "a/60", "1/2/3/4"])
+def test_parse_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        RateLimitPolicy._parse(spec)
@@ -0,0 +1,105 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.input_validation import SCOPE_BODY, SCOPE_MESSAGE, SCOPE_QUERY, validation_engine
+from app.middleware.security import SecurityMiddleware
+from app.models.chat import ChatRequest
+
+
+def _client():
+    app = FastAPI()
+    
+    @app.post("/api/v1/chat/message")
+    async def message(request: ChatRequest):
+        return {"message": request.message}
+    
+    @app.get("/api/v1/health")
+    async def health():
+        return {"status": "ok"}
+    
+    app.add_middleware(SecurityMiddleware)
+    return TestClient(app)
+
+
+def _chunks(size, chunk_size=8192):
+    yield b'{"message": "'
+    for _ in range(size // chunk_size):
+        yield b"a" * chunk_size
+    yield b'"}'
+
+
+@pytest.mark.parametrize("text, rule", [
+    ("<SCRIPT>alert(1)</script>", "script_tag"),
+    ("see data:text/html,<b>", "data_html"),
+    ("halo", None),
+    # Chat text may talk about code
+    ("apa itu javascript: di href?", None),
+])
+def test_message_rules(text, rule):
+    assert validation_engine.find(SCOPE_MESSAGE, text) == rule
+
+
+def test_query_only_rules():
+    assert validation_engine.find(SCOPE_QUERY, "q=<img onerror=alert(1)>") == "event_handler"
+    assert validation_engine.find(SCOPE_QUERY, "session_id=abc") is None
+
+
+def test_body_scan_finds_matches_split_across_chunks():
+    scanner = validation_engine.scanner(1 << 20)
+    assert scanner.feed(b'{"message": "<scr') is None
+    assert scanner.feed(b'ipt>"}') == "script_tag"
+
+
+def test_body_scanner_caps_size_without_scanning():
+    scanner = validation_engine.scanner(10, scan=False)
+    assert scanner.feed(b"<script>") is None
+    assert scanner.feed(b"abc") == scanner.TOO_LARGE
+
+
+def test_chat_request_validation():
+    assert ChatRequest(message="  <b>halo</b>\n").message == "  <b>halo</b>\n"
+    with pytest.raises(ValidationError):
+        ChatRequest(message="   ")
+    with pytest.raises(ValidationError):
+        ChatRequest(message="x" * (settings.MAX_MESSAGE_LENGTH + 1))
+    with pytest.raises(ValidationError):
+        ChatRequest(message="<script>alert(1)</script>")
+
+
+def test_suspicious_query_and_body_are_rejected():
+    client = _client()
+    assert client.get("/api/v1/health", params={"q": "<script>"}).status_code == 400
+    assert client.post("/api/v1/chat/message", json={"message": "halo"}).json() == {"message": "halo"}
+    
+    response = client.post("/api/v1/chat/message", json={"message": "x", "context": "<script>"})
+    assert response.status_code == 400
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+@pytest.mark.parametrize("headers", [{}, {"content-type": "application/json"}, {"content-type": "application/vnd.api+json"}])
+def test_bodies_decoded_as_json_are_scanned(headers):
+    response = _client().post(
+        "/api/v1/chat/message", content=b'{"message": "x", "note": "<script>"}', headers=headers
+    )
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("headers", [{}, {"content-type": "text/plain"}, {"content-type": "application/json"}])
+def test_chunked_bodies_are_capped_whatever_the_content_type(headers):
+    # A generator body is sent chunked, without content-length
+    response = _client().post("/api/v1/chat/message", content=_chunks(120 * 1024), headers=headers)
+    assert response.status_code == 413
+
+
+def test_declared_length_over_the_cap_is_rejected_up_front():
+    response = _client().post("/api/v1/chat/message", content=b"x" * (settings.MAX_CHAT_BODY_BYTES + 1))
+    assert response.status_code == 413
+
+
+def test_other_bodies_are_not_scanned():
+    response = _client().post("/api/v1/chat/message", content=b"<script>", headers={"content-type": "text/plain"})
+    # Not decoded as JSON by FastAPI either, so the request fails validation instead
+    assert response.status_code == 422
@@ -0,0 +1,176 @@
+import asyncio
+import gc
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from app.services import shared_embeddings
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import DATA_PATH
+from app.services.shared_embeddings import LOCK_SUFFIX, SEGMENT_SUFFIX, SWEEP_MIN_AGE, SharedEmbeddingStore
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+
+def _matrices(rows=4, dim=3):
+    embeddings = np.arange(rows * dim, dtype=np.float32).reshape(rows, dim) + 1.0
+    return embeddings, embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def _segment(store, key):
+    return os.path.join(store.directory, key + SEGMENT_SUFFIX)
+
+
+def _publish(store, key):
+    return asyncio.run(store.publish(key, *_matrices()))
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedEmbeddingStore(str(tmp_path / "shared"))
+
+
+def test_key_depends_on_the_model_and_every_text():
+    key = SharedEmbeddingStore.key("voyage", ["a", "b"])
+    assert key == SharedEmbeddingStore.key("voyage", ["a", "b"])
+    assert key != SharedEmbeddingStore.key("other", ["a", "b"])
+    assert key != SharedEmbeddingStore.key("voyage", ["a", "c"])
+    assert key != SharedEmbeddingStore.key("voyage", ["ab"])
+
+
+def test_missing_segment_is_not_attached(store):
+    assert asyncio.run(store.attach("missing")) is None
+
+
+def test_published_segment_is_mapped_read_only(store):
+    embeddings, unit_embeddings = _matrices()
+    mapped, unit_mapped = _publish(store, "k")
+    
+    np.testing.assert_array_equal(mapped, embeddings)
+    np.testing.assert_array_equal(unit_mapped, unit_embeddings)
+    assert isinstance(mapped.base, np.memmap)
+    assert not mapped.flags.writeable
+    # No temporary files left behind
+    assert os.listdir(store.directory) == ["k" + SEGMENT_SUFFIX]
+
+
+def test_segment_is_deleted_with_its_last_mapping(store, tmp_path):
+    publisher = _publish(store, "k")
+    # Another worker on the host
+    other = SharedEmbeddingStore(store.directory)
+    attached = asyncio.run(other.attach("k"))
+    np.testing.assert_array_equal(attached[0], publisher[0])
+    
+    del publisher
+    gc.collect()
+    assert os.path.exists(_segment(store, "k"))
+    
+    del attached
+    gc.collect()
+    assert not os.path.exists(_segment(store, "k"))
+
+
+def test_mapped_segment_is_not_collected(store):
+    shared = _publish(store, "k")
+    assert not store._collect("k")
+    del shared
+    gc.collect()
+    assert not store._collect("k")
+
+
+def test_sweep_deletes_old_unmapped_segments(store):
+    for key in ("old", "young", "mapped", "current"):
+        _publish(store, key)
+    gc.collect()
+    # Dropping the mappings deleted them; write them again, unmapped
+    for key in ("old", "young", "current"):
+        store._publish(key, *_matrices())
+    mapped = _publish(store, "mapped")
+    for key in ("old", "mapped", "current"):
+        _age(_segment(store, key), SWEEP_MIN_AGE + 1)
+    open(os.path.join(store.directory, "old" + LOCK_SUFFIX), "w").close()
+    
+    assert store._sweep(keep="current") == 1
+    remaining = sorted(os.listdir(store.directory))
+    assert remaining == ["current" + SEGMENT_SUFFIX, "mapped" + SEGMENT_SUFFIX, "young" + SEGMENT_SUFFIX]
+    assert mapped[0].shape == (4, 3)
+
+
+def test_one_worker_publishes_while_the_others_wait(store, monkeypatch):
+    monkeypatch.setattr(shared_embeddings, "POLL_INTERVAL", 0.01)
+    other = SharedEmbeddingStore(store.directory)
+    events = []
+    
+    async def worker(store, name):
+        async with store.publishing("k"):
+            events.append(f"{name} publishing")
+            await asyncio.sleep(0.05)
+            events.append(f"{name} done")
+    
+    async def run():
+        await asyncio.gather(worker(store, "first"), worker(other, "second"))
+    
+    asyncio.run(run())
+    assert events == ["first publishing", "first done", "second publishing", "second done"]
+
+
+def test_publishing_gives_up_waiting(store, monkeypatch):
+    monkeypatch.setattr(shared_embeddings, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(shared_embeddings, "PUBLISH_WAIT", 0.05)
+    other = SharedEmbeddingStore(store.directory)
+    
+    async def run():
+        async with store.publishing("k"):
+            async with other.publishing("k"):
+                return True
+    
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+class _FakeEmbeddings(EnhancedEmbeddingService):
+    def __init__(self):
+        super().__init__()
+        self.use_embeddings = True
+        self.model = "fake"
+        self.calls = 0
+    
+    async def get_embeddings(self, texts, cache=True):
+        self.calls += 1
+        return np.stack([np.full(8, len(text), dtype=np.float32) + i for i, text in enumerate(texts)])
+
+
+def _worker(tmp_path, store, name):
+    data_path = tmp_path / DATA_PATH
+    if not data_path.exists():
+        shutil.copy(SAMPLE_DATA, data_path)
+    service = ChatbotService(
+        str(data_path), artifact_dir=str(tmp_path / f"artifacts-{name}"), embedding_service=_FakeEmbeddings()
+    )
+    service.shared_embeddings = store
+    
+    async def start():
+        await service.load()
+        await service.initialize_embeddings()
+    
+    asyncio.run(start())
+    return service
+
+
+def test_workers_share_one_embedding_of_the_faq(store, tmp_path):
+    first = _worker(tmp_path, store, "first")
+    second = _worker(tmp_path, SharedEmbeddingStore(store.directory), "second")
+    
+    assert first.embedding_service.calls == 1
+    assert second.embedding_service.calls == 0
+    np.testing.assert_array_equal(first.kb.faq_embeddings, second.kb.faq_embeddings)
+    assert isinstance(second.kb.faq_embeddings.base, np.memmap)
+    assert len(os.listdir(store.directory)) == 2  # The segment and its publishing lock
@@ -0,0 +1,125 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+import pytest
+
+from app.core.sse import SSEEncoder, WebSocketEncoder, coalesce_chat_stream, number_frames
+
+TEXTS = ("halo", 'kutip " dan \\ garis miring', "baris\nbaru\ttab", "emoji 🤖 dan é", "\x00\x1f", "")
+
+
+def _frame(**data):
+    return b"data: " + json.dumps(data).encode("ascii") + b"\n\n"
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_content_frames_match_json_dumps(text):
+    encoder = SSEEncoder("sesi-é\"1")
+    expected = _frame(type="content", content=text, session_id="sesi-é\"1", done=False)
+    assert encoder.content(text) == expected
+    assert encoder.chunk({"type": "content", "content": text}) == expected
+
+
+def test_other_frames():
+    encoder = SSEEncoder("s")
+    assert encoder.chunk({"type": "session", "session_id": "s2"}) == _frame(
+        type="session", content="", session_id="s2", done=False
+    )
+    assert encoder.chunk({"type": "done", "done": True}) == _frame(type="done", content="", session_id="s", done=True)
+    assert encoder.frames == 2
+
+
+def test_websocket_frames_are_bare_json():
+    assert json.loads(WebSocketEncoder("s").content("halo")) == {
+        "type": "content", "content": "halo", "session_id": "s", "done": False
+    }
+
+
+def test_numbered_frames():
+    frames = [b"data: a\n\n", b"data: b\n\n"]
+    assert number_frames(7, frames) == b"id: 7\ndata: a\n\nid: 8\ndata: b\n\n"
+
+
+def _contents(batches):
+    return [[json.loads(frame[len(b"data: "):])["content"] for frame in batch] for batch in batches]
+
+
+async def _chunks(tokens, delay=0.0, end=True):
+    for token in tokens:
+        await asyncio.sleep(delay)
+        yield {"type": "content", "content": token}
+    if end:
+        yield {"type": "done", "done": True}
+
+
+async def _collect(chunks, flush_interval, flush_bytes=1000):
+    async with aclosing(coalesce_chat_stream(chunks, SSEEncoder("s"), flush_interval, flush_bytes)) as stream:
+        return [batch async for batch in stream]
+
+
+def test_without_coalescing_every_token_is_a_frame():
+    batches = asyncio.run(_collect(_chunks("abc"), flush_interval=0))
+    assert _contents(batches) == [["a"], ["b"], ["c"], [""]]
+
+
+def test_first_token_is_sent_at_once_and_later_ones_are_coalesced():
+    async def run():
+        stream = coalesce_chat_stream(_chunks("abcdef", delay=0.01), SSEEncoder("s"), 0.2, 1000)
+        async with aclosing(stream):
+            first = await stream.__anext__()
+            rest = [batch async for batch in stream]
+        return first, rest
+    
+    first, rest = asyncio.run(run())
+    assert _contents([first]) == [["a"]]
+    # The done frame ends the coalesced content frame and keeps its order
+    assert _contents(rest) == [["bcdef", ""]]
+
+
+def test_coalescing_flushes_on_size_without_waiting_for_the_interval():
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        batches = await _collect(_chunks(["a", "bb", "cc", "d"], delay=0.01), flush_interval=10.0, flush_bytes=4)
+        return batches, loop.time() - started
+    
+    batches, elapsed = asyncio.run(run())
+    contents = [content for batch in _contents(batches) for content in batch]
+    assert contents == ["a", "bbcc", "d", ""]
+    assert elapsed < 1.0
+
+
+def test_upstream_errors_are_raised_after_the_frames_before_them():
+    async def failing():
+        yield {"type": "content", "content": "a"}
+        raise RuntimeError("upstream failed")
+    
+    async def run():
+        batches = []
+        with pytest.raises(RuntimeError):
+            async with aclosing(coalesce_chat_stream(failing(), SSEEncoder("s"), 0.05, 1000)) as stream:
+                async for batch in stream:
+                    batches.append(batch)
+        return batches
+    
+    assert _contents(asyncio.run(run())) == [["a"]]
+
+
+def test_closing_the_stream_stops_reading_upstream():
+    state = {"closed": False}
+    
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.01)
+                yield {"type": "content", "content": "x"}
+        finally:
+            state["closed"] = True
+    
+    async def run():
+        async with aclosing(coalesce_chat_stream(endless(), SSEEncoder("s"), 0.05, 1000)) as stream:
+            await stream.__anext__()
+    
+    asyncio.run(run())
+    assert state["closed"]
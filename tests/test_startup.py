@@ -0,0 +1,128 @@
+import asyncio
+import os
+import shutil
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import health
+from app.core.performance_config import performance_settings
+from app.services import startup
+from app.services.chatbot_service import ChatbotService
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import DATA_PATH
+from app.services.startup import FAILED, READY, READY_STATE, STARTING, Readiness, ServiceNotReady, ensure_started
+
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+
+@pytest.fixture
+def readiness(monkeypatch):
+    original = startup.readiness
+    readiness = Readiness()
+    monkeypatch.setattr(startup, "readiness", readiness)
+    monkeypatch.setattr(health, "readiness", readiness)
+    yield readiness
+    # A Readiness takes over the atabot_ready gauge
+    READY.set_function(lambda: 1 if original.ready else 0)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Upstream requests made by the HTTP warm-up"""
+    requests = []
+    
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200)
+    
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(startup, "get_http_client", lambda: client)
+    return requests
+
+
+@pytest.fixture
+def service(tmp_path):
+    shutil.copy(SAMPLE_DATA, tmp_path / DATA_PATH)
+    embedding_service = EnhancedEmbeddingService()
+    embedding_service.use_embeddings = False
+    service = ChatbotService(
+        str(tmp_path / DATA_PATH), artifact_dir=str(tmp_path / "artifacts"), embedding_service=embedding_service
+    )
+    service.loads = 0
+    service.failures = 0
+    load = service.load
+    
+    async def counted_load():
+        service.loads += 1
+        await asyncio.sleep(0.01)
+        if service.failures:
+            service.failures -= 1
+            raise RuntimeError("data.json unreadable")
+        return await load()
+    
+    service.load = counted_load
+    return service
+
+
+def _probe():
+    app = FastAPI()
+    app.include_router(health.router)
+    return TestClient(app).get("/ready")
+
+
+def test_not_ready_until_startup_has_finished(readiness, service, upstream):
+    response = _probe()
+    assert response.status_code == 503
+    assert response.json()["data"]["state"] == STARTING
+    
+    asyncio.run(ensure_started(service))
+    response = _probe()
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["state"] == READY_STATE
+    assert set(data["phases"]) == {"http_pool", "knowledge_base", "embeddings", "caches"}
+    assert data["phases"]["knowledge_base"]["result"].endswith("services")
+    # Keep-alive connections opened to the LLM API ahead of the first request
+    assert len(upstream) == performance_settings.STARTUP_WARM_HTTP_CONNECTIONS
+    assert service.loaded
+
+
+def test_concurrent_requests_wait_for_one_startup(readiness, service, upstream):
+    async def run():
+        await asyncio.gather(*[ensure_started(service) for _ in range(5)])
+    
+    asyncio.run(run())
+    assert service.loads == 1
+    assert readiness.ready
+
+
+def test_cancelled_request_does_not_cancel_startup(readiness, service, upstream):
+    async def run():
+        first = asyncio.ensure_future(ensure_started(service))
+        second = asyncio.ensure_future(ensure_started(service))
+        await asyncio.sleep(0)
+        first.cancel()
+        await second
+    
+    asyncio.run(run())
+    assert readiness.ready
+    assert service.loads == 1
+
+
+def test_failed_startup_is_reported_and_retried(readiness, service, upstream):
+    service.failures = 1
+    
+    with pytest.raises(ServiceNotReady):
+        asyncio.run(ensure_started(service))
+    response = _probe()
+    assert response.status_code == 503
+    assert response.json()["data"]["state"] == FAILED
+    assert response.json()["data"]["error"] == "data.json unreadable"
+    
+    # The next request tries again
+    asyncio.run(ensure_started(service))
+    assert _probe().status_code == 200
+    assert service.loads == 2
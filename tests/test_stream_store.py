@@ -0,0 +1,131 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+from app.core.sse import FrameCoalescer, SSEEncoder
+from app.services.stream_store import StreamStore
+
+
+def _contents(frames):
+    return [json.loads(frame[len(b"data: "):])["content"] for frame in frames]
+
+
+def test_coalescer_sends_first_token_then_batches():
+    async def run():
+        batches = []
+        coalescer = FrameCoalescer(SSEEncoder("s"), flush_interval=10.0, flush_bytes=1000, emit=batches.append)
+        for token in ("a", "b", "c"):
+            coalescer.feed({"content": token})
+        assert [_contents(batch) for batch in batches] == [["a"]]
+        
+        coalescer.flush()
+        assert [_contents(batch) for batch in batches] == [["a"], ["bc"]]
+    
+    asyncio.run(run())
+
+
+def test_coalescer_flushes_on_size_and_before_other_chunks():
+    async def run():
+        batches = []
+        coalescer = FrameCoalescer(SSEEncoder("s"), flush_interval=10.0, flush_bytes=4, emit=batches.append)
+        coalescer.feed({"content": "a"})
+        coalescer.feed({"content": "bbbb"})
+        coalescer.feed({"content": "c"})
+        coalescer.feed({"type": "done", "done": True})
+        assert [_contents(batch) for batch in batches] == [["a"], ["bbbb"], ["c", ""]]
+        assert json.loads(batches[-1][-1][len(b"data: "):])["type"] == "done"
+    
+    asyncio.run(run())
+
+
+def test_coalescer_timer_flushes_pending_tokens():
+    async def run():
+        batches = []
+        coalescer = FrameCoalescer(SSEEncoder("s"), flush_interval=0.01, flush_bytes=1000, emit=batches.append)
+        coalescer.feed({"content": "a"})
+        coalescer.feed({"content": "b"})
+        await asyncio.sleep(0.05)
+        assert [_contents(batch) for batch in batches] == [["a"], ["b"]]
+    
+    asyncio.run(run())
+
+
+async def _tokens(count, delay=0.0):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield {"content": f"t{i}"}
+
+
+def _store(**overrides):
+    options = {"max_streams": 10, "max_bytes": 1 << 20, "ttl": 60.0, "resume_grace": 30.0, "max_detached": 5}
+    options.update(overrides)
+    return StreamStore(**options)
+
+
+def test_finished_stream_can_be_replayed_from_an_offset():
+    async def run():
+        store = _store()
+        owner = object()
+        buffer = store.start(owner, _tokens(3), SSEEncoder("s"))
+        await buffer.producer
+        
+        assert store.get(buffer.stream_id, object()) is None
+        assert store.get(buffer.stream_id, owner) is buffer
+        async with aclosing(store.follow(buffer, offset=1)) as batches:
+            replayed = [frame async for _, frames in batches for frame in frames]
+        assert replayed == buffer.frames[1:]
+        assert store.stats() == {"streams": 1, "finished": 1, "bytes": buffer.size}
+    
+    asyncio.run(run())
+
+
+def test_abandoned_stream_releases_its_bytes():
+    async def run():
+        store = _store(resume_grace=0.01)
+        buffer = store.start(object(), _tokens(1000, delay=0.001), SSEEncoder("s"))
+        async with aclosing(store.follow(buffer)) as batches:
+            async for _ in batches:
+                break
+        await asyncio.sleep(0.1)
+        
+        assert buffer.producer.cancelled()
+        assert store.stats() == {"streams": 0, "finished": 0, "bytes": 0}
+    
+    asyncio.run(run())
+
+
+def test_detached_producers_are_capped():
+    async def run():
+        store = _store(max_detached=1)
+        buffers = [store.start(object(), _tokens(1000, delay=0.001), SSEEncoder("s")) for _ in range(2)]
+        for buffer in buffers:
+            async with aclosing(store.follow(buffer)) as batches:
+                async for _ in batches:
+                    break
+        await asyncio.sleep(0)
+        
+        # The first keeps running within its grace period, the second is stopped at once
+        assert not buffers[0].producer.done()
+        assert buffers[1].producer.cancelled()
+        assert store.stats()["streams"] == 1
+        buffers[0].producer.cancel()
+    
+    asyncio.run(run())
+
+
+def test_oldest_finished_streams_are_evicted_over_the_limit():
+    async def run():
+        store = _store(max_streams=2)
+        owner = object()
+        first = store.start(owner, _tokens(1), SSEEncoder("s"))
+        await first.producer
+        second = store.start(owner, _tokens(1), SSEEncoder("s"))
+        await second.producer
+        third = store.start(owner, _tokens(1), SSEEncoder("s"))
+        await third.producer
+        
+        assert store.get(first.stream_id, owner) is None
+        assert store.get(second.stream_id, owner) is second
+        assert store.stats()["bytes"] == second.size + third.size
+    
+    asyncio.run(run())
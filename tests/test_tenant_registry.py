@@ -0,0 +1,108 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from app.services.chatbot_service import ChatMessage
+from app.services.enhanced_embedding_service import EnhancedEmbeddingService
+from app.services.knowledge_base import DATA_PATH
+from app.services.tenant_registry import TenantNotFound, TenantRegistry
+
+TENANTS = ("alpha", "beta", "gamma")
+SAMPLE_DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), DATA_PATH)
+
+
+@pytest.fixture
+def root_dir(tmp_path):
+    for tenant_id in TENANTS:
+        os.makedirs(tmp_path / tenant_id)
+        shutil.copy(SAMPLE_DATA, tmp_path / tenant_id / DATA_PATH)
+    return str(tmp_path)
+
+
+def _registry(root_dir, memory_budget=1 << 30, max_loaded=10):
+    # Keyword search only: no embedding API calls
+    embedding_service = EnhancedEmbeddingService()
+    embedding_service.use_embeddings = False
+    return TenantRegistry(root_dir, memory_budget, max_loaded, embedding_service=embedding_service)
+
+
+def test_least_recently_used_tenant_is_evicted(root_dir):
+    async def run():
+        registry = _registry(root_dir, max_loaded=2)
+        alpha = await registry.get("alpha")
+        await registry.get("beta")
+        assert await registry.get("alpha") is alpha
+        await registry.get("gamma")
+        
+        assert set(registry.loaded_services()) == {"alpha", "gamma"}
+        assert registry.stats["beta"].evictions == 1
+        assert registry.stats["beta"].memory_bytes == 0
+        # An evicted tenant is loaded again on its next request
+        await registry.get("beta")
+        assert registry.stats["beta"].loads == 2
+    
+    asyncio.run(run())
+
+
+def test_memory_budget_keeps_only_the_tenant_in_use(root_dir):
+    async def run():
+        registry = _registry(root_dir, memory_budget=1)
+        for tenant_id in TENANTS:
+            await registry.get(tenant_id)
+        
+        assert list(registry.loaded_services()) == ["gamma"]
+        assert registry.summary()["memory_bytes"] == registry.stats["gamma"].memory_bytes > 0
+    
+    asyncio.run(run())
+
+
+def test_chat_sessions_count_towards_the_budget(root_dir, monkeypatch):
+    monkeypatch.setattr("app.services.tenant_registry.MEASURE_INTERVAL", 0.0)
+    
+    async def run():
+        registry = _registry(root_dir)
+        alpha = await registry.get("alpha")
+        before = registry.stats["alpha"].memory_bytes
+        alpha.sessions["s"] = [ChatMessage(role="user", content="x" * 10000)]
+        await registry.get("alpha")
+        assert registry.stats["alpha"].memory_bytes > before + 10000
+        
+        # Growing sessions alone push the other tenants out
+        await registry.get("beta")
+        registry.memory_budget = registry.stats["alpha"].memory_bytes + 1
+        await registry.get("alpha")
+        assert list(registry.loaded_services()) == ["alpha"]
+    
+    asyncio.run(run())
+
+
+def test_unknown_tenants_are_remembered(root_dir):
+    async def run():
+        registry = _registry(root_dir)
+        with pytest.raises(TenantNotFound):
+            await registry.get("Invalid/id")
+        with pytest.raises(TenantNotFound):
+            await registry.get("delta")
+        
+        # Created since: still unknown until the negative cache entry expires
+        os.makedirs(os.path.join(root_dir, "delta"))
+        shutil.copy(SAMPLE_DATA, os.path.join(root_dir, "delta", DATA_PATH))
+        with pytest.raises(TenantNotFound):
+            await registry.get("delta")
+        registry._not_found["delta"] = 0.0
+        await registry.get("delta")
+    
+    asyncio.run(run())
+
+
+def test_concurrent_first_requests_share_one_load(root_dir):
+    async def run():
+        registry = _registry(root_dir)
+        services = await asyncio.gather(*(registry.get("alpha") for _ in range(5)))
+        assert all(service is services[0] for service in services)
+        assert registry.stats["alpha"].loads == 1
+        assert registry.stats["alpha"].requests == 5
+    
+    asyncio.run(run())
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+from app.services.analytics_service import AnalyticsService
+from app.services.latency_histogram import LogHistogram
+from app.services.timeseries_store import RESOLUTIONS, Rollup, TimeSeriesStore
+
+MINUTE = RESOLUTIONS["minute"]
+
+
+def _rollup(messages=1, latency=0.1):
+    rollup = Rollup()
+    rollup.messages = messages
+    rollup.record_latency(latency, messages)
+    return rollup
+
+
+def _service(tmp_path, **kwargs):
+    service = AnalyticsService(**kwargs)
+    service.timeseries = TimeSeriesStore(path=str(tmp_path / "analytics.db"))
+    return service
+
+
+def test_histogram_survives_a_row_roundtrip():
+    histogram = LogHistogram()
+    for value in (0.01, 0.02, 0.02, 1.5):
+        histogram.record(value)
+    restored = LogHistogram.from_dict(histogram.to_dict())
+    assert list(restored.counts) == list(histogram.counts)
+    assert restored.summary() == histogram.summary()
+    
+    rollup = _rollup(3)
+    assert Rollup.from_row(*rollup.to_row()).summary() == rollup.summary()
+
+
+def test_rollups_of_one_bucket_are_merged(tmp_path):
+    store = TimeSeriesStore(path=str(tmp_path / "analytics.db"))
+    store.add_message("chat", 0.1, now=60)
+    store.add_error("llm_service", now=61)
+    store.write(store.take_pending(now=120))
+    store.add_message("chat", 0.3, count=2, now=90)
+    store.write(store.take_pending(now=120))
+    
+    result = store.query(0, 120, resolution="minute")
+    assert result["series"]["endpoint:chat"]["messages"] == 3
+    assert result["series"]["endpoint:chat"]["latency"]["count"] == 3
+    assert result["series"]["error:llm_service"]["errors"] == 1
+    assert [point["timestamp"] for point in result["points"]] == [60]
+
+
+def test_open_minute_is_kept_pending():
+    store = TimeSeriesStore(path="")
+    store.add_message("chat", 0.1, now=60)
+    store.add_message("chat", 0.1, now=125)
+    assert [(bucket, series) for bucket, series, _ in store.take_pending(now=130)] == [(60, "endpoint:chat")]
+    assert [bucket for bucket, _, _ in store.take_pending(now=130, include_open=True)] == [120]
+
+
+def test_requeued_rows_merge_with_newer_events():
+    store = TimeSeriesStore(path="")
+    store.add_message("chat", 0.1, now=60)
+    rows = store.take_pending(now=120)
+    store.add_message("chat", 0.1, now=61)
+    store.requeue(rows)
+    assert store.pending[(60, "endpoint:chat")].messages == 2
+
+
+def test_concurrent_writers_do_not_lose_counts(tmp_path):
+    # Two stores on one file, as two workers would have
+    stores = [TimeSeriesStore(path=str(tmp_path / "analytics.db")) for _ in range(2)]
+    stores[0].write([(0, "endpoint:chat", _rollup())])
+    
+    def flush(store):
+        for _ in range(100):
+            store.write([(0, "endpoint:chat", _rollup())])
+    
+    threads = [threading.Thread(target=flush, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    totals = stores[0].query(0, MINUTE, resolution="minute")["totals"]
+    assert totals["messages"] == 201
+    assert totals["latency"]["count"] == 201
+
+
+def test_pending_rows_use_the_same_range_as_stored_ones(tmp_path):
+    store = TimeSeriesStore(path=str(tmp_path / "analytics.db"))
+    store.write([(60, "endpoint:chat", _rollup())])
+    pending = [(60, "endpoint:widget", _rollup())]
+    
+    # Both rows are in the minute starting at 60, which overlaps [90, 180)
+    result = store.query(90, 180, resolution="minute", pending=pending)
+    assert result["totals"]["messages"] == 2
+
+
+def test_compaction_keeps_totals(tmp_path):
+    store = TimeSeriesStore(path=str(tmp_path / "analytics.db"), minute_retention=3600)
+    for minute in range(120):
+        store.write([(minute * MINUTE, "endpoint:chat", _rollup())])
+    store.compact(now=3 * 3600)
+    
+    result = store.query(0, 3 * 3600, resolution="hour")
+    assert result["totals"]["messages"] == 120
+    assert result["totals"]["latency"]["count"] == 120
+    assert [point["timestamp"] for point in result["points"]] == [0, 3600]
+    assert store.query(0, 3 * 3600, resolution="minute")["points"][0]["timestamp"] == 0
+
+
+def test_stop_persists_the_open_minute_and_a_restart_restores_totals(tmp_path):
+    async def run():
+        service = _service(tmp_path)
+        for _ in range(3):
+            service.record_message("jam buka kantor", 0.2)
+        service.record_error("llm_service", "timeout")
+        await service.stop()
+        
+        restarted = _service(tmp_path)
+        restarted.record_session_created()
+        await asyncio.sleep(0.05)
+        assert restarted.message_count == 3
+        assert restarted.error_count == 1
+        assert sum(restarted.daily_stats.values()) == 3
+        await restarted.stop()
+    
+    asyncio.run(run())
+
+
+def test_closed_minutes_are_persisted_while_idle(tmp_path):
+    async def run():
+        service = _service(tmp_path, flush_interval=0.01)
+        service.persist_interval = 0.1
+        service.timeseries.add_message("chat", 0.1, now=time.time() - 120)
+        service._last_persist = time.monotonic()
+        # Starts the aggregator; no events follow
+        service.record_session_created()
+        await asyncio.sleep(0.3)
+        
+        messages, _, _ = await asyncio.to_thread(service.timeseries.totals)
+        assert messages == 1
+        await service.stop()
+    
+    asyncio.run(run())
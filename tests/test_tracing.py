@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from app.core import tracing
+from app.core.tracing import NOOP_SPAN, TRACE_ID_HEADER, JsonLinesExporter, Tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def test_traceparent_keeps_the_callers_trace_and_parent():
+    trace = Tracer(sample_rate=1.0).start_trace("chat", {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"})
+    assert trace.trace_id == TRACE_ID
+    assert trace.root.parent_id == PARENT_ID
+
+
+def test_sampled_flag_is_ignored_unless_trusted():
+    headers = {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+    assert not Tracer(sample_rate=0.0).start_trace("chat", headers).sampled
+    assert Tracer(sample_rate=0.0, trust_upstream_sampled=True).start_trace("chat", headers).sampled
+    
+    # An unsampled flag falls back to the sample rate even when trusted
+    headers = {"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+    assert Tracer(sample_rate=1.0, trust_upstream_sampled=True).start_trace("chat", headers).sampled
+
+
+def test_trace_id_header_and_malformed_traceparent():
+    tracer = Tracer(sample_rate=0.0)
+    trace = tracer.start_trace("chat", {"traceparent": "garbage", TRACE_ID_HEADER: "abc"})
+    assert trace.trace_id == "abc"
+    assert len(tracer.start_trace("chat", {}).trace_id) == 32
+
+
+def test_spans_follow_the_current_trace_across_tasks():
+    tracer = Tracer(sample_rate=1.0)
+    
+    async def retrieve():
+        with tracing.span("retrieval") as span:
+            span.set("faq_hits", 2)
+            await asyncio.sleep(0)
+    
+    async def run():
+        trace = tracer.start_trace("chat", None)
+        with tracing.span("prompt"):
+            pass
+        await asyncio.create_task(retrieve())
+        trace.finish()
+        return trace
+    
+    trace = asyncio.run(run())
+    names = [span.name for span in trace.spans]
+    assert names == ["chat", "prompt", "retrieval"]
+    assert all(span.parent_id == trace.root.span_id for span in trace.spans[1:])
+    assert trace.spans[2].attributes == {"faq_hits": 2}
+    
+    data = tracer.recent[-1]
+    assert data["trace_id"] == trace.trace_id
+    assert set(data["stages"]) == {"prompt", "retrieval"}
+
+
+def test_unsampled_traces_record_nothing():
+    tracer = Tracer(sample_rate=0.0)
+    
+    async def run():
+        trace = tracer.start_trace("chat", None)
+        assert tracing.span("retrieval") is NOOP_SPAN
+        trace.finish()
+    
+    asyncio.run(run())
+    assert not tracer.recent
+
+
+def test_finish_closes_spans_left_open():
+    tracer = Tracer(sample_rate=1.0)
+    trace = tracer.start_trace("chat.stream", None)
+    trace.span("llm_stream")
+    trace.finish()
+    assert all(span.end_time is not None for span in trace.spans)
+    assert tracer.slowest(name="chat.stream")[0]["trace_id"] == trace.trace_id
+
+
+def test_exporter_writes_json_lines_in_batches(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(sample_rate=1.0, exporter=JsonLinesExporter(str(path), batch_size=2, flush_interval=60))
+    for name in ("a", "b", "c"):
+        tracer.start_trace(name, None).finish()
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["a", "b"]
+    
+    tracer.exporter.flush()
+    assert [json.loads(line)["name"] for line in path.read_text().splitlines()] == ["a", "b", "c"]